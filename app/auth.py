@@ -2,23 +2,68 @@
 auth.py
 Autenticação JWT, hashing de senhas e dependências do FastAPI.
 """
+import asyncio
+import hashlib
+import hmac
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from . import config, db
+from .cache import TTLCache, MISSING
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt__rounds fixo: hashes com outro custo são marcados para rehash (needs_update)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
 security = HTTPBearer()
 
+# bcrypt é CPU-bound e libera o GIL: roda num pool dedicado e limitado, para que
+# uma rajada de logins não trave o event loop (ingestão, polling, etc).
+_hash_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_semaphore = asyncio.Semaphore(config.PASSWORD_HASH_WORKERS)
+
+# Cache de usuários autenticados (por user id). Entradas nunca vivem mais que o
+# access token; alterações de role/remoção chamam invalidate_user.
+_user_cache = TTLCache(
+    maxsize=config.USER_CACHE_MAX,
+    ttl=min(config.USER_CACHE_TTL_SEC, config.JWT_ACCESS_EXPIRE_MIN * 60),
+)
+
+def invalidate_user(user_id: str = None):
+    """Remove um usuário do cache (ou todos, se user_id for None)."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(str(user_id))
+
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain, hashed) -> bool:
     return pwd_context.verify(plain, hashed)
 
-def create_tokens(user_id: str):
+async def _run_hash(fn, *args):
+    async with _hash_semaphore:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+
+async def hash_password_async(password: str) -> str:
+    """hash_password fora do event loop (pool de hashing)."""
+    return await _run_hash(pwd_context.hash, password)
+
+async def verify_and_update_password(plain, hashed):
+    """
+    Verifica a senha fora do event loop. Retorna (ok, new_hash); new_hash vem
+    preenchido quando o hash salvo usa outro custo (BCRYPT_ROUNDS mudou) e
+    deve ser regravado.
+    """
+    return await _run_hash(pwd_context.verify_and_update, plain, hashed)
+
+def create_tokens(user_id: str, jti: str = None):
     now = datetime.utcnow()
     access_payload = {
         "sub": str(user_id),
@@ -26,25 +71,63 @@ def create_tokens(user_id: str):
     }
     refresh_payload = {
         "sub": str(user_id),
+        "jti": jti or uuid.uuid4().hex,
+        "typ": "refresh",
         "exp": now + timedelta(days=config.JWT_REFRESH_EXPIRE_DAYS)
     }
     access = jwt.encode(access_payload, config.JWT_SECRET, algorithm="HS256")
     refresh = jwt.encode(refresh_payload, config.JWT_SECRET, algorithm="HS256")
     return access, refresh
 
+def refresh_token_digest(token: str) -> str:
+    """
+    Digest HMAC-SHA256 do refresh token (chave REFRESH_TOKEN_HMAC_KEY). O token já
+    é aleatório e assinado, então não precisa de hash lento como bcrypt; o HMAC
+    cobre o token inteiro (bcrypt só considera os primeiros 72 bytes).
+    """
+    return hmac.new(config.REFRESH_TOKEN_HMAC_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+def refresh_token_matches(token: str, digest: str) -> bool:
+    return hmac.compare_digest(refresh_token_digest(token), digest or "")
+
+async def issue_tokens(user_id: str):
+    """
+    Cria access + refresh e persiste o refresh em refresh_tokens (um documento
+    por jti, permitindo várias sessões por usuário). Documentos expirados são
+    removidos pelo índice TTL em expires_at.
+    """
+    jti = uuid.uuid4().hex
+    access, refresh = create_tokens(user_id, jti=jti)
+    now = datetime.utcnow()
+    await db.db.refresh_tokens.insert_one({
+        "_id": jti,
+        "user_id": str(user_id),
+        "token_hash": refresh_token_digest(refresh),
+        "created_at": now,
+        "expires_at": now + timedelta(days=config.JWT_REFRESH_EXPIRE_DAYS),
+    })
+    return access, refresh
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+    return await user_from_token(credentials.credentials)
+
+async def user_from_token(token: str):
+    """Valida um access token e retorna o usuário (cacheado); 401 se inválido."""
     try:
         payload = jwt.decode(token, config.JWT_SECRET, algorithms=["HS256"])
         user_id = payload.get("sub")
-        if not user_id:
+        if not user_id or payload.get("typ") == "refresh":
             raise HTTPException(status_code=401, detail="Token inválido")
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
-    user = await db.db.users.find_one({"_id": user_id})
+    user = _user_cache.get(user_id)
+    if user is MISSING:
+        user = await db.db.users.find_one({"_id": user_id})
+        _user_cache.set(user_id, user)
     if not user:
         raise HTTPException(status_code=401, detail="Usuário não encontrado")
-    return user
+    # Cópia rasa: quem altera o dict retornado não mexe na entrada do cache
+    return dict(user)
 
 # Novo: dependência reutilizável para checar role=admin
 async def admin_required(user=Depends(get_current_user)):
@@ -13,7 +13,13 @@ DB_NAME = os.getenv("DB_NAME", "silosdb")
 JWT_SECRET = os.getenv("JWT_SECRET", "dev_secret")
 JWT_ACCESS_EXPIRE_MIN = int(os.getenv("JWT_ACCESS_EXPIRE_MIN", "15"))
 JWT_REFRESH_EXPIRE_DAYS = int(os.getenv("JWT_REFRESH_EXPIRE_DAYS", "7"))
+# Chave do HMAC usado para armazenar refresh tokens (padrão: JWT_SECRET)
+REFRESH_TOKEN_HMAC_KEY = os.getenv("REFRESH_TOKEN_HMAC_KEY") or JWT_SECRET
 INIT_ADMIN_SECRET = os.getenv("INIT_ADMIN_SECRET")
+# Custo do bcrypt (hashes com outro custo são regravados no próximo login)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicadas (e limite de concorrência) para hash/verificação de senha
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY")
 VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY")
@@ -23,3 +29,68 @@ SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT") or 0)
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
+# Número máximo de leituras aceitas por POST /api/readings/batch
+READINGS_BATCH_MAX = int(os.getenv("READINGS_BATCH_MAX", "1000"))
+# Intervalo (s) entre sondas de versão do modelo ML em cache
+ML_MODEL_REFRESH_SEC = float(os.getenv("ML_MODEL_REFRESH_SEC", "60"))
+# Treino ML: leitura em streaming e amostragem (0 = sem limite de amostras)
+ML_FETCH_BATCH_SIZE = int(os.getenv("ML_FETCH_BATCH_SIZE", "10000"))
+ML_TRAIN_SAMPLE_CAP = int(os.getenv("ML_TRAIN_SAMPLE_CAP", "0"))
+ML_TRAIN_STRATIFY = os.getenv("ML_TRAIN_STRATIFY", "false").lower() in ("1", "true", "yes")
+ML_TRAIN_DTYPE = os.getenv("ML_TRAIN_DTYPE", "float32")
+# Retreino noturno (hora UTC; -1 desabilita) e janela de dados em dias
+ML_RETRAIN_HOUR = int(os.getenv("ML_RETRAIN_HOUR", "3"))
+ML_RETRAIN_DAYS = int(os.getenv("ML_RETRAIN_DAYS", "30"))
+# Lease do lock de retreino no Mongo (um retreino por vez entre todos os workers)
+ML_RETRAIN_LEASE_SEC = float(os.getenv("ML_RETRAIN_LEASE_SEC", "300"))
+# Cache de metadados de silo (settings + regras pré-construídas)
+SILO_CACHE_TTL_SEC = float(os.getenv("SILO_CACHE_TTL_SEC", "60"))
+SILO_CACHE_MAX = int(os.getenv("SILO_CACHE_MAX", "1024"))
+# Intervalo (s) do checkpoint do estado das regras stateful no Mongo
+RULE_STATE_CHECKPOINT_SEC = float(os.getenv("RULE_STATE_CHECKPOINT_SEC", "30"))
+# Número máximo de buckets retornados por GET /api/readings/aggregate
+READINGS_AGG_MAX_BUCKETS = int(os.getenv("READINGS_AGG_MAX_BUCKETS", "2000"))
+# Tamanho máximo de página em GET /api/readings/
+READINGS_MAX_PAGE_SIZE = int(os.getenv("READINGS_MAX_PAGE_SIZE", "1000"))
+# Tamanho máximo de página em GET /api/alerts/
+ALERTS_MAX_PAGE_SIZE = int(os.getenv("ALERTS_MAX_PAGE_SIZE", "1000"))
+# Layout da collection readings: time-series nativa (MongoDB >= 5.0) ou comum
+READINGS_TIMESERIES = os.getenv("READINGS_TIMESERIES", "false").lower() in ("1", "true", "yes")
+READINGS_TS_GRANULARITY = os.getenv("READINGS_TS_GRANULARITY", "minutes")
+# Cache de usuários em get_current_user (TTL limitado à validade do access token)
+USER_CACHE_TTL_SEC = float(os.getenv("USER_CACHE_TTL_SEC", "300"))
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "1024"))
+# ThingSpeak: intervalo do poller, canais consultados em paralelo e timeout HTTP
+THINGSPEAK_POLL_INTERVAL_SEC = float(os.getenv("THINGSPEAK_POLL_INTERVAL_SEC", "300"))
+THINGSPEAK_CONCURRENCY = int(os.getenv("THINGSPEAK_CONCURRENCY", "5"))
+THINGSPEAK_TIMEOUT_SEC = float(os.getenv("THINGSPEAK_TIMEOUT_SEC", "10"))
+# Janela (horas) da varredura incremental; janelas cheias são divididas
+THINGSPEAK_POLL_WINDOW_HOURS = float(os.getenv("THINGSPEAK_POLL_WINDOW_HOURS", "24"))
+# Notificações: threads de envio Web Push (pywebpush é síncrono) e timeouts por canal
+NOTIFY_PUSH_WORKERS = int(os.getenv("NOTIFY_PUSH_WORKERS", "16"))
+NOTIFY_PUSH_TIMEOUT_SEC = float(os.getenv("NOTIFY_PUSH_TIMEOUT_SEC", "10"))
+NOTIFY_TELEGRAM_TIMEOUT_SEC = float(os.getenv("NOTIFY_TELEGRAM_TIMEOUT_SEC", "10"))
+# Outbox de notificações: lote, intervalo de varredura, tentativas e backoff (segundos)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE_SEC = float(os.getenv("OUTBOX_BACKOFF_BASE_SEC", "10"))
+OUTBOX_BACKOFF_MAX_SEC = float(os.getenv("OUTBOX_BACKOFF_MAX_SEC", "3600"))
+OUTBOX_LEASE_SEC = float(os.getenv("OUTBOX_LEASE_SEC", "120"))
+# Varredura de alertas pendentes sem entrada no outbox (falha entre as duas gravações)
+OUTBOX_RECOVER_SEC = float(os.getenv("OUTBOX_RECOVER_SEC", "60"))
+# Entradas entregues são removidas do outbox após este prazo (dias)
+OUTBOX_SENT_TTL_DAYS = int(os.getenv("OUTBOX_SENT_TTL_DAYS", "7"))
+# Supressão de alertas repetidos: intervalo padrão quando o silo não define alert_interval_min
+ALERT_INTERVAL_MIN_DEFAULT = int(os.getenv("ALERT_INTERVAL_MIN_DEFAULT", "5"))
+ALERT_SUPPRESSION_CACHE_MAX = int(os.getenv("ALERT_SUPPRESSION_CACHE_MAX", "10000"))
+# Stream ao vivo (SSE): fila por cliente, heartbeat e retry sugerido ao navegador
+STREAM_QUEUE_MAX = int(os.getenv("STREAM_QUEUE_MAX", "256"))
+STREAM_HEARTBEAT_SEC = float(os.getenv("STREAM_HEARTBEAT_SEC", "15"))
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "5000"))
+# Respostas das listagens: compressão (gzip/br) a partir deste tamanho e níveis
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+# GET /metrics (Prometheus): se definido, exige Authorization: Bearer <METRICS_TOKEN>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
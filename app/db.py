@@ -3,24 +3,153 @@ db.py
 Inicializa cliente Motor e expõe referências às coleções.
 """
 import os
+import logging
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from . import config
 
 DB_NAME = os.getenv("DB_NAME", "silosdb")  # "silosdb" como valor padrão
 
 _client = None
 db = None
+# `readings` é time-series (detectado no startup); ver unique_readings
+readings_timeseries = False
 
 def init_db():
     global _client, db
     _client = AsyncIOMotorClient(config.MONGO_URI)
     db = _client["silosdb"]
-    # Cria índices básicos
-    db.users.create_index("username", unique=True)
-    db.readings.create_index([("silo_id", 1), ("timestamp", -1)])
-    db.alerts.create_index("silo_id")
-    # Índice para subscriptions de push (endpoint deve ser único)
-    db.push_subscriptions.create_index("endpoint", unique=True)
-    # Índice para refresh tokens (user_id)
-    db.refresh_tokens.create_index("user_id")
     return db
+
+def readings_timeseries_options() -> dict:
+    """Opções de create_collection para readings como time-series collection."""
+    return {
+        "timeField": "timestamp",
+        # metaField é um único campo; silo_id é a chave de todas as consultas.
+        # device_id continua como campo de medição, assim o formato dos documentos
+        # não muda entre os dois layouts.
+        "metaField": "silo_id",
+        "granularity": config.READINGS_TS_GRANULARITY,
+    }
+
+async def list_collection_infos(name: str) -> list:
+    """Metadados (listCollections) da collection `name`; lista vazia se não existir."""
+    res = await db.command("listCollections", filter={"name": name})
+    return res["cursor"]["firstBatch"]
+
+async def ensure_readings_collection():
+    """
+    Com READINGS_TIMESERIES=true cria `readings` como time-series collection
+    (MongoDB >= 5.0) se ela ainda não existir. Uma collection comum já existente
+    não é convertida aqui: use scripts/migrate_readings_timeseries.py.
+    Em qualquer caso registra em `readings_timeseries` o layout em uso.
+    """
+    global readings_timeseries
+    infos = await list_collection_infos("readings")
+    if config.READINGS_TIMESERIES:
+        if not infos:
+            await db.create_collection("readings", timeseries=readings_timeseries_options())
+            infos = await list_collection_infos("readings")
+        elif infos[0].get("type") != "timeseries":
+            logging.getLogger("uvicorn.error").warning(
+                "READINGS_TIMESERIES=true mas 'readings' é uma collection comum; "
+                "rode scripts/migrate_readings_timeseries.py para migrar."
+            )
+    readings_timeseries = bool(infos) and infos[0].get("type") == "timeseries"
+
+async def existing_reading_ids(collection, docs: list) -> set:
+    """
+    _id de `docs` já gravados em `collection`. Em time-series o _id não tem
+    índice: a busca é limitada por silo_id (metaField) e pelo intervalo de
+    timestamp do lote, para usar o índice de buckets em vez de varrer tudo.
+    """
+    bounds = {}
+    for d in docs:
+        b = bounds.setdefault(d.get("silo_id"), {"ids": [], "ts": []})
+        b["ids"].append(d["_id"])
+        b["ts"].append(d.get("timestamp"))
+    clauses = []
+    for silo_id, b in bounds.items():
+        clause = {"silo_id": silo_id, "_id": {"$in": b["ids"]}}
+        if all(isinstance(t, datetime) for t in b["ts"]):
+            clause["timestamp"] = {"$gte": min(b["ts"]), "$lte": max(b["ts"])}
+        clauses.append(clause)
+    query = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+    return {d["_id"] async for d in collection.find(query, {"_id": 1})}
+
+async def unique_readings(collection, docs: list, generated_ids: bool = False) -> tuple:
+    """
+    Time-series collections não têm índice único em _id, então a idempotência
+    da ingestão (E11000 no _id determinístico) não vale lá. Separa `docs` em
+    (novos, índices repetidos): repetidos são os _id já gravados em `collection`
+    ou que aparecem antes no próprio lote. Em collection comum, ou com
+    generated_ids=True (uuid4 gerado agora, sem colisão possível), não consulta
+    nada. A checagem não é atômica: dois gravadores simultâneos do mesmo _id
+    ainda podem duplicá-lo (por isso poller e importador não rodam no mesmo
+    intervalo).
+    """
+    if not readings_timeseries or generated_ids or not docs:
+        return docs, []
+    seen = await existing_reading_ids(collection, docs)
+    fresh, dup = [], []
+    for i, d in enumerate(docs):
+        if d["_id"] in seen:
+            dup.append(i)
+        else:
+            seen.add(d["_id"])
+            fresh.append(d)
+    return fresh, dup
+
+async def _ensure_readings_keyset_index(keys: list):
+    """
+    Índice de leituras com sufixo _id (keyset). Em time-series, índices
+    secundários em campos de medição como _id exigem MongoDB >= 6.0; em versões
+    anteriores cai para o índice sem _id (a paginação continua correta, só
+    ordena o desempate em memória).
+    """
+    try:
+        await db.readings.create_index(keys)
+    except OperationFailure as e:
+        if not readings_timeseries:
+            raise
+        logging.getLogger("uvicorn.error").warning(
+            "Índice %s não suportado na time-series 'readings' (%s); usando sem _id", keys, e
+        )
+        await db.readings.create_index(keys[:-1])
+
+async def ensure_indexes():
+    """
+    Cria índices básicos. Os métodos do Motor são corrotinas: precisam ser
+    aguardados, por isso isto roda no startup (após init_db).
+    """
+    await ensure_readings_collection()
+    await db.users.create_index("username", unique=True)
+    # Atende filtros por silo + intervalo de tempo (listagem e agregações); o sufixo
+    # _id permite a paginação por keyset (timestamp, _id) sem sort em memória.
+    await _ensure_readings_keyset_index([("silo_id", 1), ("timestamp", -1), ("_id", -1)])
+    await _ensure_readings_keyset_index([("timestamp", -1), ("_id", -1)])
+    # Alertas: listagem com filtros + keyset (timestamp, _id); os prefixos de
+    # igualdade (silo_id, acknowledged) cobrem os filtros mais comuns
+    await db.alerts.create_index([("timestamp", -1), ("_id", -1)])
+    await db.alerts.create_index([("silo_id", 1), ("timestamp", -1), ("_id", -1)])
+    await db.alerts.create_index([("acknowledged", 1), ("timestamp", -1), ("_id", -1)])
+    await db.alerts.create_index([("silo_id", 1), ("acknowledged", 1), ("timestamp", -1), ("_id", -1)])
+    # Supressão: último alerta de cada (silo_id, regra)
+    await db.alerts.create_index([("silo_id", 1), ("rule", 1), ("timestamp", -1)])
+    # Rollups de leituras: um documento por (silo_id, bucket)
+    await db.readings_hourly.create_index([("silo_id", 1), ("t", 1)], unique=True)
+    await db.readings_daily.create_index([("silo_id", 1), ("t", 1)], unique=True)
+    # Índice para subscriptions de push (endpoint deve ser único)
+    await db.push_subscriptions.create_index("endpoint", unique=True)
+    # Refresh tokens: um documento por jti (_id); busca por usuário e expiração via TTL
+    await db.refresh_tokens.create_index("user_id")
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    # Outbox de notificações: reivindicação por status/próxima tentativa; entregues expiram
+    await db.notification_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.notification_outbox.create_index("sent_at", expireAfterSeconds=config.OUTBOX_SENT_TTL_DAYS * 86400)
+    await db.alerts.create_index(
+        "notification.status", partialFilterExpression={"notification.status": "pending"}
+    )
+    # Jobs de retreino (listagem pelos mais recentes); histórico expira em 90 dias
+    await db.ml_jobs.create_index("created_at", expireAfterSeconds=90 * 86400)
@@ -1,18 +1,26 @@
 ﻿from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 import logging
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 
 # Importar módulo db para inicialização do banco
-from . import db
+from . import db, config
 
 # Importar routers existentes na pasta routes
-from .routes import auth, users, silos, readings, alerts, notifications
+from .routes import auth, users, silos, readings, alerts, notifications, stream, metrics as metrics_routes
+from .metrics import MetricsMiddleware, register_runtime_collector
+
+from .utils import rule_state
 
 # Importar o poller
 from .services.thingspeak_poller import thingspeak_poller
+from .services.thing_speak import close_http_client
+from .services.notification import close_notification_clients
+from .services import outbox
 
-app = FastAPI()
+# ORJSONResponse: serialização mais rápida também nas rotas com response_model
+app = FastAPI(default_response_class=ORJSONResponse)
 logger = logging.getLogger("uvicorn.error")
 
 # Configurar CORS
@@ -22,18 +30,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginação por keyset: o dashboard (outra origem) precisa ler o cursor
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Latência por rota (Prometheus, GET /metrics)
+app.add_middleware(MetricsMiddleware)
+register_runtime_collector()
+
 # Evento de startup para inicializar o banco de dados e iniciar o poller
 @app.on_event("startup")
 async def startup_event():
     db.init_db()
+    try:
+        await db.ensure_indexes()
+    except Exception as e:
+        logger.warning("Nao foi possivel criar indices: %s", e)
     logger.info("Database initialized")
+
+    # Restaurar estado das regras stateful e iniciar checkpoint periódico
+    try:
+        n = await rule_state.restore()
+        logger.info("Estado de regras restaurado: %d entradas", n)
+    except Exception as e:
+        logger.warning("Nao foi possivel restaurar estado das regras: %s", e)
+    asyncio.create_task(rule_state.run_checkpointer(config.RULE_STATE_CHECKPOINT_SEC))
     
+    # Dispatcher do outbox de notificações (envio fora do caminho da ingestão)
+    asyncio.create_task(outbox.run_dispatcher())
+
     # Iniciar o poller do ThingSpeak em segundo plano
     asyncio.create_task(thingspeak_poller())
     logger.info("ThingSpeak poller started")
 
+    # Retreino noturno do modelo ML (mesmo mecanismo de job da API)
+    if config.ML_RETRAIN_HOUR >= 0:
+        try:
+            from .tasks.scheduler import start_retrain_scheduler
+            start_retrain_scheduler()
+            logger.info("Retreino ML agendado para %02d:00 UTC", config.ML_RETRAIN_HOUR)
+        except Exception as e:
+            logger.warning("Nao foi possivel agendar retreino ML: %s", e)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    try:
+        await rule_state.checkpoint()
+    except Exception as e:
+        logger.warning("Nao foi possivel salvar estado das regras: %s", e)
+    await close_http_client()
+    await close_notification_clients()
+    try:
+        from .ml.model import shutdown_pool
+        shutdown_pool()
+    except Exception:
+        pass
+
 # Registrar routers principais
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
@@ -41,6 +93,8 @@ app.include_router(silos.router, prefix="/api/silos", tags=["silos"])
 app.include_router(readings.router, prefix="/api/readings", tags=["readings"])
 app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
+app.include_router(stream.router, prefix="/api/stream", tags=["stream"])
+app.include_router(metrics_routes.router, tags=["metrics"])
 
 # Tentar registrar router ML de forma condicional:
 try:
@@ -0,0 +1,186 @@
+"""
+metrics.py
+Métricas Prometheus (exposição em GET /metrics, ver routes/metrics.py).
+
+- latência HTTP por rota (template da rota, não o path bruto) via middleware
+  ASGI puro: não bufferiza o corpo e não interfere no stream SSE;
+- duração de cada etapa da ingestão, por origem (http / thingspeak);
+- ciclo do poller do ThingSpeak e atraso (lag) por canal;
+- envios de notificação por canal/resultado e o outbox;
+- caches (modelo ML, silos, usuários) lidos no momento da coleta.
+
+Observar um histograma custa poucos microssegundos. Os contadores são por
+processo; com vários workers do uvicorn cada um expõe os seus.
+"""
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Buckets para operações curtas (etapas de ingestão, Mongo) e para requisições HTTP
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route", "status"),
+    buckets=HTTP_BUCKETS,
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_duration_seconds", "Duração de cada etapa do pipeline de ingestão", ("source", "stage"),
+    buckets=FAST_BUCKETS,
+)
+INGEST_READINGS = Counter(
+    "ingest_readings_total", "Leituras recebidas pela ingestão, por resultado", ("source", "status"),
+)
+INGEST_ALERTS = Counter(
+    "ingest_alerts_total", "Alertas disparados pela ingestão (inseridos ou suprimidos)", ("source", "result"),
+)
+THINGSPEAK_CYCLE_SECONDS = Histogram(
+    "thingspeak_poll_cycle_seconds", "Duração de um ciclo completo do poller do ThingSpeak",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+THINGSPEAK_CHANNEL_SECONDS = Histogram(
+    "thingspeak_channel_poll_seconds", "Duração da consulta + ingestão de um canal", ("channel",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+THINGSPEAK_CHANNEL_LAG = Gauge(
+    "thingspeak_channel_lag_seconds", "Atraso entre agora e a última entrada ingerida do canal", ("channel",),
+)
+THINGSPEAK_CHANNEL_ERRORS = Counter(
+    "thingspeak_channel_errors_total", "Ciclos com falha por canal", ("channel",),
+)
+NOTIFICATIONS_SENT = Counter(
+    "notifications_sent_total", "Envios de notificação por canal e resultado", ("channel", "result"),
+)
+NOTIFICATION_FANOUT_SECONDS = Histogram(
+    "notification_fanout_seconds", "Duração do envio de um alerta a todos os destinos",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+OUTBOX_DISPATCHED = Counter(
+    "notification_outbox_processed_total", "Entradas do outbox processadas, por resultado", ("status",),
+)
+
+
+class StageTimer:
+    """
+    Cronômetro de etapas: `lap(stage)` registra o tempo desde a marca anterior.
+    Uma instância por lote de ingestão.
+    """
+    __slots__ = ("source", "t")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.t = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        INGEST_STAGE_SECONDS.labels(self.source, stage).observe(now - self.t)
+        self.t = now
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: observa a latência por (método, rota, status)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route_of(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            # Starlette 0.27 não expõe a rota no scope; mapeia endpoint -> path uma vez
+            route = "unmatched"
+            for r in scope["app"].routes:
+                if getattr(r, "endpoint", None) is endpoint:
+                    route = r.path
+                    break
+            self._routes[endpoint] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        state = {"status": 500, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for k, v in message.get("headers", ()):
+                    if k == b"content-type" and v.startswith(b"text/event-stream"):
+                        state["stream"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Conexões SSE duram o tempo que o cliente quiser: não entram no histograma
+            if not state["stream"]:
+                HTTP_REQUEST_SECONDS.labels(
+                    scope["method"], self._route_of(scope), str(state["status"])
+                ).observe(time.perf_counter() - t0)
+
+
+class _RuntimeCollector:
+    """Lê no momento da coleta os contadores já mantidos em memória pelos módulos."""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Acertos de cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Faltas de cache", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entradas no cache", labels=["cache"])
+        for name, stats in _cache_stats().items():
+            hits.add_metric([name], stats.get("hits", 0))
+            misses.add_metric([name], stats.get("misses", 0))
+            if "size" in stats:
+                size.add_metric([name], stats["size"])
+        yield hits
+        yield misses
+        yield size
+
+        try:
+            from .services.pubsub import hub
+            st = hub.stats()
+            yield GaugeMetricFamily("stream_subscribers", "Clientes conectados ao stream SSE", value=st["subscribers"])
+            yield CounterMetricFamily("stream_events_dropped", "Eventos descartados por filas cheias", value=st["dropped"])
+        except Exception:
+            pass
+
+
+def _cache_stats() -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    try:
+        from .utils import silo_cache_stats
+        out["silo"] = silo_cache_stats()
+    except Exception:
+        pass
+    try:
+        from .auth import user_cache_stats
+        out["user"] = user_cache_stats()
+    except Exception:
+        pass
+    try:
+        from .services.suppression import suppression_stats
+        out["alert_suppression"] = suppression_stats()["cache"]
+    except Exception:
+        pass
+    try:
+        # import lazy: sem scikit-learn o módulo de ML pode não carregar
+        from .ml.model import model_cache_stats
+        out["ml_model"] = model_cache_stats()
+    except Exception:
+        pass
+    return out
+
+
+_collector: Optional[_RuntimeCollector] = None
+
+
+def register_runtime_collector():
+    global _collector
+    if _collector is None:
+        _collector = _RuntimeCollector()
+        REGISTRY.register(_collector)
@@ -0,0 +1,167 @@
+"""
+ml/jobs.py
+Execução do retreino como job em background, com id, status e progresso.
+API e agendamento noturno usam o mesmo caminho (start_retrain).
+
+Com vários workers do uvicorn cada processo tem seu agendador e recebe POSTs,
+então a exclusão é feita no Mongo:
+- `locks` guarda um documento único (_id=ml_retrain) com o job dono e um lease;
+  o lease é renovado enquanto o job roda e, se o processo cair, expira e libera
+  o próximo retreino;
+- os jobs ficam em `ml_jobs` (status e progresso visíveis de qualquer worker);
+- o retreino agendado usa um id por dia, então só um worker o executa mesmo
+  que o job termine antes de outro worker disparar o cron.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .. import config, db
+from . import model
+
+logger = logging.getLogger("uvicorn.error")
+
+MAX_JOBS_KEPT = 20
+LOCK_ID = "ml_retrain"
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# Jobs em execução neste processo (progresso ao vivo, antes do próximo heartbeat)
+_local: dict = {}
+
+
+class RetrainInProgress(Exception):
+    def __init__(self, job_id: str):
+        super().__init__(f"Retreino já em andamento: {job_id}")
+        self.job_id = job_id
+
+
+def _lease() -> timedelta:
+    return timedelta(seconds=config.ML_RETRAIN_LEASE_SEC)
+
+
+async def _acquire(job_id: str) -> Optional[str]:
+    """Tenta tomar o lock; retorna None se conseguiu, senão o id do job que o detém."""
+    now = datetime.utcnow()
+    try:
+        await db.db.locks.find_one_and_update(
+            {"_id": LOCK_ID, "$or": [{"job_id": None}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"job_id": job_id, "owner": _OWNER, "expires_at": now + _lease()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return None
+    except DuplicateKeyError:
+        # Documento existe e está com lease válido: o upsert colide no _id
+        held = await db.db.locks.find_one({"_id": LOCK_ID}, {"job_id": 1})
+        return (held or {}).get("job_id") or "?"
+
+
+async def _renew(job_id: str) -> bool:
+    res = await db.db.locks.update_one(
+        {"_id": LOCK_ID, "job_id": job_id}, {"$set": {"expires_at": datetime.utcnow() + _lease()}}
+    )
+    return res.matched_count == 1
+
+
+async def _release(job_id: str):
+    await db.db.locks.update_one(
+        {"_id": LOCK_ID, "job_id": job_id}, {"$set": {"job_id": None, "expires_at": datetime.utcnow()}}
+    )
+
+
+async def _save(job: dict, *fields: str):
+    await db.db.ml_jobs.update_one({"_id": job["id"]}, {"$set": {f: job[f] for f in fields}})
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    if job_id in _local:
+        return _local[job_id]
+    return await db.db.ml_jobs.find_one({"_id": job_id}, {"_id": 0})
+
+
+async def current_job() -> Optional[dict]:
+    lock = await db.db.locks.find_one({"_id": LOCK_ID})
+    if not lock or not lock.get("job_id") or lock.get("expires_at", datetime.min) <= datetime.utcnow():
+        return None
+    return await get_job(lock["job_id"])
+
+
+async def list_jobs() -> list:
+    cursor = db.db.ml_jobs.find({}, {"_id": 0}).sort("created_at", -1).limit(MAX_JOBS_KEPT)
+    return [_local.get(j["id"], j) async for j in cursor]
+
+
+async def _heartbeat(job: dict):
+    """Renova o lease e publica o progresso enquanto o job roda."""
+    while True:
+        await asyncio.sleep(config.ML_RETRAIN_LEASE_SEC / 3)
+        try:
+            if not await _renew(job["id"]):
+                logger.warning("Retreino %s perdeu o lock (lease expirado)", job["id"])
+            await _save(job, "progress")
+        except Exception as e:
+            logger.warning("Falha no heartbeat do retreino %s: %s", job["id"], e)
+
+
+async def _run(job: dict, days: int):
+    hb = asyncio.create_task(_heartbeat(job))
+    try:
+        job["status"] = "running"
+        await _save(job, "status")
+        result = await model.retrain(days=days, progress=job["progress"])
+        job["result"] = result
+        job["status"] = "done" if result.get("status") == "ok" else "skipped"
+    except Exception as e:
+        logger.exception("Falha no retreino %s: %s", job["id"], e)
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        hb.cancel()
+        job["finished_at"] = datetime.utcnow()
+        try:
+            await _save(job, "status", "progress", "result", "error", "finished_at")
+        finally:
+            await _release(job["id"])
+            _local.pop(job["id"], None)
+
+
+async def start_retrain(days: int = 30, trigger: str = "api", job_id: Optional[str] = None) -> dict:
+    """
+    Cria e agenda um job de retreino e retorna imediatamente.
+    Lança RetrainInProgress se já houver um em execução em qualquer worker (ou
+    se `job_id` já existir, ex.: o retreino agendado do dia já rodou).
+    """
+    job_id = job_id or str(uuid.uuid4())
+    holder = await _acquire(job_id)
+    if holder is not None:
+        raise RetrainInProgress(holder)
+    job = {
+        "id": job_id,
+        "status": "queued",
+        "trigger": trigger,
+        "days": days,
+        "created_at": datetime.utcnow(),
+        "finished_at": None,
+        "progress": {"stage": "queued"},
+        "result": None,
+        "error": None,
+        "worker": _OWNER,
+    }
+    try:
+        await db.db.ml_jobs.insert_one({"_id": job_id, **job})
+    except DuplicateKeyError:
+        await _release(job_id)
+        raise RetrainInProgress(job_id)
+    except Exception:
+        await _release(job_id)
+        raise
+    _local[job_id] = job
+    asyncio.create_task(_run(job, days))
+    return job
@@ -3,36 +3,211 @@ ml/model.py
 Treino e inferência de IsolationForest.
 Armazena modelos em collection ml_models como bytes (pickle).
 """
+import asyncio
+import multiprocessing
 import pickle
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.ensemble import IsolationForest
-from .. import db
+from .. import db, config
 import numpy as np
 from datetime import datetime, timedelta
 
 MODEL_NAME = "isolation_v1"
+logger = logging.getLogger("uvicorn.error")
 
-async def _fetch_training_data(days=30):
+FEATURES = ("temp_C", "rh_pct", "co2_ppm_est", "mq2_raw")
+_PROJECTION = {"_id": 0, **{f: 1 for f in FEATURES}}
+
+
+def _parse_row(r: dict, out: np.ndarray) -> bool:
+    """Preenche `out` com as features de `r` (ausentes -> 0). False se inválida."""
+    for j, f in enumerate(FEATURES):
+        v = r.get(f)
+        if v is None:
+            out[j] = 0.0
+            continue
+        try:
+            out[j] = float(v)
+        except (TypeError, ValueError):
+            return False
+    return bool(np.isfinite(out).all())
+
+
+class _Reservoir:
+    """Amostragem por reservatório (Algorithm R) em um array pré-alocado."""
+
+    def __init__(self, cap: int, dtype, rng):
+        self.data = np.empty((cap, len(FEATURES)), dtype=dtype)
+        self.cap = cap
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, row: np.ndarray):
+        if self.seen < self.cap:
+            self.data[self.seen] = row
+        else:
+            k = self.rng.integers(0, self.seen + 1)
+            if k < self.cap:
+                self.data[k] = row
+        self.seen += 1
+
+    def values(self) -> np.ndarray:
+        return self.data[:min(self.seen, self.cap)]
+
+
+class _GrowingMatrix:
+    """Array que cresce por duplicação; evita listas de listas intermediárias."""
+
+    def __init__(self, dtype, initial: int = 65536):
+        self.data = np.empty((initial, len(FEATURES)), dtype=dtype)
+        self.n = 0
+
+    def add(self, row: np.ndarray):
+        if self.n == self.data.shape[0]:
+            grown = np.empty((self.data.shape[0] * 2, len(FEATURES)), dtype=self.data.dtype)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        self.data[self.n] = row
+        self.n += 1
+
+    def values(self) -> np.ndarray:
+        return self.data[:self.n].copy()
+
+
+async def _fetch_training_data(days=30, sample_cap=None, stratify=None, dtype=None, batch_size=None):
+    """
+    Carrega as features de treino em streaming.
+
+    - projeta apenas os quatro campos de features (e silo_id se estratificado);
+    - lê com batch_size grande (ML_FETCH_BATCH_SIZE);
+    - preenche um array float32/float64 crescido por blocos, ou um reservatório
+      pré-alocado quando há limite de amostras (sample_cap / ML_TRAIN_SAMPLE_CAP);
+    - com stratify=True o limite é dividido igualmente entre os silos.
+
+    Retorna (X, stats) com stats = rows_fetched, rows_skipped, rows_used, fetch_time_s.
+    """
+    sample_cap = config.ML_TRAIN_SAMPLE_CAP if sample_cap is None else sample_cap
+    stratify = config.ML_TRAIN_STRATIFY if stratify is None else stratify
+    dtype = np.dtype(dtype or config.ML_TRAIN_DTYPE)
+    batch_size = batch_size or config.ML_FETCH_BATCH_SIZE
+
+    t0 = time.perf_counter()
     since = datetime.utcnow() - timedelta(days=days)
-    cursor = db.db.readings.find({"timestamp": {"$gte": since}})
-    X = []
+    query = {"timestamp": {"$gte": since}}
+    projection = dict(_PROJECTION)
+    rng = np.random.default_rng()
+
+    per_silo = None
+    if sample_cap and stratify:
+        projection["silo_id"] = 1
+        silos = await db.db.readings.distinct("silo_id", query)
+        per_silo = max(1, sample_cap // max(1, len(silos)))
+        buckets = {}
+    elif sample_cap:
+        sink = _Reservoir(sample_cap, dtype, rng)
+    else:
+        sink = _GrowingMatrix(dtype)
+
+    fetched = skipped = 0
+    row = np.empty(len(FEATURES), dtype=np.float64)
+    cursor = db.db.readings.find(query, projection, batch_size=batch_size)
     async for r in cursor:
-        X.append([
-            r.get("temp_C", 0.0),
-            r.get("rh_pct", 0.0),
-            r.get("co2_ppm_est", 0.0),
-            r.get("mq2_raw", 0)
-        ])
-    return np.array(X) if X else np.empty((0,4))
-
-async def retrain(days=30):
-    X = await _fetch_training_data(days)
-    if X.shape[0] < 10:
-        return {"status": "not enough data"}
+        fetched += 1
+        if not _parse_row(r, row):
+            skipped += 1
+            continue
+        if per_silo is not None:
+            silo = r.get("silo_id")
+            if silo not in buckets:
+                buckets[silo] = _Reservoir(per_silo, dtype, rng)
+            buckets[silo].add(row)
+        else:
+            sink.add(row)
+
+    if per_silo is not None:
+        parts = [b.values() for b in buckets.values()]
+        X = np.concatenate(parts) if parts else np.empty((0, len(FEATURES)), dtype=dtype)
+    else:
+        X = sink.values()
+    stats = {
+        "rows_fetched": fetched,
+        "rows_skipped": skipped,
+        "rows_used": int(X.shape[0]),
+        "sampled": bool(sample_cap),
+        "fetch_time_s": round(time.perf_counter() - t0, 3),
+    }
+    logger.info("Dados de treino carregados: %s", stats)
+    return X, stats
+
+def _fit_and_serialize(X: np.ndarray):
+    """
+    Executado no process pool (fora do event loop): treina o IsolationForest e
+    devolve (pickle do modelo, tempo de fit em segundos).
+    """
+    t0 = time.perf_counter()
     model = IsolationForest(n_estimators=100, contamination=0.01, random_state=42)
     model.fit(X)
-    payload = pickle.dumps(model)
-    await db.db.ml_models.update_one({"name": MODEL_NAME}, {"$set": {"name": MODEL_NAME, "model": payload, "trained_at": datetime.utcnow()}}, upsert=True)
-    return {"status": "ok", "trained_samples": int(X.shape[0])}
+    fit_time = time.perf_counter() - t0
+    return pickle.dumps(model), fit_time
+
+
+_pool = None
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    # "spawn" evita herdar por fork as threads do Motor/uvicorn do processo pai.
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def retrain(days=30, progress: dict = None):
+    """
+    Retreina o modelo. O fit e a serialização rodam num processo separado, então o
+    event loop (API + poller) continua respondendo. `progress`, se informado, é
+    atualizado in-place (stage, rows_loaded, fit_time_s, model_size_bytes).
+    """
+    progress = progress if progress is not None else {}
+    progress["stage"] = "loading"
+    X, stats = await _fetch_training_data(days)
+    progress["rows_loaded"] = int(X.shape[0])
+    progress["fetch"] = stats
+    if X.shape[0] < 10:
+        return {"status": "not enough data", "fetch": stats}
+
+    progress["stage"] = "fitting"
+    loop = asyncio.get_running_loop()
+    payload, fit_time = await loop.run_in_executor(_process_pool(), _fit_and_serialize, X)
+    progress["fit_time_s"] = round(fit_time, 3)
+    progress["model_size_bytes"] = len(payload)
+
+    progress["stage"] = "saving"
+    # Mongo guarda datas com precisão de milissegundos; truncamos para que a
+    # versão em cache compare igual à lida pela sonda.
+    now = datetime.utcnow()
+    trained_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    await db.db.ml_models.update_one({"name": MODEL_NAME}, {"$set": {"name": MODEL_NAME, "model": payload, "trained_at": trained_at}}, upsert=True)
+    # Sinaliza o cache deste processo com o modelo novo (desserializado numa thread).
+    model = await asyncio.to_thread(pickle.loads, payload)
+    _model_cache.set(model, trained_at)
+    progress["stage"] = "done"
+    return {
+        "status": "ok",
+        "trained_samples": int(X.shape[0]),
+        "fit_time_s": progress["fit_time_s"],
+        "model_size_bytes": len(payload),
+        "fetch": stats,
+    }
 
 async def load_model():
     doc = await db.db.ml_models.find_one({"name": MODEL_NAME})
@@ -40,12 +215,142 @@ async def load_model():
         return None
     return pickle.loads(doc["model"])
 
+
+class _ModelCache:
+    """
+    Cache em processo do modelo desserializado, versionado por `trained_at`.
+
+    - Cold start (nada em cache): carrega de forma síncrona uma única vez (miss).
+    - Demais chamadas retornam o objeto em memória (hit). A cada
+      ML_MODEL_REFRESH_SEC uma sonda barata (projeção só de `trained_at`) roda em
+      background; se a versão mudou, o modelo novo é desserializado numa thread
+      e trocado atomicamente, sem bloquear quem está pontuando.
+    - retrain() chama set() com o modelo recém treinado.
+    """
+
+    def __init__(self, refresh_sec: float):
+        self.refresh_sec = refresh_sec
+        self.model = None
+        self.version = None
+        self.loaded = False
+        self.checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.probes = 0
+        self._refresh_task = None
+        self._lock = asyncio.Lock()
+
+    def set(self, model, version):
+        self.model = model
+        self.version = version
+        self.loaded = True
+        self.checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Força uma nova sonda de versão na próxima chamada."""
+        self.checked_at = 0.0
+
+    async def _load(self):
+        doc = await db.db.ml_models.find_one({"name": MODEL_NAME})
+        if not doc:
+            self.set(None, None)
+            return
+        model = await asyncio.to_thread(pickle.loads, doc["model"])
+        self.reloads += 1
+        self.set(model, doc.get("trained_at"))
+
+    async def _refresh(self):
+        try:
+            self.probes += 1
+            doc = await db.db.ml_models.find_one({"name": MODEL_NAME}, {"trained_at": 1})
+            version = doc.get("trained_at") if doc else None
+            if version != self.version:
+                await self._load()
+            else:
+                self.checked_at = time.monotonic()
+        except Exception as e:
+            logger.warning("Falha ao atualizar cache do modelo: %s", e)
+            self.checked_at = time.monotonic()
+
+    async def get(self):
+        if not self.loaded:
+            self.misses += 1
+            async with self._lock:
+                if not self.loaded:
+                    await self._load()
+            return self.model
+        self.hits += 1
+        stale = time.monotonic() - self.checked_at >= self.refresh_sec
+        if stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self.model
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "version": self.version.isoformat() if isinstance(self.version, datetime) else self.version,
+            "loaded": self.model is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else None,
+            "reloads": self.reloads,
+            "probes": self.probes,
+        }
+
+
+_model_cache = _ModelCache(refresh_sec=config.ML_MODEL_REFRESH_SEC)
+
+
+async def get_model():
+    """Retorna o modelo atual a partir do cache em processo (ver _ModelCache)."""
+    return await _model_cache.get()
+
+
+def model_cache_stats() -> dict:
+    return _model_cache.stats()
+
+
+def invalidate_model_cache():
+    _model_cache.invalidate()
+
+def _feature_matrix(readings: list) -> np.ndarray:
+    """Monta uma matriz float64 C-contígua (N x 4); campos ausentes viram 0."""
+    X = np.zeros((len(readings), len(FEATURES)), dtype=np.float64)
+    for i, r in enumerate(readings):
+        for j, f in enumerate(FEATURES):
+            v = r.get(f)
+            if v is not None:
+                X[i, j] = v
+    return X
+
+
+def _score(model, X: np.ndarray):
+    """
+    Percorre a floresta uma única vez. IsolationForest.predict é definido como
+    decision_function < 0 -> -1, então o rótulo sai do próprio score.
+    """
+    scores = model.decision_function(X)
+    return scores, scores < 0
+
+
 async def detect_anomaly(reading: dict):
-    model = await load_model()
+    model = await get_model()
     if not model:
         return False, None
-    X = [[reading.get("temp_C",0), reading.get("rh_pct",0), reading.get("co2_ppm_est",0), reading.get("mq2_raw",0)]]
-    score = model.decision_function(X)[0]
-    pred = model.predict(X)[0]  # -1 anomaly, 1 normal
-    is_anom = pred == -1
-    return bool(is_anom), float(score)
+    scores, is_anom = _score(model, _feature_matrix([reading]))
+    return bool(is_anom[0]), float(scores[0])
+
+async def detect_anomalies(readings: list):
+    """
+    Versão em lote de detect_anomaly: monta uma matriz contígua e pontua todas
+    as leituras numa única chamada vetorizada.
+    Retorna lista de (is_anom, score) na mesma ordem da entrada.
+    """
+    if not readings:
+        return []
+    model = await get_model()
+    if not model:
+        return [(False, None)] * len(readings)
+    scores, is_anom = _score(model, _feature_matrix(readings))
+    return list(zip(is_anom.tolist(), scores.tolist()))
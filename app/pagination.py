@@ -0,0 +1,47 @@
+"""
+pagination.py
+Paginação por keyset (timestamp, _id) com cursor opaco.
+O cursor codifica a última posição retornada; a próxima página é uma faixa do
+índice (..., timestamp, _id) logo após essa posição, sem skip.
+
+Coleções antigas misturam _id ObjectId (legado) e string. O cursor guarda o
+tipo do _id para decodificá-lo de volta ao mesmo tipo BSON: comparar um
+ObjectId com sua forma string cairia em outra faixa da ordenação.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from bson import ObjectId
+
+
+def encode_cursor(ts: datetime, _id: Any) -> str:
+    data = {"t": ts.isoformat(), "id": str(_id) if isinstance(_id, ObjectId) else _id}
+    if isinstance(_id, ObjectId):
+        data["k"] = "oid"
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """Decodifica um cursor de encode_cursor; ValueError se inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        _id = ObjectId(data["id"]) if data.get("k") == "oid" else data["id"]
+        return datetime.fromisoformat(data["t"]), _id
+    except Exception as e:
+        raise ValueError("cursor inválido") from e
+
+
+def keyset_after(ts: datetime, _id: Any, field: str = "timestamp") -> Dict[str, Any]:
+    """
+    Filtro para itens posteriores a (ts, _id) na ordem (field desc, _id desc).
+    $lt só compara valores do mesmo tipo; na ordem BSON toda string vem antes de
+    qualquer ObjectId, então depois de um ObjectId seguem também as strings.
+    """
+    tail = [{field: ts, "_id": {"$lt": _id}}]
+    if isinstance(_id, ObjectId):
+        tail.append({field: ts, "_id": {"$type": "string"}})
+    return {"$or": [{field: {"$lt": ts}}, *tail]}
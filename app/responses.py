@@ -0,0 +1,114 @@
+"""
+responses.py
+Serialização rápida para os endpoints de listagem/gráficos.
+
+- JSON com orjson direto dos dicts do cursor (datetime nativo, sem passar por
+  validação pydantic/jsonable_encoder);
+- application/msgpack quando o cliente pede no Accept e o pacote msgpack está
+  instalado (opcional); datas vão como a extensão Timestamp (UTC);
+- compressão negociada pelo Accept-Encoding: br (se o pacote brotli estiver
+  instalado) ou gzip, só acima de RESPONSE_COMPRESS_MIN_BYTES.
+No JSON, o formato das datas é o mesmo do caminho padrão do FastAPI (ISO 8601 sem fuso).
+"""
+import gzip
+from datetime import datetime, date, timezone
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response
+
+from . import config
+
+try:
+    import brotli  # opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack  # opcional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+VARY = "Accept, Accept-Encoding"
+
+
+def _default(o):
+    # orjson já cobre datetime/date/UUID; o restante (ex.: ObjectId, Decimal) vira str
+    return str(o)
+
+
+def _msgpack_default(o):
+    # datetime vira a extensão Timestamp do msgpack (Date no cliente JS); naive = UTC
+    if isinstance(o, datetime):
+        return msgpack.Timestamp.from_datetime(o if o.tzinfo else o.replace(tzinfo=timezone.utc))
+    if isinstance(o, date):
+        return o.isoformat()
+    return str(o)
+
+
+def dumps_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def _accepts(header: str, token: str) -> bool:
+    """True se `token` aparece no header com q > 0."""
+    for part in header.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == token:
+            q = params.strip()
+            return not (q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"))
+    return False
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(_accepts(accept, t) for t in MSGPACK_TYPES)
+
+
+def compress(body: bytes, accept_encoding: str):
+    """Retorna (body, content-encoding ou None) conforme o Accept-Encoding."""
+    if len(body) < config.RESPONSE_COMPRESS_MIN_BYTES or not accept_encoding:
+        return body, None
+    if brotli is not None and _accepts(accept_encoding, "br"):
+        return brotli.compress(body, quality=config.RESPONSE_BROTLI_QUALITY), "br"
+    if _accepts(accept_encoding, "gzip"):
+        return gzip.compress(body, compresslevel=config.RESPONSE_GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def fast_responses(schema: Dict[str, Any], description: str, cursor: bool = False) -> Dict[int, Dict[str, Any]]:
+    """
+    `responses` do OpenAPI para rotas que retornam fast_response (usar com
+    response_class=Response): o corpo não passa por response_model, então o
+    contrato documentado é declarado aqui (tipos de conteúdo e headers).
+    """
+    headers = {
+        "Vary": {"description": "Conteúdo negociado por Accept e Accept-Encoding", "schema": {"type": "string"}},
+        "Content-Encoding": {"description": "br ou gzip, quando negociado", "schema": {"type": "string"}},
+    }
+    if cursor:
+        headers["X-Next-Cursor"] = {
+            "description": "Presente quando a página vem cheia: valor do parâmetro `cursor` da próxima página",
+            "schema": {"type": "string"},
+        }
+    content = {media: {"schema": schema} for media in ("application/json", MSGPACK_TYPES[0])}
+    return {200: {"description": description, "headers": headers, "content": content}}
+
+
+def fast_response(request: Request, content: Any, status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serializa `content` (JSON/msgpack) e comprime conforme o que o cliente aceita."""
+    if wants_msgpack(request):
+        body, media_type = dumps_msgpack(content), "application/msgpack"
+    else:
+        body, media_type = dumps_json(content), "application/json"
+    body, encoding = compress(body, request.headers.get("accept-encoding", ""))
+    out = {"Vary": VARY, **(headers or {})}
+    if encoding:
+        out["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=out)
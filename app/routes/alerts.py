@@ -1,25 +1,115 @@
 """
 routes/alerts.py
-Listar alertas e marcar como acknowledged.
+Listar alertas (filtros + paginação por keyset) e marcar como acknowledged,
+individualmente ou em lote.
 """
-from fastapi import APIRouter, Depends, HTTPException
-from .. import db, auth
-from typing import List
-from ..schemas import AlertOut
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from .. import db, auth, config
+from typing import Optional
+from ..schemas import AlertOut, AlertAckIn
 from datetime import datetime
+from ..pagination import encode_cursor, decode_cursor, keyset_after
+from ..responses import fast_response, fast_responses
+from ..services.pubsub import hub
+from ..services import silo_state
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
-async def list_alerts(_=Depends(auth.get_current_user)):
-    cursor = db.db.alerts.find({}).sort("timestamp", -1).limit(100)
-    res = []
-    async for a in cursor:
-        res.append(a)
-    return res
+def _time_range(from_: Optional[datetime], to: Optional[datetime]) -> dict:
+    rng = {}
+    if from_:
+        rng["$gte"] = from_
+    if to:
+        rng["$lt"] = to
+    return rng
+
+@router.get("/", response_class=Response, responses=fast_responses(
+    {"type": "array", "items": {"type": "object"}}, "Alertas, mais recentes primeiro", cursor=True))
+async def list_alerts(
+    request: Request,
+    silo_id: Optional[str] = Query(None, description="Filtrar por ID do silo"),
+    level: Optional[str] = Query(None, description="Nível(is) separados por vírgula, ex.: warning,critical"),
+    acknowledged: Optional[bool] = Query(None, description="true/false; omitido = todos"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Timestamp inicial (inclusivo)"),
+    to: Optional[datetime] = Query(None, description="Timestamp final (exclusivo)"),
+    limit: int = Query(100, ge=1, description="Tamanho da página (limitado a ALERTS_MAX_PAGE_SIZE)"),
+    cursor: Optional[str] = Query(None, description="Cursor da página seguinte (header X-Next-Cursor)"),
+    _=Depends(auth.get_current_user),
+):
+    """
+    Lista alertas (mais recentes primeiro). Paginação por keyset: quando a
+    página vem cheia, o header X-Next-Cursor traz o cursor da próxima chamada.
+    """
+    limit = min(limit, config.ALERTS_MAX_PAGE_SIZE)
+    query = {}
+    if silo_id:
+        query["silo_id"] = silo_id
+    if acknowledged is not None:
+        query["acknowledged"] = acknowledged
+    if level:
+        levels = [lvl.strip() for lvl in level.split(",") if lvl.strip()]
+        query["level"] = levels[0] if len(levels) == 1 else {"$in": levels}
+    rng = _time_range(from_, to)
+    if rng:
+        query["timestamp"] = rng
+    if cursor:
+        try:
+            ts, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        query.update(keyset_after(ts, last_id))
+
+    res = await db.db.alerts.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit).to_list(length=limit)
+    headers = {}
+    if len(res) == limit:
+        last = res[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["timestamp"], last["_id"])
+    return fast_response(request, res, headers=headers)
+
+@router.post("/ack")
+async def ack_alerts(body: AlertAckIn, user=Depends(auth.get_current_user)):
+    """
+    Reconhece em lote, com um único update_many: por `ids`, por filtro
+    (silo_id, level, rule, from, to) ou pela combinação dos dois.
+    """
+    query = {"acknowledged": False}
+    if body.ids is not None:
+        query["_id"] = {"$in": body.ids}
+    for field in ("silo_id", "level", "rule"):
+        value = getattr(body, field)
+        if value:
+            query[field] = value
+    rng = _time_range(body.from_, body.to)
+    if rng:
+        query["timestamp"] = rng
+    if len(query) == 1:
+        raise HTTPException(status_code=400, detail="Informe ids ou ao menos um filtro")
+
+    # Silos afetados (para recalcular silo_state e avisar o stream); com `ids`,
+    # cada silo recebe só os seus (a lista é limitada, então busca os pares)
+    ids_by_silo = {}
+    if body.ids is not None:
+        async for a in db.db.alerts.find(query, {"silo_id": 1}):
+            ids_by_silo.setdefault(a.get("silo_id"), []).append(a["_id"])
+        silos = list(ids_by_silo)
+    else:
+        silos = [body.silo_id] if body.silo_id else await db.db.alerts.distinct("silo_id", query)
+    now = datetime.utcnow()
+    result = await db.db.alerts.update_many(query, {"$set": {"acknowledged": True, "ack_by": user["_id"], "ack_at": now}})
+    if result.modified_count:
+        await silo_state.refresh_alert_counts(silos)
+        for sid in silos:
+            hub.publish("alert_ack_bulk", sid, {"silo_id": sid, "ids": ids_by_silo.get(sid), "ack_by": user["_id"], "ack_at": now})
+    return {"status": "ok", "matched": result.matched_count, "acknowledged": result.modified_count}
 
 @router.post("/ack/{alert_id}")
 async def ack_alert(alert_id: str, user=Depends(auth.get_current_user)):
-    await db.db.alerts.update_one({"_id": alert_id}, {"$set": {"acknowledged": True, "ack_by": user["_id"], "ack_at": datetime.utcnow()}})
+    now = datetime.utcnow()
+    alert = await db.db.alerts.find_one_and_update(
+        {"_id": alert_id}, {"$set": {"acknowledged": True, "ack_by": user["_id"], "ack_at": now}}, projection={"silo_id": 1}
+    )
+    if alert:
+        await silo_state.refresh_alert_counts([alert.get("silo_id")])
+        hub.publish("alert_ack", alert.get("silo_id"), {"_id": alert_id, "ack_by": user["_id"], "ack_at": now})
     # Registrar auditoria (omissão por brevidade)
     return {"status": "ok"}
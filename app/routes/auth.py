@@ -1,12 +1,13 @@
 """
 routes/auth.py
 Rotas: login, refresh, seed-admin, logout.
-Modificadas para persistir refresh tokens (hashed) e permitir logout/revogação.
+Refresh tokens persistidos como HMAC-SHA256 por jti (várias sessões por usuário),
+com rotação no refresh e revogação no logout.
 """
 from fastapi import APIRouter, HTTPException, Depends, Body
 from ..schemas import LoginIn, Token, UserCreate
 from .. import db, auth, config
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
 
 router = APIRouter()
@@ -14,50 +15,50 @@ router = APIRouter()
 @router.post("/login", response_model=Token)
 async def login(data: LoginIn):
     user = await db.db.users.find_one({"username": data.username})
-    if not user or not auth.verify_password(data.password, user["password_hash"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
-    access, refresh = auth.create_tokens(str(user["_id"]))
-    # Armazenar refresh token hashed para maior segurança
-    hashed = auth.pwd_context.hash(refresh)
-    expires_at = datetime.utcnow() + timedelta(days=config.JWT_REFRESH_EXPIRE_DAYS)
-    await db.db.refresh_tokens.update_one(
-        {"user_id": str(user["_id"])},
-        {"$set": {"user_id": str(user["_id"]), "token_hash": hashed, "expires_at": expires_at}},
-        upsert=True
-    )
+    ok, new_hash = await auth.verify_and_update_password(data.password, user["password_hash"])
+    if not ok:
+        raise HTTPException(status_code=401, detail="Credenciais inválidas")
+    if new_hash:
+        # Custo do bcrypt mudou: regrava o hash de forma transparente
+        await db.db.users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+    # Refresh token armazenado como HMAC, um documento por sessão (jti)
+    access, refresh = await auth.issue_tokens(str(user["_id"]))
     return {"access_token": access, "refresh_token": refresh}
 
-@router.post("/refresh", response_model=Token)
-async def refresh(token: str = Body(...)):
+def _decode_refresh(token: str) -> dict:
     try:
         payload = auth.jwt.decode(token, config.JWT_SECRET, algorithms=["HS256"])
-        user_id = payload.get("sub")
     except Exception:
         raise HTTPException(status_code=401, detail="Refresh inválido")
-    # Verifica token hashed salvo
-    doc = await db.db.refresh_tokens.find_one({"user_id": str(user_id)})
-    if not doc or not auth.pwd_context.verify(token, doc.get("token_hash", "")):
+    if not payload.get("sub") or not payload.get("jti"):
+        raise HTTPException(status_code=401, detail="Refresh inválido")
+    return payload
+
+@router.post("/refresh", response_model=Token)
+async def refresh(token: str = Body(...)):
+    payload = _decode_refresh(token)
+    user_id, jti = str(payload["sub"]), payload["jti"]
+    # Verifica digest salvo (comparação em tempo constante)
+    doc = await db.db.refresh_tokens.find_one({"_id": jti})
+    if not doc or doc.get("user_id") != user_id or not auth.refresh_token_matches(token, doc.get("token_hash")):
+        raise HTTPException(status_code=401, detail="Refresh inválido ou revogado")
+    # Rotaciona tokens: o jti antigo é consumido uma única vez (evita reuso concorrente)
+    res = await db.db.refresh_tokens.delete_one({"_id": jti})
+    if res.deleted_count != 1:
         raise HTTPException(status_code=401, detail="Refresh inválido ou revogado")
-    # Rotaciona tokens: cria novos e atualiza hash
-    access, new_refresh = auth.create_tokens(user_id)
-    new_hashed = auth.pwd_context.hash(new_refresh)
-    expires_at = datetime.utcnow() + timedelta(days=config.JWT_REFRESH_EXPIRE_DAYS)
-    await db.db.refresh_tokens.update_one({"user_id": str(user_id)}, {"$set": {"token_hash": new_hashed, "expires_at": expires_at}})
+    access, new_refresh = await auth.issue_tokens(user_id)
     return {"access_token": access, "refresh_token": new_refresh}
 
 @router.post("/logout")
 async def logout(token: str = Body(...)):
     """
-    Logout: revoga refresh token enviado pelo cliente.
+    Logout: revoga o refresh token (sessão) enviado pelo cliente.
     """
-    try:
-        payload = auth.jwt.decode(token, config.JWT_SECRET, algorithms=["HS256"])
-        user_id = payload.get("sub")
-    except Exception:
-        # Se o token inválido, tenta apenas remover qualquer refresh para segurança
-        raise HTTPException(status_code=401, detail="Refresh inválido")
-    # Remove refresh token entry (revoga)
-    await db.db.refresh_tokens.delete_one({"user_id": str(user_id)})
+    payload = _decode_refresh(token)
+    # Remove refresh token entry (revoga apenas esta sessão)
+    await db.db.refresh_tokens.delete_one({"_id": payload["jti"], "user_id": str(payload["sub"])})
     return {"status": "ok"}
 
 @router.post("/seed-admin", summary="Criar admin inicial (apenas se nenhum existir)")
@@ -72,7 +73,7 @@ async def seed_admin(body: UserCreate = Body(...), secret: str = Body(...)):
         "_id": str(uuid.uuid4()),
         "username": body.username,
         "email": body.email,
-        "password_hash": auth.hash_password(body.password),
+        "password_hash": await auth.hash_password_async(body.password),
         "role": "admin",
         "created_at": datetime.utcnow(),
         "phone": body.phone
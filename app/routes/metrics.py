@@ -0,0 +1,21 @@
+"""
+routes/metrics.py
+GET /metrics -> métricas no formato texto do Prometheus (ver app/metrics.py).
+Se METRICS_TOKEN estiver definido, exige Authorization: Bearer <METRICS_TOKEN>.
+"""
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from .. import config
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if config.METRICS_TOKEN:
+        header = request.headers.get("authorization", "")
+        if not hmac.compare_digest(header.encode(), f"Bearer {config.METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Token inválido")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
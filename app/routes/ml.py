@@ -0,0 +1,39 @@
+"""
+routes/ml.py
+Endpoints de ML: disparar retreino (job em background) e consultar status.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from .. import db, auth
+from ..ml import jobs, model
+
+router = APIRouter()
+
+@router.post("/retrain", status_code=202)
+async def retrain(days: int = Query(30, ge=1, le=365), _=Depends(auth.admin_required)):
+    """Inicia um retreino em background e retorna o id do job imediatamente."""
+    try:
+        job = await jobs.start_retrain(days=days, trigger="api")
+    except jobs.RetrainInProgress as e:
+        raise HTTPException(status_code=409, detail={"message": "Retreino já em andamento", "job_id": e.job_id})
+    return {"job_id": job["id"], "status": job["status"]}
+
+@router.get("/jobs")
+async def list_jobs(_=Depends(auth.admin_required)):
+    return await jobs.list_jobs()
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, _=Depends(auth.admin_required)):
+    job = await jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@router.get("/status")
+async def status(_=Depends(auth.get_current_user)):
+    doc = await db.db.ml_models.find_one({"name": model.MODEL_NAME}, {"trained_at": 1})
+    return {
+        "model": model.MODEL_NAME,
+        "trained_at": doc.get("trained_at") if doc else None,
+        "cache": model.model_cache_stats(),
+        "current_job": await jobs.current_job(),
+    }
@@ -4,9 +4,11 @@ Endpoints:
 - GET /api/notifications/vapid_public  -> retorna VAPID_PUBLIC_KEY (para frontend)
 - POST /api/notifications/subscribe   -> salva subscription (body = subscription JSON)
 - POST /api/notifications/unsubscribe -> remove subscription (body.endpoint)
+- GET /api/notifications/admin/outbox -> fila do outbox e vazão do dispatcher (admin)
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
 from .. import config, db, auth
+from ..services import outbox
 from datetime import datetime
 import uuid
 from typing import Optional
@@ -64,3 +66,8 @@ async def list_subscriptions(admin=Depends(auth.admin_required)):
             # keys omitted intentionally
         })
     return out
+
+@router.get("/admin/outbox")
+async def get_outbox_stats(admin=Depends(auth.admin_required)):
+    """Profundidade do outbox por status, pendência mais antiga e contadores do dispatcher."""
+    return await outbox.outbox_stats()
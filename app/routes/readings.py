@@ -3,81 +3,162 @@ routes/readings.py
 Endpoints para inserir e listar leituras.
 Após inserção chama pipeline de regras e ML.
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List, Optional
 from ..schemas import ReadingIn
-from .. import db, auth
-from datetime import datetime
+from .. import db, auth, config
 import uuid
-from ..services import notification
-from ..utils import apply_threshold_rules
+from datetime import datetime
+from ..services import ingest, rollups
+from ..pagination import encode_cursor, decode_cursor, keyset_after
+from ..responses import fast_response, fast_responses
 import logging
 
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
 
-@router.get("/", response_model=List[dict])
+# Campos que podem ser pedidos em ?fields= (_id e timestamp sempre vêm, pois formam o cursor)
+READING_FIELDS = {"device_id", "timestamp", "temp_C", "rh_pct", "co2_ppm_est", "mq2_raw", "device_status", "silo_id"}
+
+@router.get("/", response_class=Response, responses=fast_responses(
+    {"type": "array", "items": {"type": "object"}}, "Leituras, mais recentes primeiro", cursor=True))
 async def list_readings(
+    request: Request,
     silo_id: Optional[str] = Query(None, description="Filtrar por ID do silo"),
-    limit: int = Query(100, description="Número máximo de leituras a retornar"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Timestamp inicial (inclusivo)"),
+    to: Optional[datetime] = Query(None, description="Timestamp final (exclusivo)"),
+    limit: int = Query(100, ge=1, description="Tamanho da página (limitado a READINGS_MAX_PAGE_SIZE)"),
+    cursor: Optional[str] = Query(None, description="Cursor da página seguinte (header X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula, ex.: temp_C,rh_pct"),
     user=Depends(auth.get_current_user)
 ):
     """
-    Lista leituras com filtros opcionais por silo_id.
+    Lista leituras (mais recentes primeiro) com filtros opcionais por silo_id e
+    intervalo de tempo. Paginação por keyset: quando a página vem cheia, o header
+    X-Next-Cursor traz o cursor para a próxima chamada.
+    Resposta serializada por app/responses.py (JSON ou msgpack, comprimida).
     """
+    limit = min(limit, config.READINGS_MAX_PAGE_SIZE)
     query = {}
     if silo_id:
         query["silo_id"] = silo_id
-    
-    cursor = db.db.readings.find(query).sort("timestamp", -1).limit(limit)
+    if from_ or to:
+        query["timestamp"] = {}
+        if from_:
+            query["timestamp"]["$gte"] = from_
+        if to:
+            query["timestamp"]["$lt"] = to
+    if cursor:
+        try:
+            ts, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        query.update(keyset_after(ts, last_id))
+
+    projection = None
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - READING_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(sorted(unknown))}")
+        projection = {f: 1 for f in requested | {"timestamp"}}
+
+    cursor_db = db.db.readings.find(query, projection).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
     readings = []
-    async for reading in cursor:
-        # Converter ObjectId para string
-        reading["_id"] = str(reading["_id"])
+    last_id = None
+    async for reading in cursor_db:
+        # Converter ObjectId para string (o cursor guarda o _id com o tipo original)
+        last_id = reading["_id"]
+        reading["_id"] = str(last_id)
         readings.append(reading)
-    
-    return readings
+
+    headers = {}
+    if len(readings) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(readings[-1]["timestamp"], last_id)
+    return fast_response(request, readings, headers=headers)
+
+# bucket -> (unit, binSize) do $dateTrunc, e duração em segundos
+AGG_BUCKETS = {"5m": ("minute", 5, 300), "1h": ("hour", 1, 3600), "1d": ("day", 1, 86400)}
+AGG_FIELDS = ("temp_C", "rh_pct", "co2_ppm_est", "mq2_raw")
+ROLLUP_BUCKETS = {"1h": "readings_hourly", "1d": "readings_daily"}
+
+@router.get("/aggregate", response_class=Response, responses=fast_responses(
+    {"type": "object"}, "{ silo_id, bucket, from, to, buckets: [{t, count, <campo>: {min, max, avg}}] }"))
+async def aggregate_readings(
+    request: Request,
+    silo_id: str = Query(..., description="ID do silo"),
+    from_: datetime = Query(..., alias="from", description="Início do intervalo (inclusivo)"),
+    to: datetime = Query(..., description="Fim do intervalo (exclusivo)"),
+    bucket: str = Query("1h", regex="^(5m|1h|1d)$", description="Tamanho do bucket: 5m, 1h ou 1d"),
+    user=Depends(auth.get_current_user)
+):
+    """
+    Agrega leituras em buckets de tempo (min/max/avg/count por campo) no próprio
+    Mongo. O $match usa o índice (silo_id, timestamp) e o payload tem no máximo
+    um item por bucket, independente da densidade dos dados brutos.
+    Buckets 1h/1d são lidos direto dos rollups (readings_hourly/readings_daily).
+
+    Em todos os buckets o intervalo é alargado para buckets inteiros
+    (rollups.bucket_range): do início do bucket de `from` ao fim do bucket que
+    contém o último instante antes de `to`. O `from`/`to` da resposta trazem o
+    intervalo efetivamente coberto.
+    """
+    # from/to podem vir um com fuso e outro sem: compara tudo em UTC sem tzinfo
+    from_, to = rollups.utc_naive(from_), rollups.utc_naive(to)
+    if to <= from_:
+        raise HTTPException(status_code=400, detail="'to' deve ser maior que 'from'")
+    unit, bin_size, seconds = AGG_BUCKETS[bucket]
+    from_, to = rollups.bucket_range(from_, to, unit, bin_size)
+    n_buckets = (to - from_).total_seconds() / seconds
+    if n_buckets > config.READINGS_AGG_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Intervalo muito longo para bucket {bucket} (máx. {config.READINGS_AGG_MAX_BUCKETS} buckets)")
+
+    if bucket in ROLLUP_BUCKETS:
+        coll = db.db[ROLLUP_BUCKETS[bucket]]
+        cursor = coll.find({"silo_id": silo_id, "t": {"$gte": from_, "$lt": to}}, {"_id": 0}).sort("t", 1)
+        buckets = [rollups.rollup_to_bucket(d) async for d in cursor]
+        return fast_response(request, {"silo_id": silo_id, "bucket": bucket, "from": from_, "to": to, "buckets": buckets})
+
+    group = {"_id": {"$dateTrunc": {"date": "$timestamp", "unit": unit, "binSize": bin_size}}, "count": {"$sum": 1}}
+    for f in AGG_FIELDS:
+        group[f"{f}_min"] = {"$min": f"${f}"}
+        group[f"{f}_max"] = {"$max": f"${f}"}
+        group[f"{f}_avg"] = {"$avg": f"${f}"}
+    pipeline = [
+        {"$match": {"silo_id": silo_id, "timestamp": {"$gte": from_, "$lt": to}}},
+        {"$project": {"_id": 0, "timestamp": 1, **{f: 1 for f in AGG_FIELDS}}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]
+    buckets = []
+    async for g in db.db.readings.aggregate(pipeline):
+        item = {"t": g["_id"], "count": g["count"]}
+        for f in AGG_FIELDS:
+            item[f] = {"min": g[f"{f}_min"], "max": g[f"{f}_max"], "avg": g[f"{f}_avg"]}
+        buckets.append(item)
+    return fast_response(request, {"silo_id": silo_id, "bucket": bucket, "from": from_, "to": to, "buckets": buckets})
 
 @router.post("/", response_model=dict)
 async def create_reading(body: ReadingIn, user=Depends(auth.get_current_user)):
     doc = body.dict()
     doc["_id"] = str(uuid.uuid4())
-    doc["timestamp"] = doc["timestamp"]
-    await db.db.readings.insert_one(doc)
-
-    # Regras determinísticas
-    alerts = await apply_threshold_rules(doc)
+    # Regras determinísticas + ML + alertas (mesmo pipeline do endpoint batch)
+    await ingest.ingest_readings([doc], generated_ids=True)
+    return {"status": "ok"}
 
-    # ML anomaly detection (import lazy para evitar circular imports)
-    is_anom = False
-    score = None
-    try:
-        from ..ml.model import detect_anomaly  # import lazy
-        try:
-            is_anom, score = await detect_anomaly(doc)
-        except Exception as e:
-            # Se o ML falhar em runtime, logamos e seguimos sem bloquear.
-            logger.warning("Erro ao executar detect_anomaly: %s", e)
-            is_anom, score = False, None
-    except Exception as e:
-        # Se não for possível importar (por ex. import circular), logamos e seguimos.
-        logger.warning("Não foi possível importar app.ml.model.detect_anomaly: %s", e)
-        is_anom, score = False, None
-
-    if is_anom:
-        alerts.append({"level": "warning", "message": "Anomalia detectada", "value": score})
-
-    # Salvar alerts e notificar
-    for a in alerts:
-        a_doc = {
-            "_id": str(uuid.uuid4()),
-            "silo_id": doc.get("silo_id"),
-            "level": a.get("level", "critical"),
-            "message": a.get("message"),
-            "value": a.get("value"),
-            "timestamp": datetime.utcnow(),
-            "acknowledged": False,
-        }
-        await db.db.alerts.insert_one(a_doc)
-        await notification.notify_alert(a_doc)
-    return {"status": "ok"}
\ No newline at end of file
+@router.post("/batch", response_model=dict)
+async def create_readings_batch(body: List[ReadingIn], user=Depends(auth.get_current_user)):
+    """
+    Ingestão em lote (ex.: gateways reenviando leituras acumuladas offline).
+    Grava tudo com um insert_many não ordenado e retorna o resultado por item.
+    """
+    if len(body) > config.READINGS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Máximo de {config.READINGS_BATCH_MAX} leituras por lote")
+    docs = []
+    for item in body:
+        doc = item.dict()
+        doc["_id"] = str(uuid.uuid4())
+        docs.append(doc)
+    results = await ingest.ingest_readings(docs, generated_ids=True)
+    inserted = sum(1 for r in results if r["status"] == "ok")
+    return {"status": "ok", "inserted": inserted, "failed": len(results) - inserted, "items": results}
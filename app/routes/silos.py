@@ -1,23 +1,33 @@
 """
 routes/silos.py
 Endpoints para listar e editar silos e seus settings.
+GET /api/silos/overview retorna todos os silos com o estado atual (silo_state).
 """
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from ..schemas import SiloCreate, SiloSettings
 from .. import db, auth
+from ..utils import invalidate_silo
+from ..services.silo_state import overview_pipeline
+from ..responses import fast_response, fast_responses
 from datetime import datetime
 import uuid
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
-async def list_silos(_=Depends(auth.get_current_user)):
-    cursor = db.db.silos.find({})
-    res = []
-    async for s in cursor:
-        res.append(s)
-    return res
+@router.get("/", response_class=Response, responses=fast_responses(
+    {"type": "array", "items": {"type": "object"}}, "Silos"))
+async def list_silos(request: Request, _=Depends(auth.get_current_user)):
+    return fast_response(request, await db.db.silos.find({}).to_list(length=None))
+
+# Declarada antes das rotas /{silo_id}
+@router.get("/overview", response_class=Response, responses=fast_responses(
+    {"type": "array", "items": {"type": "object"}}, "Silos com o estado atual (silo_state)"))
+async def silos_overview(request: Request, _=Depends(auth.get_current_user)):
+    """
+    Visão geral da frota numa única consulta: cada silo com last_seen,
+    last_reading, anomaly/score e open_alerts por nível.
+    """
+    return fast_response(request, await db.db.silos.aggregate(overview_pipeline()).to_list(length=None))
 
 @router.post("/", response_model=dict)
 async def create_silo(body: SiloCreate, user=Depends(auth.get_current_user)):
@@ -34,6 +44,8 @@ async def create_silo(body: SiloCreate, user=Depends(auth.get_current_user)):
         "responsible": {}
     }
     await db.db.silos.insert_one(doc)
+    # Remove eventual entrada negativa (silo inexistente) do cache
+    invalidate_silo(doc["_id"])
     return {"id": doc["_id"]}
 
 @router.put("/{silo_id}/settings", response_model=dict)
@@ -41,4 +53,5 @@ async def update_settings(silo_id: str, settings: SiloSettings, user=Depends(aut
     if user.get("role") not in ("admin", "operator"):
         raise HTTPException(status_code=403)
     await db.db.silos.update_one({"_id": silo_id}, {"$set": {"settings": settings.dict()}})
+    invalidate_silo(silo_id)
     return {"status": "ok"}
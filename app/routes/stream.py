@@ -0,0 +1,64 @@
+"""
+routes/stream.py
+Stream ao vivo (Server-Sent Events) de leituras e alertas.
+
+GET /api/stream?silo_id=1&silo_id=2
+- autenticação pelo header Authorization: Bearer <token> ou, para EventSource
+  (que não envia headers), pelo parâmetro ?token=<access token>;
+- sem silo_id assina todos os silos;
+- eventos: reading, alert, alert_update (supressão), alert_ack; um comentário
+  ": ping" é enviado a cada STREAM_HEARTBEAT_SEC para manter a conexão.
+"""
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from .. import auth, config
+from ..services.pubsub import hub
+
+router = APIRouter()
+
+
+async def _stream_user(request: Request, token: Optional[str] = Query(None)):
+    header = request.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        token = header[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Token ausente")
+    return await auth.user_from_token(token)
+
+
+@router.get("")
+async def stream(
+    request: Request,
+    silo_id: Optional[List[str]] = Query(None),
+    _=Depends(_stream_user),
+):
+    sub = hub.subscribe(silo_id, maxsize=config.STREAM_QUEUE_MAX)
+
+    async def events():
+        try:
+            yield f"retry: {config.STREAM_RETRY_MS}\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), config.STREAM_HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    frame = ": ping\n\n"
+                yield frame
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def stream_stats(admin=Depends(auth.admin_required)):
+    return hub.stats()
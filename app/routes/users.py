@@ -4,7 +4,7 @@ CRUD simples de usuários. Proteção básica por role.
 """
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List
-from ..schemas import UserCreate, UserOut
+from ..schemas import UserCreate, UserOut, UserUpdate
 from .. import db, auth
 from datetime import datetime
 import uuid
@@ -37,10 +37,38 @@ async def create_user(body: UserCreate, _=Depends(admin_required)):
         "_id": str(uuid.uuid4()),
         "username": body.username,
         "email": body.email,
-        "password_hash": auth.hash_password(body.password),
+        "password_hash": await auth.hash_password_async(body.password),
         "role": body.role,
         "created_at": datetime.utcnow(),
         "phone": body.phone
     }
     await db.db.users.insert_one(user_doc)
     return {"id": user_doc["_id"]}
+
+@router.put("/{user_id}", response_model=dict)
+async def update_user(user_id: str, body: UserUpdate, _=Depends(admin_required)):
+    changes = {k: v for k, v in body.dict(exclude_unset=True).items() if k != "password" and v is not None}
+    if body.password:
+        changes["password_hash"] = await auth.hash_password_async(body.password)
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nada para atualizar")
+    res = await db.db.users.update_one({"_id": user_id}, {"$set": changes})
+    if res.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    # role/dados alterados: próxima requisição deste usuário relê do banco
+    auth.invalidate_user(user_id)
+    return {"status": "ok"}
+
+@router.delete("/{user_id}", response_model=dict)
+async def delete_user(user_id: str, _=Depends(admin_required)):
+    res = await db.db.users.delete_one({"_id": user_id})
+    if res.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    auth.invalidate_user(user_id)
+    await db.db.refresh_tokens.delete_many({"user_id": user_id})
+    return {"status": "ok"}
+
+@router.get("/cache/stats", response_model=dict)
+async def user_cache_stats(_=Depends(admin_required)):
+    """Estatísticas (hits/misses/hit_rate) do cache de usuários autenticados."""
+    return auth.user_cache_stats()
@@ -17,6 +17,12 @@ class UserCreate(BaseModel):
     role: str = "operator"
     phone: Optional[str] = None
 
+class UserUpdate(BaseModel):
+    email: Optional[EmailStr] = None
+    password: Optional[str] = None
+    role: Optional[str] = None
+    phone: Optional[str] = None
+
 class UserOut(BaseModel):
     id: str
     username: str
@@ -34,6 +40,11 @@ class SiloSettings(BaseModel):
     co2_threshold: Optional[float] = None
     mq2_threshold: Optional[int] = None
     alert_interval_min: Optional[int] = 5
+    # Regras stateful (ver app/utils.py)
+    temp_hysteresis: Optional[float] = None      # °C abaixo do limite para rearmar o alerta
+    consecutive_readings: Optional[int] = None   # N leituras seguidas acima do limite
+    temp_rate_threshold: Optional[float] = None  # °C/h de subida que gera alerta
+    trend_ewma_alpha: Optional[float] = Field(None, gt=0, le=1)
 
 class SiloCreate(BaseModel):
     name: str
@@ -51,6 +62,18 @@ class ReadingIn(BaseModel):
     device_status: Optional[str] = "ok"
     silo_id: Optional[str] = None
 
+class AlertAckIn(BaseModel):
+    """Reconhecimento em lote: por lista de ids e/ou por filtro (ao menos um)."""
+    ids: Optional[List[str]] = None
+    silo_id: Optional[str] = None
+    level: Optional[str] = None
+    rule: Optional[str] = None
+    from_: Optional[datetime] = Field(None, alias="from")
+    to: Optional[datetime] = None
+
+    class Config:
+        allow_population_by_field_name = True
+
 class AlertOut(BaseModel):
     id: str
     silo_id: str
@@ -0,0 +1,162 @@
+"""
+services/ingest.py
+Pipeline de ingestão de leituras em lote: insert_many + rollups + regras + ML + alertas.
+As notificações dos alertas vão para o outbox (services/outbox.py) e são
+enviadas pelo dispatcher em segundo plano.
+Usado pelos endpoints de leitura (unitário e batch).
+"""
+from typing import List, Dict, Any
+from datetime import datetime
+import uuid
+import logging
+from pymongo.errors import BulkWriteError
+from .. import db
+from ..utils import apply_threshold_rules_batch
+from . import outbox, rollups, silo_state, suppression
+from .pubsub import hub
+from ..metrics import StageTimer, INGEST_READINGS, INGEST_ALERTS
+
+logger = logging.getLogger("uvicorn.error")
+
+
+async def _score_batch(docs: List[dict]):
+    """Executa detecção de anomalias em lote; em caso de falha segue sem ML."""
+    try:
+        from ..ml.model import detect_anomalies  # import lazy
+    except Exception as e:
+        # Se não for possível importar (por ex. sklearn ausente), logamos e seguimos.
+        logger.warning("Não foi possível importar app.ml.model.detect_anomalies: %s", e)
+        return [(False, None)] * len(docs)
+    try:
+        return await detect_anomalies(docs)
+    except Exception as e:
+        # Se o ML falhar em runtime, logamos e seguimos sem bloquear.
+        logger.warning("Erro ao executar detect_anomalies: %s", e)
+        return [(False, None)] * len(docs)
+
+
+def _count_readings(results: List[Dict[str, Any]], source: str):
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    for status, n in counts.items():
+        INGEST_READINGS.labels(source, status).inc(n)
+
+
+async def ingest_readings(docs: List[dict], anomaly_message: str = "Anomalia detectada", source: str = "http",
+                          generated_ids: bool = False) -> List[Dict[str, Any]]:
+    """
+    Insere as leituras com um único insert_many não ordenado e executa o
+    pós-processamento (regras, ML, alertas e outbox de notificações) apenas sobre as
+    leituras efetivamente gravadas. Cada etapa é cronometrada por `source`
+    (http / thingspeak) em ingest_stage_duration_seconds. generated_ids=True
+    indica _id recém-gerados (uuid4): dispensa a checagem de repetidos em time-series.
+
+    Retorna um resultado por item, na mesma ordem de `docs`:
+    {"id", "status": "ok"|"duplicate"|"error", "alerts", "anomaly", "score"}
+    """
+    results = [
+        {"id": d["_id"], "status": "ok", "alerts": 0, "anomaly": False, "score": None}
+        for d in docs
+    ]
+    if not docs:
+        return results
+
+    timer = StageTimer(source)
+    # Em time-series o _id não é único: descarta repetidos antes de gravar
+    fresh, dup = await db.unique_readings(db.db.readings, docs, generated_ids=generated_ids)
+    for i in dup:
+        results[i]["status"] = "duplicate"
+    pos = [i for i, r in enumerate(results) if r["status"] == "ok"]
+    try:
+        if fresh:
+            await db.db.readings.insert_many(fresh, ordered=False)
+    except BulkWriteError as e:
+        # Com ordered=False os demais documentos são gravados; marcamos só os que falharam.
+        for err in e.details.get("writeErrors", []):
+            res = results[pos[err["index"]]]
+            res["status"] = "duplicate" if err.get("code") == 11000 else "error"
+            res["error"] = err.get("errmsg")
+
+    timer.lap("insert")
+    _count_readings(results, source)
+    stored = [i for i, r in enumerate(results) if r["status"] == "ok"]
+    if not stored:
+        return results
+    stored_docs = [docs[i] for i in stored]
+
+    # Rollups horário/diário (falha aqui não invalida a ingestão; rebuild_rollups corrige)
+    try:
+        await rollups.update_rollups(stored_docs)
+    except Exception as e:
+        logger.warning("Erro ao atualizar rollups: %s", e)
+    timer.lap("rollups")
+
+    # Regras determinísticas (settings de cada silo buscados uma vez por lote)
+    rule_alerts = await apply_threshold_rules_batch(stored_docs)
+    timer.lap("rules")
+    # ML anomaly detection (uma única chamada vetorizada)
+    scores = await _score_batch(stored_docs)
+    timer.lap("ml")
+
+    alert_docs = []
+    for i, doc, alerts, (is_anom, score) in zip(stored, stored_docs, rule_alerts, scores):
+        results[i]["anomaly"] = is_anom
+        results[i]["score"] = score
+        if is_anom:
+            alerts.append({"level": "warning", "message": anomaly_message, "value": score, "rule": "ml:anomaly"})
+        results[i]["alerts"] = len(alerts)
+        for a in alerts:
+            now = datetime.utcnow()
+            alert_docs.append({
+                "_id": str(uuid.uuid4()),
+                "silo_id": doc.get("silo_id"),
+                "rule": a.get("rule"),
+                "level": a.get("level", "critical"),
+                "message": a.get("message"),
+                "value": a.get("value"),
+                "timestamp": now,
+                "acknowledged": False,
+                "count": 1,
+                "last_seen": now,
+                "notification": {"status": "pending"},
+            })
+
+    # Estado atual por silo (última leitura, score), para a visão geral da frota
+    try:
+        await silo_state.update_from_readings(stored_docs, scores)
+    except Exception as e:
+        logger.warning("Erro ao atualizar silo_state: %s", e)
+    timer.lap("silo_state")
+
+    # Stream ao vivo: só o delta (leituras novas), para quem assina o silo
+    if hub.has_subscribers():
+        for i, doc in zip(stored, stored_docs):
+            hub.publish("reading", doc.get("silo_id"), {**doc, "anomaly": results[i]["anomaly"], "score": results[i]["score"]})
+
+    # Disparos repetidos dentro de alert_interval_min só incrementam o alerta aberto
+    fired = len(alert_docs)
+    alert_docs = await suppression.suppress(alert_docs)
+    if fired:
+        timer.lap("suppression")
+        INGEST_ALERTS.labels(source, "inserted").inc(len(alert_docs))
+        INGEST_ALERTS.labels(source, "suppressed").inc(fired - len(alert_docs))
+
+    # Salvar alerts e enfileirar as notificações (o envio não atrasa a ingestão)
+    if alert_docs:
+        await db.db.alerts.insert_many(alert_docs, ordered=False)
+        try:
+            await outbox.enqueue(alert_docs)
+        except Exception as e:
+            # Leituras e alertas já gravados: um 500 aqui levaria o cliente a
+            # reenviar (leituras duplicadas). Os alertas ficam com notification
+            # pendente e a varredura do dispatcher cria as entradas.
+            logger.warning("Erro ao enfileirar notificações (serão recuperadas pelo dispatcher): %s", e)
+        try:
+            await silo_state.add_alerts(alert_docs)
+        except Exception as e:
+            logger.warning("Erro ao atualizar alertas abertos em silo_state: %s", e)
+        for a_doc in alert_docs:
+            hub.publish("alert", a_doc.get("silo_id"), a_doc)
+        timer.lap("alerts")
+    return results
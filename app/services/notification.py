@@ -6,21 +6,86 @@ a menos que você reative explicitamente e configure credenciais SMTP.
 """
 import httpx
 from .. import config, db
+from ..utils import get_silo
 import asyncio
-from typing import Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
 from pywebpush import webpush, WebPushException
+import requests
 import json
 import logging
+from ..metrics import NOTIFICATIONS_SENT, NOTIFICATION_FANOUT_SECONDS
 
 logger = logging.getLogger("notification")
 
-async def send_telegram(chat_id: str, text: str):
+# Códigos com os quais o push service indica que a subscription não existe mais
+EXPIRED_STATUS = (404, 410)
+
+_telegram_client: Optional[httpx.AsyncClient] = None
+_push_executor: Optional[ThreadPoolExecutor] = None
+_push_local = threading.local()
+# Semáforo único para todos os envios (todas as chamadas de notify_alert
+# compartilham o pool); recriado se o event loop mudar
+_push_sem: Optional[asyncio.Semaphore] = None
+_push_sem_loop = None
+
+def get_telegram_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartilhado para a API do Telegram (keep-alive)."""
+    global _telegram_client
+    if _telegram_client is None or _telegram_client.is_closed:
+        _telegram_client = httpx.AsyncClient(timeout=httpx.Timeout(config.NOTIFY_TELEGRAM_TIMEOUT_SEC))
+    return _telegram_client
+
+def _get_push_executor() -> ThreadPoolExecutor:
+    """
+    Pool dedicado ao pywebpush: envios bloqueantes não disputam o executor
+    padrão do loop, e a largura (NOTIFY_PUSH_WORKERS) limita a concorrência.
+    """
+    global _push_executor
+    if _push_executor is None:
+        _push_executor = ThreadPoolExecutor(
+            max_workers=max(config.NOTIFY_PUSH_WORKERS, 1), thread_name_prefix="webpush"
+        )
+    return _push_executor
+
+def _push_semaphore() -> asyncio.Semaphore:
+    """
+    Limita os envios em andamento à largura do pool: uma tarefa só entrega o
+    trabalho ao executor quando há thread livre, então não há fila no pool.
+    """
+    global _push_sem, _push_sem_loop
+    loop = asyncio.get_running_loop()
+    if _push_sem is None or _push_sem_loop is not loop:
+        _push_sem = asyncio.Semaphore(max(config.NOTIFY_PUSH_WORKERS, 1))
+        _push_sem_loop = loop
+    return _push_sem
+
+def _push_session() -> requests.Session:
+    # Uma sessão por thread: reaproveita conexões TLS com o push service
+    session = getattr(_push_local, "session", None)
+    if session is None:
+        session = _push_local.session = requests.Session()
+    return session
+
+async def close_notification_clients():
+    global _telegram_client, _push_executor
+    if _telegram_client is not None:
+        await _telegram_client.aclose()
+        _telegram_client = None
+    if _push_executor is not None:
+        _push_executor.shutdown(wait=False)
+        _push_executor = None
+
+async def send_telegram(chat_id: str, text: str) -> bool:
     if not config.TELEGRAM_BOT_TOKEN:
         logger.debug("Telegram token não configurado; pulando envio Telegram")
-        return
+        return False
     url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
-    async with httpx.AsyncClient() as client:
-        await client.post(url, json={"chat_id": chat_id, "text": text})
+    r = await get_telegram_client().post(url, json={"chat_id": chat_id, "text": text})
+    r.raise_for_status()
+    return True
 
 def _vapid_auth():
     # Retorna dict com chave privada/publica se disponíveis
@@ -74,42 +139,114 @@ async def send_sms_via_email(phone: str, carrier_gateway: str, subject: str, bod
 # -----------------------------------------------------------
 # Notify pipeline (usa Telegram e WebPush; não usa SMS por padrão)
 # -----------------------------------------------------------
-async def notify_alert(alert: Dict[str, Any]):
+async def _push_one(sub: Dict[str, Any], payload: str) -> str:
+    """Envia um Web Push no pool dedicado; retorna sent/expired/failed/timeout."""
+    subscription_info = {"endpoint": sub["endpoint"], "keys": sub.get("keys", {})}
+    loop = asyncio.get_running_loop()
+    try:
+        # A espera por vaga fica no semáforo (sem prazo); o timeout vale só para o
+        # envio HTTP em si (timeout do requests dentro do pywebpush)
+        async with _push_semaphore():
+            await loop.run_in_executor(
+                _get_push_executor(), send_webpush_sync, subscription_info, payload, config.NOTIFY_PUSH_TIMEOUT_SEC
+            )
+        return "sent"
+    except requests.exceptions.Timeout:
+        logger.warning("Timeout enviando webpush para %s", sub["endpoint"])
+        return "timeout"
+    except WebPushException as ex:
+        status = getattr(ex.response, "status_code", None)
+        if status in EXPIRED_STATUS:
+            return "expired"
+        logger.warning("Falha ao enviar webpush (status=%s): %s", status, ex)
+        return "failed"
+    except Exception as e:
+        logger.warning("Erro enviando webpush: %s", e)
+        return "failed"
+
+async def _telegram_one(chat_id: str, text: str) -> str:
+    if not config.TELEGRAM_BOT_TOKEN:
+        return "skipped"
+    try:
+        await asyncio.wait_for(send_telegram(chat_id, text), config.NOTIFY_TELEGRAM_TIMEOUT_SEC)
+        return "sent"
+    except asyncio.TimeoutError:
+        logger.warning("Timeout enviando Telegram para %s", chat_id)
+        return "timeout"
+    except Exception as e:
+        logger.warning("Falha ao enviar Telegram: %s", e)
+        return "failed"
+
+async def notify_alert(alert: Dict[str, Any]) -> Dict[str, Any]:
     """
     Busca responsáveis do silo e envia notificações:
     - Telegram para silo.responsible.telegram_chat_id
     - WebPush para subscriptions relacionadas ao silo (campo silo_id) ou globais
+
+    Os envios são concorrentes (Web Push limitado por NOTIFY_PUSH_WORKERS) e
+    cada canal tem seu timeout. Subscriptions só são removidas quando o push
+    service responde 404/410. Retorna as estatísticas de entrega.
     """
-    silo = await db.db.silos.find_one({"_id": alert["silo_id"]})
+    t0 = time.perf_counter()
+    silo = await get_silo(alert["silo_id"])
     silo_name = silo.get("name") if silo else "Silo"
     text = f"[{alert['level'].upper()}] {silo_name}: {alert['message']} (valor={alert.get('value')})"
 
     # Telegram
     chat_id = silo.get("responsible", {}).get("telegram_chat_id") if silo else None
-    if chat_id:
-        await send_telegram(chat_id, text)
+    telegram_task = _telegram_one(chat_id, text) if chat_id else None
 
     # WebPush: buscar subscriptions específicas para este silo + globais (silo_id=null)
-    subs_cursor = db.db.push_subscriptions.find({"$or": [{"silo_id": alert["silo_id"]}, {"silo_id": None}]})
-    async for sub in subs_cursor:
+    subs = []
+    if _vapid_auth():
+        subs = await db.db.push_subscriptions.find(
+            {"$or": [{"silo_id": alert["silo_id"]}, {"silo_id": None}]},
+            {"endpoint": 1, "keys": 1},
+        ).to_list(length=None)
+    payload = json.dumps({"title": "Silo Monitor", "body": text})
+
+    results = await asyncio.gather(
+        *(_push_one(sub, payload) for sub in subs),
+        *([telegram_task] if telegram_task else []),
+    )
+    push_results = results[:len(subs)]
+
+    webpush_stats = {k: 0 for k in ("sent", "expired", "failed", "timeout")}
+    for r in push_results:
+        webpush_stats[r] += 1
+    expired = [sub["_id"] for sub, r in zip(subs, push_results) if r == "expired"]
+    if expired:
         try:
-            subscription_info = {
-                "endpoint": sub["endpoint"],
-                "keys": sub.get("keys", {})
-            }
-            # pywebpush é síncrono, executamos no executor para não bloquear loop async
-            await asyncio.get_event_loop().run_in_executor(None, lambda: send_webpush_sync(subscription_info, json.dumps({"title": "Silo Monitor", "body": text})))
+            await db.db.push_subscriptions.delete_many({"_id": {"$in": expired}})
         except Exception as e:
-            logger.exception("Erro enviando webpush; removendo subscription possivelmente inválida: %s", e)
-            try:
-                await db.db.push_subscriptions.delete_one({"_id": sub["_id"]})
-            except Exception:
-                pass
-    return
+            logger.warning("Erro removendo subscriptions expiradas: %s", e)
+
+    elapsed = time.perf_counter() - t0
+    stats = {
+        "telegram": results[-1] if telegram_task else "skipped",
+        "webpush": webpush_stats,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+    NOTIFICATION_FANOUT_SECONDS.observe(elapsed)
+    if telegram_task:
+        NOTIFICATIONS_SENT.labels("telegram", stats["telegram"]).inc()
+    for result, n in webpush_stats.items():
+        if n:
+            NOTIFICATIONS_SENT.labels("webpush", result).inc(n)
+    if subs or telegram_task:
+        logger.info("Alerta %s notificado: %s", alert.get("_id"), stats)
+    return stats
 
 # helper síncrono para chamar webpush dentro do executor (pywebpush é síncrono)
-def send_webpush_sync(subscription_info, payload):
+def send_webpush_sync(subscription_info, payload, timeout: Optional[float] = None):
     vapid = _vapid_auth()
     if not vapid:
         return
-    webpush(subscription_info=subscription_info, data=payload, vapid_private_key=vapid["vapid_private_key"], vapid_claims=vapid["vapid_claims"])
+    webpush(
+        subscription_info=subscription_info,
+        data=payload,
+        vapid_private_key=vapid["vapid_private_key"],
+        vapid_claims=vapid["vapid_claims"],
+        timeout=timeout,
+        requests_session=_push_session(),
+    )
@@ -0,0 +1,213 @@
+"""
+services/outbox.py
+Outbox de notificações: cada alerta gravado gera uma entrada em
+`notification_outbox` (mesmo _id do alerta) e um dispatcher em segundo plano
+faz o envio fora do caminho da ingestão.
+
+- entradas são reivindicadas uma a uma com find_one_and_update (seguro com
+  várias instâncias do backend) e recebem um lease; se o processo cair no meio
+  do envio, a entrada volta a ser elegível quando o lease expira;
+- falhas são repetidas com backoff exponencial (com jitter) até
+  OUTBOX_MAX_ATTEMPTS; depois disso a entrada fica como "dead";
+- o resultado é registrado no próprio alerta (campo `notification`);
+- alerta e entrada são duas gravações: se a segunda falhar, o dispatcher acha o
+  alerta pendente sem entrada na varredura periódica (OUTBOX_RECOVER_SEC).
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .. import config, db
+from . import notification
+from ..metrics import OUTBOX_DISPATCHED
+
+logger = logging.getLogger("uvicorn.error")
+
+PENDING, SENDING, SENT, DEAD = "pending", "sending", "sent", "dead"
+
+_wakeup: Optional[asyncio.Event] = None
+_counters = {"claimed": 0, "sent": 0, "retried": 0, "dead": 0}
+_started_at = time.time()
+_last_batch: Dict[str, Any] = {}
+
+
+def _entry(alert: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    return {
+        "_id": alert["_id"],
+        "alert": alert,
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+
+async def enqueue(alert_docs: List[Dict[str, Any]]):
+    """Grava as entradas do outbox dos alertas (chamado logo após inserir os alertas)."""
+    if not alert_docs:
+        return
+    now = datetime.utcnow()
+    try:
+        await db.db.notification_outbox.insert_many([_entry(a, now) for a in alert_docs], ordered=False)
+    except BulkWriteError as e:
+        # Reenfileirar o mesmo alerta é inofensivo (_id = id do alerta)
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def recover_pending(max_age_hours: float = 24) -> int:
+    """
+    Reenfileira alertas com notificação pendente sem entrada no outbox (queda ou
+    erro entre a gravação do alerta e a do outbox). Usa o índice parcial de
+    notification.status=pending; alertas que já têm entrada não mudam.
+    """
+    since = datetime.utcnow() - timedelta(hours=max_age_hours)
+    ops = []
+    async for a in db.db.alerts.find({"notification.status": PENDING, "timestamp": {"$gte": since}}):
+        ops.append(UpdateOne({"_id": a["_id"]}, {"$setOnInsert": _entry(a, datetime.utcnow())}, upsert=True))
+    if not ops:
+        return 0
+    res = await db.db.notification_outbox.bulk_write(ops, ordered=False)
+    return res.upserted_count
+
+
+def backoff_delay(attempts: int) -> float:
+    """Atraso antes da próxima tentativa: base * 2^(n-1), limitado, com jitter de ±20%."""
+    delay = min(config.OUTBOX_BACKOFF_BASE_SEC * (2 ** max(attempts - 1, 0)), config.OUTBOX_BACKOFF_MAX_SEC)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _delivered(stats: Dict[str, Any]) -> bool:
+    """
+    Considera entregue se algum canal recebeu a mensagem (ou não havia destino).
+    Falha parcial não é repetida, para não duplicar a notificação a quem já recebeu.
+    """
+    push = stats.get("webpush", {})
+    telegram = stats.get("telegram", "skipped")
+    attempted = telegram != "skipped" or any(push.values())
+    return not attempted or telegram == "sent" or push.get("sent", 0) > 0 or push.get("expired", 0) > 0
+
+
+async def _claim(now: datetime) -> Optional[Dict[str, Any]]:
+    return await db.db.notification_outbox.find_one_and_update(
+        {"$or": [
+            {"status": PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": SENDING, "locked_until": {"$lte": now}},
+        ]},
+        {
+            "$set": {"status": SENDING, "locked_until": now + timedelta(seconds=config.OUTBOX_LEASE_SEC)},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _process(entry: Dict[str, Any]) -> str:
+    attempts = entry["attempts"]
+    error, stats = None, None
+    try:
+        stats = await notification.notify_alert(entry["alert"])
+        if not _delivered(stats):
+            error = f"nenhum canal entregue: {stats}"
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+
+    now = datetime.utcnow()
+    if error is None:
+        status, outbox_set = SENT, {"status": SENT, "sent_at": now}
+        alert_set = {"notification": {"status": SENT, "attempts": attempts, "sent_at": now, "stats": stats}}
+    elif attempts >= config.OUTBOX_MAX_ATTEMPTS:
+        status, outbox_set = DEAD, {"status": DEAD, "last_error": error, "dead_at": now}
+        alert_set = {"notification": {"status": "failed", "attempts": attempts, "last_error": error}}
+        logger.error("Notificação do alerta %s descartada após %d tentativas: %s", entry["_id"], attempts, error)
+    else:
+        next_at = now + timedelta(seconds=backoff_delay(attempts))
+        status, outbox_set = PENDING, {"status": PENDING, "next_attempt_at": next_at, "last_error": error}
+        alert_set = {"notification": {"status": "retrying", "attempts": attempts, "last_error": error, "next_attempt_at": next_at}}
+
+    await db.db.notification_outbox.update_one(
+        {"_id": entry["_id"]}, {"$set": outbox_set, "$unset": {"locked_until": ""}}
+    )
+    await db.db.alerts.update_one({"_id": entry["_id"]}, {"$set": alert_set})
+    return status
+
+
+async def dispatch_once(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Reivindica até `batch_size` entradas elegíveis e envia em paralelo."""
+    batch_size = batch_size or config.OUTBOX_BATCH_SIZE
+    now = datetime.utcnow()
+    entries = []
+    for _ in range(batch_size):
+        entry = await _claim(now)
+        if entry is None:
+            break
+        entries.append(entry)
+    result = {SENT: 0, PENDING: 0, DEAD: 0}
+    if not entries:
+        return result
+
+    t0 = time.perf_counter()
+    _counters["claimed"] += len(entries)
+    for status in await asyncio.gather(*(_process(e) for e in entries)):
+        result[status] += 1
+        OUTBOX_DISPATCHED.labels(status).inc()
+    _counters["sent"] += result[SENT]
+    _counters["retried"] += result[PENDING]
+    _counters["dead"] += result[DEAD]
+    _last_batch.update(size=len(entries), elapsed_ms=round((time.perf_counter() - t0) * 1000, 1), at=datetime.utcnow(), **result)
+    return result
+
+
+async def run_dispatcher(poll_interval: Optional[float] = None):
+    """Loop do dispatcher: processa lotes enquanto houver trabalho; senão espera."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    poll_interval = poll_interval or config.OUTBOX_POLL_SEC
+    next_recover = 0.0
+    while True:
+        if time.monotonic() >= next_recover:
+            next_recover = time.monotonic() + config.OUTBOX_RECOVER_SEC
+            try:
+                n = await recover_pending()
+                if n:
+                    logger.info("Outbox: %d notificações pendentes reenfileiradas", n)
+            except Exception as e:
+                logger.warning("Outbox: falha ao recuperar pendentes: %s", e)
+        try:
+            res = await dispatch_once()
+            if sum(res.values()) >= config.OUTBOX_BATCH_SIZE:
+                continue
+        except Exception as e:
+            logger.error("Erro no dispatcher de notificações: %s", e)
+        try:
+            await asyncio.wait_for(_wakeup.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+async def outbox_stats() -> Dict[str, Any]:
+    """Profundidade da fila por status, idade da entrada pendente mais antiga e vazão."""
+    by_status = {PENDING: 0, SENDING: 0, SENT: 0, DEAD: 0}
+    async for row in db.db.notification_outbox.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}]):
+        by_status[row["_id"]] = row["n"]
+    oldest = await db.db.notification_outbox.find_one(
+        {"status": PENDING}, {"created_at": 1}, sort=[("next_attempt_at", 1)]
+    )
+    uptime = time.time() - _started_at
+    return {
+        "queue": by_status,
+        "oldest_pending_age_s": round((datetime.utcnow() - oldest["created_at"]).total_seconds(), 1) if oldest else None,
+        "counters": dict(_counters),
+        "sent_per_min": round(_counters["sent"] / uptime * 60, 2) if uptime > 0 else None,
+        "last_batch": dict(_last_batch) or None,
+    }
@@ -0,0 +1,104 @@
+"""
+services/pubsub.py
+Hub pub/sub em processo para o stream ao vivo (routes/stream.py).
+
+A ingestão publica leituras e alertas; cada cliente conectado tem uma fila
+limitada. Publicar nunca espera: se a fila de um consumidor lento está cheia,
+o evento mais antigo dela é descartado (o cliente pode recarregar via API).
+O frame SSE é serializado uma única vez por evento, não por assinante.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def _default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    return str(o)
+
+
+class Subscription:
+    __slots__ = ("queue", "silo_ids", "dropped")
+
+    def __init__(self, silo_ids: Optional[Set[str]], maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.silo_ids = silo_ids
+        self.dropped = 0
+
+    def offer(self, frame: str):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Consumidor lento: descarta o mais antigo em vez de bloquear a ingestão
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.queue.put_nowait(frame)
+            self.dropped += 1
+
+
+class Hub:
+    def __init__(self):
+        self._by_silo: Dict[str, Set[Subscription]] = {}
+        self._all: Set[Subscription] = set()
+        self._seq = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, silo_ids: Optional[Iterable[str]] = None, maxsize: int = 256) -> Subscription:
+        """Assina os silos indicados (None = todos)."""
+        ids = set(silo_ids) if silo_ids else None
+        sub = Subscription(ids, maxsize)
+        if ids is None:
+            self._all.add(sub)
+        else:
+            for sid in ids:
+                self._by_silo.setdefault(sid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self.dropped += sub.dropped
+        if sub.silo_ids is None:
+            self._all.discard(sub)
+            return
+        for sid in sub.silo_ids:
+            subs = self._by_silo.get(sid)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_silo[sid]
+
+    def has_subscribers(self, silo_id: Optional[str] = None) -> bool:
+        if silo_id is None:
+            return bool(self._all or self._by_silo)
+        return bool(self._all or self._by_silo.get(silo_id))
+
+    def publish(self, event: str, silo_id: Optional[str], data: Dict[str, Any]):
+        """Entrega um evento aos assinantes do silo (síncrono, não bloqueia)."""
+        targets = self._all.union(self._by_silo.get(silo_id, ())) if silo_id is not None else self._all
+        if not targets:
+            return
+        frame = f"id: {next(self._seq)}\nevent: {event}\ndata: {json.dumps(data, default=_default)}\n\n"
+        for sub in targets:
+            sub.offer(frame)
+        self.published += 1
+
+    def stats(self) -> Dict[str, Any]:
+        subs = self._all.union(*self._by_silo.values()) if self._by_silo else set(self._all)
+        return {
+            "subscribers": len(subs),
+            "silos": len(self._by_silo),
+            "published": self.published,
+            "dropped": self.dropped + sum(s.dropped for s in subs),
+            "queued": sum(s.queue.qsize() for s in subs),
+        }
+
+
+hub = Hub()
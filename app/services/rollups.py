@@ -0,0 +1,153 @@
+"""
+services/rollups.py
+Rollups incrementais de leituras (horário e diário) em readings_hourly/readings_daily.
+
+Cada documento de rollup é identificado por (silo_id, t) e guarda, por campo,
+n/sum/min/max (a média é sum/n) e o total de leituras no bucket. A ingestão
+atualiza os buckets com upserts $inc/$min/$max; rebuild_rollups recalcula um
+intervalo a partir de readings (ex.: após um backfill).
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from .. import db
+
+FIELDS = ("temp_C", "rh_pct", "co2_ppm_est", "mq2_raw")
+# grain -> (collection, unidade do $dateTrunc)
+GRAINS = {"hourly": ("readings_hourly", "hour"), "daily": ("readings_daily", "day")}
+
+
+def utc_naive(ts: datetime) -> datetime:
+    """Datetime em UTC sem tzinfo (como o Mongo armazena); naive é tratado como UTC."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _step(unit: str, bin_size: int = 1) -> timedelta:
+    return {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}[unit] * bin_size
+
+
+def truncate(ts: datetime, unit: str, bin_size: int = 1) -> datetime:
+    """Início do bucket de `ts` (mesmo alinhamento do $dateTrunc com binSize)."""
+    ts = utc_naive(ts)
+    if unit == "minute":
+        return ts.replace(minute=ts.minute - ts.minute % bin_size, second=0, microsecond=0)
+    if unit == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(ts: datetime, unit: str, bin_size: int = 1) -> datetime:
+    t = truncate(ts, unit, bin_size)
+    if t == utc_naive(ts):
+        return t
+    return t + _step(unit, bin_size)
+
+
+def bucket_range(start: datetime, end: datetime, unit: str, bin_size: int = 1) -> Tuple[datetime, datetime]:
+    """
+    Alarga [start, end) para buckets inteiros: do início do bucket de `start` ao
+    fim do bucket que contém o último instante antes de `end`. Rollups só
+    guardam buckets inteiros, então toda agregação usa esta regra.
+    """
+    return truncate(start, unit, bin_size), _ceil(end, unit, bin_size)
+
+
+async def update_rollups(docs: List[dict]):
+    """
+    Atualiza os rollups com as leituras recém-gravadas. As leituras do lote são
+    somadas em memória antes, então cada bucket recebe um único upsert.
+    """
+    for coll_name, unit in GRAINS.values():
+        acc: Dict[tuple, Dict[str, Any]] = {}
+        for d in docs:
+            ts = d.get("timestamp")
+            if not d.get("silo_id") or not isinstance(ts, datetime):
+                continue
+            key = (d["silo_id"], truncate(ts, unit))
+            a = acc.get(key)
+            if a is None:
+                a = acc[key] = {"inc": {"count": 0}, "min": {}, "max": {}}
+            a["inc"]["count"] += 1
+            for f in FIELDS:
+                v = d.get(f)
+                if v is None:
+                    continue
+                v = float(v)
+                a["inc"][f"{f}_n"] = a["inc"].get(f"{f}_n", 0) + 1
+                a["inc"][f"{f}_sum"] = a["inc"].get(f"{f}_sum", 0.0) + v
+                a["min"][f"{f}_min"] = min(v, a["min"].get(f"{f}_min", v))
+                a["max"][f"{f}_max"] = max(v, a["max"].get(f"{f}_max", v))
+        if not acc:
+            continue
+        ops = []
+        for (silo_id, t), a in acc.items():
+            update = {"$inc": a["inc"]}
+            if a["min"]:
+                update["$min"] = a["min"]
+                update["$max"] = a["max"]
+            ops.append(UpdateOne({"silo_id": silo_id, "t": t}, update, upsert=True))
+        await db.db[coll_name].bulk_write(ops, ordered=False)
+
+
+def rollup_to_bucket(doc: dict) -> dict:
+    """Converte um documento de rollup no formato de bucket do endpoint /aggregate."""
+    item = {"t": doc["t"], "count": doc.get("count", 0)}
+    for f in FIELDS:
+        n = doc.get(f"{f}_n") or 0
+        item[f] = {
+            "min": doc.get(f"{f}_min"),
+            "max": doc.get(f"{f}_max"),
+            "avg": (doc.get(f"{f}_sum", 0.0) / n) if n else None,
+        }
+    return item
+
+
+async def rebuild_rollups(start: datetime, end: datetime, silo_id: Optional[str] = None,
+                          inclusive_end: bool = False) -> Dict[str, int]:
+    """
+    Recalcula os rollups no intervalo [start, end) (alinhado aos buckets de cada
+    grain) a partir de readings: remove os buckets do intervalo e regrava via
+    $group + $merge no próprio servidor. Com inclusive_end=True o intervalo é
+    [start, end] (ex.: end é o timestamp da última leitura importada).
+    Retorna o número de buckets gravados por grain.
+    """
+    out = {}
+    for grain, (coll_name, unit) in GRAINS.items():
+        lo = truncate(start, unit)
+        if inclusive_end:
+            # o bucket de `end` entra mesmo quando end está alinhado
+            hi = truncate(end, unit) + _step(unit)
+        else:
+            hi = _ceil(end, unit)
+        match: Dict[str, Any] = {"timestamp": {"$gte": lo, "$lt": hi}}
+        if silo_id:
+            match["silo_id"] = silo_id
+        group: Dict[str, Any] = {
+            "_id": {"silo_id": "$silo_id", "t": {"$dateTrunc": {"date": "$timestamp", "unit": unit}}},
+            "count": {"$sum": 1},
+        }
+        project: Dict[str, Any] = {"_id": 0, "silo_id": "$_id.silo_id", "t": "$_id.t", "count": 1}
+        for f in FIELDS:
+            # n conta só valores numéricos (mesma regra do update incremental)
+            group[f"{f}_n"] = {"$sum": {"$cond": [{"$isNumber": f"${f}"}, 1, 0]}}
+            group[f"{f}_sum"] = {"$sum": f"${f}"}
+            group[f"{f}_min"] = {"$min": f"${f}"}
+            group[f"{f}_max"] = {"$max": f"${f}"}
+            for k in ("n", "sum", "min", "max"):
+                project[f"{f}_{k}"] = 1
+        pipeline = [
+            {"$match": {**match, "silo_id": match.get("silo_id", {"$ne": None})}},
+            {"$group": group},
+            {"$project": project},
+            {"$merge": {"into": coll_name, "on": ["silo_id", "t"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]
+        del_filter: Dict[str, Any] = {"t": {"$gte": lo, "$lt": hi}}
+        if silo_id:
+            del_filter["silo_id"] = silo_id
+        await db.db[coll_name].delete_many(del_filter)
+        async for _ in db.db.readings.aggregate(pipeline):
+            pass
+        out[grain] = await db.db[coll_name].count_documents(del_filter)
+    return out
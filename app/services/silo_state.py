@@ -0,0 +1,117 @@
+"""
+services/silo_state.py
+Estado atual materializado por silo (coleção silo_state, _id = silo_id).
+
+Cada documento guarda a última leitura, last_seen, o score de anomalia da
+última leitura e os alertas abertos (não reconhecidos) por nível. A ingestão
+mantém o documento atualizado, de modo que a visão geral da frota
+(GET /api/silos/overview) é uma única leitura indexada.
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from collections import Counter
+from pymongo import UpdateOne
+from .. import db
+
+LEVELS = ("info", "warning", "critical")
+# Campos da leitura copiados para last_reading
+READING_FIELDS = ("_id", "device_id", "timestamp", "temp_C", "rh_pct", "co2_ppm_est", "mq2_raw", "device_status")
+
+
+def _reading_update(reading: Dict[str, Any], anomaly: bool, score: Optional[float]) -> UpdateOne:
+    """
+    Atualização em pipeline: só substitui a última leitura se esta for mais
+    recente (leituras fora de ordem ou backfill não voltam o estado no tempo).
+    """
+    ts = reading["timestamp"]
+    newer = {"$gte": [ts, {"$ifNull": ["$last_seen", datetime.min]}]}
+    last = {k: reading.get(k) for k in READING_FIELDS}
+
+    def pick(value, field):
+        return {"$cond": [newer, {"$literal": value}, f"${field}"]}
+
+    return UpdateOne(
+        {"_id": reading.get("silo_id")},
+        [{"$set": {
+            "last_reading": pick(last, "last_reading"),
+            "anomaly": pick(anomaly, "anomaly"),
+            "score": pick(score, "score"),
+            "last_seen": pick(ts, "last_seen"),
+            "updated_at": datetime.utcnow(),
+        }}],
+        upsert=True,
+    )
+
+
+async def update_from_readings(docs: List[dict], scores: List[tuple]):
+    """Atualiza o estado com a leitura mais recente de cada silo do lote."""
+    latest: Dict[str, tuple] = {}
+    for doc, (is_anom, score) in zip(docs, scores):
+        sid = doc.get("silo_id")
+        if sid is None:
+            continue
+        cur = latest.get(sid)
+        if cur is None or doc["timestamp"] >= cur[0]["timestamp"]:
+            latest[sid] = (doc, bool(is_anom), score)
+    if latest:
+        await db.db.silo_state.bulk_write(
+            [_reading_update(doc, anom, score) for doc, anom, score in latest.values()], ordered=False
+        )
+
+
+async def add_alerts(alert_docs: List[dict]):
+    """Incrementa os alertas abertos por nível para os alertas recém-criados."""
+    per_silo: Dict[str, Counter] = {}
+    for a in alert_docs:
+        if a.get("silo_id") is not None:
+            per_silo.setdefault(a["silo_id"], Counter())[a.get("level", "critical")] += 1
+    if per_silo:
+        await db.db.silo_state.bulk_write([
+            UpdateOne({"_id": sid}, {"$inc": {f"open_alerts.{lvl}": n for lvl, n in c.items()}}, upsert=True)
+            for sid, c in per_silo.items()
+        ], ordered=False)
+
+
+async def refresh_alert_counts(silo_ids):
+    """Recalcula os alertas abertos por nível (ex.: após reconhecer alertas)."""
+    silo_ids = [s for s in set(silo_ids) if s is not None]
+    if not silo_ids:
+        return
+    counts = {sid: {lvl: 0 for lvl in LEVELS} for sid in silo_ids}
+    async for row in db.db.alerts.aggregate([
+        {"$match": {"silo_id": {"$in": silo_ids}, "acknowledged": False}},
+        {"$group": {"_id": {"silo_id": "$silo_id", "level": "$level"}, "n": {"$sum": 1}}},
+    ]):
+        counts[row["_id"]["silo_id"]][row["_id"]["level"]] = row["n"]
+    await db.db.silo_state.bulk_write([
+        UpdateOne({"_id": sid}, {"$set": {"open_alerts": c, "updated_at": datetime.utcnow()}}, upsert=True)
+        for sid, c in counts.items()
+    ], ordered=False)
+
+
+async def rebuild(silo_ids=None) -> int:
+    """Reconstrói o estado a partir de readings/alerts (bancos já populados)."""
+    if silo_ids is None:
+        silo_ids = [s["_id"] async for s in db.db.silos.find({}, {"_id": 1})]
+    ops = []
+    for sid in silo_ids:
+        last = await db.db.readings.find_one({"silo_id": sid}, sort=[("timestamp", -1)])
+        if last:
+            ops.append(_reading_update(last, False, None))
+    if ops:
+        await db.db.silo_state.bulk_write(ops, ordered=False)
+    await refresh_alert_counts(silo_ids)
+    return len(silo_ids)
+
+
+def overview_pipeline() -> List[dict]:
+    """silos + silo_state em uma agregação ($lookup pelo _id)."""
+    return [
+        {"$sort": {"name": 1}},
+        {"$lookup": {"from": "silo_state", "localField": "_id", "foreignField": "_id", "as": "state"}},
+        {"$project": {
+            "name": 1, "device_id": 1, "location": 1, "settings": 1,
+            "state": {"$ifNull": [{"$arrayElemAt": ["$state", 0]}, {}]},
+        }},
+        {"$project": {"state._id": 0}},
+    ]
@@ -0,0 +1,126 @@
+"""
+services/suppression.py
+Supressão de alertas repetidos por (silo_id, regra), respeitando
+settings.alert_interval_min do silo.
+
+Um alerta novo (e sua notificação) é criado no máximo uma vez por intervalo
+para cada (silo_id, regra). Disparos dentro da janela incrementam `count` e
+atualizam `last_seen`/`last_value` no alerta aberto (não reconhecido) em vez de
+inserir outro; se ele já foi reconhecido, um alerta novo é criado.
+O último disparo fica num mapa em memória (TTL = resto da janela); na falta
+dele (ex.: após restart) o alerta aberto é buscado no Mongo.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from pymongo import UpdateOne
+
+from .. import config, db
+from ..cache import TTLCache, MISSING
+from ..utils import get_silo_entries
+from .pubsub import hub
+
+logger = logging.getLogger("uvicorn.error")
+
+# (silo_id, regra) -> (alert_id, disparado_em); None = sem alerta aberto (consultado no Mongo)
+_last_fired = TTLCache(maxsize=config.ALERT_SUPPRESSION_CACHE_MAX, ttl=config.ALERT_INTERVAL_MIN_DEFAULT * 60)
+_counters = {"inserted": 0, "suppressed": 0}
+
+
+def _interval(entry) -> timedelta:
+    settings = (entry.silo.get("settings") or {}) if entry else {}
+    minutes = settings.get("alert_interval_min")
+    if minutes is None:
+        minutes = config.ALERT_INTERVAL_MIN_DEFAULT
+    return timedelta(minutes=max(minutes, 0))
+
+
+async def _open_alert(key: Tuple[Any, str], since: datetime):
+    """Último alerta aberto da chave disparado dentro da janela (consulta ao Mongo)."""
+    silo_id, rule = key
+    doc = await db.db.alerts.find_one(
+        {"silo_id": silo_id, "rule": rule, "timestamp": {"$gte": since}, "acknowledged": {"$ne": True}},
+        {"timestamp": 1},
+        sort=[("timestamp", -1)],
+    )
+    return (doc["_id"], doc["timestamp"]) if doc else None
+
+
+async def suppress(alert_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Recebe os alertas candidatos (com `rule`), grava os incrementos dos que caem
+    na janela de um alerta aberto e retorna apenas os que devem ser inseridos.
+    """
+    if not alert_docs:
+        return []
+    entries = await get_silo_entries(a.get("silo_id") for a in alert_docs)
+    to_insert: List[Dict[str, Any]] = []
+    fresh: Dict[str, Dict[str, Any]] = {}
+    bumps: Dict[str, Dict[str, Any]] = {}
+
+    for a in alert_docs:
+        window = _interval(entries.get(a.get("silo_id")))
+        if not window or not a.get("rule"):
+            to_insert.append(a)
+            continue
+        key = (a.get("silo_id"), a["rule"])
+        now = a["timestamp"]
+        fired = _last_fired.get(key)
+        if fired is MISSING:
+            fired = await _open_alert(key, now - window)
+            if fired is not None:
+                _last_fired.set(key, fired, ttl=(fired[1] + window - now).total_seconds())
+        if fired is not None and now - fired[1] < window:
+            new = fresh.get(fired[0])
+            if new is not None:
+                # Alerta criado neste mesmo lote: ainda não está no banco
+                new["count"] = new.get("count", 1) + 1
+                new["last_seen"], new["last_value"] = now, a.get("value")
+                continue
+            b = bumps.setdefault(fired[0], {"n": 0, "silo_id": key[0], "key": key, "first": a, "window": window})
+            b["n"] += 1
+            b["last_seen"], b["last_value"] = now, a.get("value")
+            continue
+        to_insert.append(a)
+        fresh[a["_id"]] = a
+        _last_fired.set(key, (a["_id"], now), ttl=window.total_seconds())
+
+    if bumps:
+        # Só incrementa alerta ainda aberto: o cache pode apontar para um já reconhecido
+        ops = [
+            UpdateOne(
+                {"_id": alert_id, "acknowledged": {"$ne": True}},
+                {"$inc": {"count": b["n"]}, "$set": {"last_seen": b["last_seen"], "last_value": b["last_value"]}},
+            )
+            for alert_id, b in bumps.items()
+        ]
+        try:
+            res = await db.db.alerts.bulk_write(ops, ordered=False)
+            if res.matched_count < len(ops):
+                acked = db.db.alerts.find({"_id": {"$in": list(bumps)}, "acknowledged": True}, {"_id": 1})
+                for alert_id in [d["_id"] async for d in acked]:
+                    # Reconhecido: os disparos viram um alerta novo (com notificação)
+                    b = bumps.pop(alert_id)
+                    new = b["first"]
+                    new["count"] = b["n"]
+                    new["last_seen"], new["last_value"] = b["last_seen"], b["last_value"]
+                    to_insert.append(new)
+                    _last_fired.set(b["key"], (new["_id"], new["timestamp"]), ttl=b["window"].total_seconds())
+        except Exception as e:
+            logger.warning("Erro ao atualizar alertas suprimidos: %s", e)
+        for alert_id, b in bumps.items():
+            hub.publish("alert_update", b["silo_id"], {
+                "_id": alert_id, "count_inc": b["n"], "last_seen": b["last_seen"], "last_value": b["last_value"],
+            })
+    _counters["inserted"] += len(to_insert)
+    _counters["suppressed"] += len(alert_docs) - len(to_insert)
+    return to_insert
+
+
+def reset():
+    _last_fired.clear()
+
+
+def suppression_stats() -> dict:
+    return {**_counters, "cache": _last_fired.stats()}
@@ -5,81 +5,212 @@ Cliente simples para ThingSpeak: consulta feeds e converte para ReadingIn.
 import httpx
 from .. import config, db
 import logging
-from datetime import datetime
-import uuid
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from .ingest import ingest_readings
 
 logger = logging.getLogger("uvicorn.error")
-THINGSPEAK_URL = "https://api.thingspeak.com/channels/{channel}/feeds.json?api_key={key}"
+THINGSPEAK_URL = "https://api.thingspeak.com/channels/{channel}/feeds.json"
+# Máximo de entradas por requisição aceito pelo ThingSpeak
+THINGSPEAK_MAX_RESULTS = 8000
+# Sobreposição ao retomar a varredura incremental (ver fetch_and_store)
+THINGSPEAK_SCAN_OVERLAP = timedelta(seconds=60)
 
-async def fetch_and_store(channel_id: int, read_key: str, silo_id: str = None, device_id: str = None):
-    logger.info(f"Buscando dados do ThingSpeak para o canal {channel_id}")
-    url = THINGSPEAK_URL.format(channel=channel_id, key=read_key)
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, timeout=10.0)
-        
-        if r.status_code != 200:
-            logger.error(f"Erro ao buscar dados: Status {r.status_code}")
-            return
-        
-        data = r.json()
-        feeds = data.get("feeds", [])
-        
-        if not feeds:
-            logger.info("Nenhum dado encontrado no feed")
-            return
-        
-        f = feeds[0]
-        logger.info(f"Dados recebidos: {f}")
-
-        # Map fields -> readings
-        try:
-            doc = {
-                "_id": str(uuid.uuid4()),
-                "device_id": device_id or f.get("entry_id"),
-                "timestamp": datetime.strptime(f.get("created_at"), "%Y-%m-%dT%H:%M:%SZ"),
-                "temp_C": float(f.get("field1") or 0.0),
-                "rh_pct": float(f.get("field2") or 0.0),
-                "co2_ppm_est": float(f.get("field3") or 0.0),
-                "mq2_raw": int(f.get("field4") or 0),
-                "device_status": "ok",
-                "silo_id": silo_id
-            }
-        except Exception as e:
-            logger.error(f"Erro ao processar dados do ThingSpeak: {e}")
-            return
-            
-        await db.db.readings.insert_one(doc)
-        logger.info(f"Dados inseridos no MongoDB: {doc['_id']}")
-        
-        # Pós-processamento: regras + ML + notificações
+try:
+    import h2  # noqa: F401  (HTTP/2 no httpx requer o extra httpx[http2])
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Cliente HTTP compartilhado (keep-alive, HTTP/2 quando disponível): evita um
+    handshake TLS novo a cada consulta ao ThingSpeak.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=httpx.Timeout(config.THINGSPEAK_TIMEOUT_SEC),
+            limits=httpx.Limits(
+                max_connections=max(config.THINGSPEAK_CONCURRENCY, 1) * 2,
+                max_keepalive_connections=max(config.THINGSPEAK_CONCURRENCY, 1),
+                keepalive_expiry=config.THINGSPEAK_POLL_INTERVAL_SEC + 30,
+            ),
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def feed_to_doc(f: dict, channel_id, silo_id: str = None, device_id: str = None) -> dict:
+    """
+    Converte uma entrada do feed do ThingSpeak em documento de leitura. O _id é
+    determinístico por (canal, entry_id), então regravar a mesma entrada gera
+    erro de chave duplicada em vez de uma leitura repetida.
+    """
+    return {
+        "_id": f"ts:{channel_id}:{f['entry_id']}",
+        "device_id": device_id or f.get("entry_id"),
+        "timestamp": datetime.strptime(f.get("created_at"), "%Y-%m-%dT%H:%M:%SZ"),
+        "temp_C": float(f.get("field1") or 0.0),
+        "rh_pct": float(f.get("field2") or 0.0),
+        "co2_ppm_est": float(f.get("field3") or 0.0),
+        "mq2_raw": int(f.get("field4") or 0),
+        "device_status": "ok",
+        "silo_id": silo_id,
+        "channel_id": channel_id,
+        "entry_id": f["entry_id"],
+    }
+
+async def get_watermark(channel_id) -> dict:
+    """Marca d'água do canal: última entry_id/created_at já gravada."""
+    return await db.db.thingspeak_state.find_one({"_id": str(channel_id)}) or {}
+
+async def set_watermark(channel_id, entry_id: Optional[int], created_at: Optional[datetime],
+                        scanned_until: Optional[datetime] = None):
+    """
+    Avança a marca do canal. `scanned_until` registra até onde o histórico foi
+    varrido por completo (mesmo sem entradas), para a próxima consulta não
+    repetir janelas vazias.
+    """
+    # $max: nunca retrocede, mesmo com chamadas concorrentes (poller + importador)
+    marks = {}
+    if entry_id is not None:
+        marks["last_entry_id"] = entry_id
+    if created_at is not None:
+        marks["last_created_at"] = created_at
+    if scanned_until is not None:
+        marks["scanned_until"] = scanned_until
+    if not marks:
+        return
+    await db.db.thingspeak_state.update_one(
+        {"_id": str(channel_id)},
+        {"$max": marks, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+async def _ingest_entries(feeds, channel_id, silo_id, device_id, last_entry: int, summary: dict):
+    """
+    Grava as entradas com entry_id > last_entry. Retorna a última entrada antes
+    da primeira falha de gravação (None se nada avançou) e se houve falha.
+    """
+    new = sorted((f for f in feeds if (f.get("entry_id") or 0) > last_entry), key=lambda f: f["entry_id"])
+    if not new:
+        return None, False
+    summary["fetched"] += len(new)
+
+    # Map fields -> readings (entradas inválidas são puladas, mas avançam a marca)
+    docs = []
+    for f in new:
         try:
-            from ..utils import apply_threshold_rules
-            from ..ml.model import detect_anomaly
-            from ..services.notification import notify_alert
-            
-            alerts = await apply_threshold_rules(doc)
-            is_anom, score = await detect_anomaly(doc)
-            
-            if is_anom:
-                alerts.append({"level": "warning", "message": "Anomalia detectada (ML)", "value": score})
-                
-            for a in alerts:
-                a_doc = {
-                    "_id": str(uuid.uuid4()),
-                    "silo_id": doc.get("silo_id"),
-                    "level": a.get("level", "critical"),
-                    "message": a.get("message"),
-                    "value": a.get("value"),
-                    "timestamp": datetime.utcnow(),
-                    "acknowledged": False,
-                }
-                await db.db.alerts.insert_one(a_doc)
-                await notify_alert(a_doc)
-                
+            docs.append(feed_to_doc(f, channel_id, silo_id=silo_id, device_id=device_id))
         except Exception as e:
-            logger.error(f"Erro no pós-processamento: {e}")
-            
+            logger.error(f"Erro ao processar entrada {f.get('entry_id')} do ThingSpeak: {e}")
+            summary["errors"] += 1
+
+    # Gravação + pós-processamento: regras + ML + outbox de notificações
+    results = await ingest_readings(docs, anomaly_message="Anomalia detectada (ML)", source="thingspeak") if docs else []
+    failed = {docs[i]["entry_id"] for i, res in enumerate(results) if res["status"] == "error"}
+    summary["inserted"] += sum(1 for res in results if res["status"] == "ok")
+    summary["duplicates"] += sum(1 for res in results if res["status"] == "duplicate")
+    summary["errors"] += len(failed)
+
+    advanced = None
+    for f in new:
+        if f["entry_id"] in failed:
+            break
+        advanced = f
+    return advanced, bool(failed)
+
+def _created_at(f: dict) -> Optional[datetime]:
+    try:
+        return datetime.strptime(f["created_at"], "%Y-%m-%dT%H:%M:%SZ")
+    except Exception:
+        return None
+
+async def fetch_and_store(channel_id: int, read_key: str, silo_id: str = None, device_id: str = None,
+                          max_windows: int = 60):
+    """
+    Ingestão incremental a partir da marca d'água do canal.
+
+    Com `start`, o ThingSpeak devolve as `results` entradas MAIS RECENTES do
+    intervalo, não as mais antigas; por isso o histórico pendente é percorrido
+    para frente em janelas limitadas (start/end), divididas quando atingem o
+    limite (thingspeak_import._fetch_window). A marca só avança depois que uma
+    janela foi gravada por inteiro. Sem marca (primeira execução), grava a
+    página mais recente; o histórico anterior é trabalho do importador.
+    Retorna um resumo.
+    """
+    # import tardio: thingspeak_import importa este módulo
+    from .thingspeak_import import ImportStats, _fetch_window
+
+    logger.info(f"Buscando dados do ThingSpeak para o canal {channel_id}")
+    summary = {"fetched": 0, "inserted": 0, "duplicates": 0, "errors": 0, "last_entry_id": None,
+               "last_created_at": None, "ok": True}
+    client = get_http_client()
+    url = THINGSPEAK_URL.format(channel=channel_id)
+
+    try:
+        mark = await get_watermark(channel_id)
+        last_entry = mark.get("last_entry_id") or 0
+        last_created = mark.get("last_created_at")
+        summary["last_entry_id"] = last_entry or None
+        summary["last_created_at"] = last_created
+
+        if not last_created:
+            t0 = time.perf_counter()
+            r = await client.get(url, params={"api_key": read_key, "results": THINGSPEAK_MAX_RESULTS, "timezone": "UTC"})
+            logger.info(f"Canal {channel_id}: HTTP {r.status_code} em {(time.perf_counter() - t0) * 1000:.0f} ms")
+            if r.status_code != 200:
+                logger.error(f"Erro ao buscar dados: Status {r.status_code}")
+                summary["ok"] = False
+                return summary
+            advanced, failed = await _ingest_entries(r.json().get("feeds", []) or [], channel_id, silo_id, device_id, last_entry, summary)
+            if advanced is not None:
+                created = _created_at(advanced)
+                await set_watermark(channel_id, advanced["entry_id"], created)
+                summary["last_entry_id"], summary["last_created_at"] = advanced["entry_id"], created
+            return summary
+
+        # Recomeça um pouco antes do fim da última varredura: entradas gravadas no
+        # mesmo segundo da consulta anterior; o filtro por entry_id remove repetidas
+        start = max(last_created, (mark.get("scanned_until") or last_created) - THINGSPEAK_SCAN_OVERLAP)
+        # `end` é inclusivo com resolução de segundos
+        end = datetime.utcnow().replace(microsecond=0) + timedelta(seconds=1)
+        window = timedelta(hours=config.THINGSPEAK_POLL_WINDOW_HOURS)
+        stats = ImportStats()
+        cur = start
+        for _ in range(max_windows):
+            if cur >= end:
+                break
+            hi = min(cur + window, end)
+            t0 = time.perf_counter()
+            feeds = await _fetch_window(client, channel_id, read_key, cur, hi - timedelta(seconds=1), stats, THINGSPEAK_URL)
+            logger.info(f"Canal {channel_id}: janela {cur}..{hi} com {len(feeds)} entradas em {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+            advanced, failed = await _ingest_entries(feeds, channel_id, silo_id, device_id, last_entry, summary)
+            if advanced is not None:
+                last_entry = advanced["entry_id"]
+                last_created = _created_at(advanced) or last_created
+                summary["last_entry_id"], summary["last_created_at"] = last_entry, last_created
+            if failed:
+                # Falha de gravação: a marca fica na última entrada gravada antes dela
+                if advanced is not None:
+                    await set_watermark(channel_id, last_entry, last_created)
+                break
+            # Janela gravada por inteiro
+            await set_watermark(channel_id, last_entry if advanced else None, last_created if advanced else None, scanned_until=hi)
+            cur = hi
+
+        logger.info(f"Canal {channel_id}: {summary}")
     except Exception as e:
-        logger.error(f"Erro na requisição para ThingSpeak: {e}")
\ No newline at end of file
+        logger.error(f"Erro na requisição para ThingSpeak: {e}")
+        summary["ok"] = False
+    return summary
@@ -0,0 +1,186 @@
+"""
+services/thingspeak_import.py
+Importação histórica (backfill) do ThingSpeak em massa e retomável.
+
+- percorre o histórico de cada canal em janelas de data (`start`/`end`); se uma
+  janela atinge o limite de resultados por requisição, ela é dividida ao meio;
+- grava com insert_many não ordenado em lotes, com concorrência limitada;
+- deduplica pelo entry_id (_id determinístico, ver thing_speak.feed_to_doc;
+  em time-series via db.unique_readings);
+- salva checkpoint por canal (import_checkpoints) ao fim de cada janela, então
+  uma importação interrompida continua de onde parou;
+- não executa regras/ML/notificações (dados históricos); os rollups devem ser
+  recalculados depois (rebuild_rollups).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from pymongo.errors import BulkWriteError
+
+from .. import db
+from .thing_speak import THINGSPEAK_URL, THINGSPEAK_MAX_RESULTS, feed_to_doc
+
+logger = logging.getLogger("uvicorn.error")
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+MIN_WINDOW = timedelta(minutes=1)
+
+
+class ImportStats:
+    __slots__ = ("requests", "fetched", "inserted", "duplicates", "errors", "first_ts", "last_ts", "last_entry_id",
+                 "incomplete", "started")
+
+    def __init__(self):
+        self.requests = self.fetched = self.inserted = self.duplicates = self.errors = 0
+        # Parou numa janela com erro de gravação (não duplicata); ver import_channel
+        self.incomplete = False
+        self.first_ts: Optional[datetime] = None
+        self.last_ts: Optional[datetime] = None
+        self.last_entry_id = 0
+        self.started = time.perf_counter()
+
+    def add_docs(self, docs):
+        for d in docs:
+            ts = d["timestamp"]
+            self.first_ts = ts if self.first_ts is None or ts < self.first_ts else self.first_ts
+            self.last_ts = ts if self.last_ts is None or ts > self.last_ts else self.last_ts
+            self.last_entry_id = max(self.last_entry_id, d["entry_id"])
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "requests": self.requests,
+            "fetched": self.fetched,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 2),
+            "rows_per_s": round(self.inserted / elapsed, 1) if elapsed > 0 else None,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "incomplete": self.incomplete,
+        }
+
+
+async def _fetch_window(client: httpx.AsyncClient, channel_id, read_key: str, lo: datetime, hi: datetime, stats: ImportStats, base_url: str):
+    """Busca [lo, hi]; divide a janela enquanto o limite de resultados for atingido."""
+    params = {
+        "api_key": read_key,
+        "start": lo.strftime(TS_FORMAT),
+        "end": hi.strftime(TS_FORMAT),
+        "results": THINGSPEAK_MAX_RESULTS,
+        "timezone": "UTC",
+    }
+    stats.requests += 1
+    r = await client.get(base_url.format(channel=channel_id), params=params)
+    r.raise_for_status()
+    feeds = r.json().get("feeds", []) or []
+    if len(feeds) >= THINGSPEAK_MAX_RESULTS and hi - lo > MIN_WINDOW:
+        mid = lo + (hi - lo) / 2
+        mid = mid.replace(microsecond=0)
+        left = await _fetch_window(client, channel_id, read_key, lo, mid, stats, base_url)
+        right = await _fetch_window(client, channel_id, read_key, mid + timedelta(seconds=1), hi, stats, base_url)
+        return left + right
+    return feeds
+
+
+async def channel_created_at(client: httpx.AsyncClient, channel_id, read_key: str, base_url: str = THINGSPEAK_URL) -> Optional[datetime]:
+    """Data de criação do canal (início natural do histórico)."""
+    r = await client.get(base_url.format(channel=channel_id), params={"api_key": read_key, "results": 0})
+    r.raise_for_status()
+    created = (r.json().get("channel") or {}).get("created_at")
+    return datetime.strptime(created, "%Y-%m-%dT%H:%M:%SZ") if created else None
+
+
+async def _write_batch(collection, docs, sem: asyncio.Semaphore, stats: ImportStats) -> int:
+    """Grava um lote; retorna quantos documentos falharam por outro motivo que não duplicata."""
+    async with sem:
+        # Em time-series o _id não é único: descarta repetidos antes de gravar
+        docs, dup = await db.unique_readings(collection, docs)
+        stats.duplicates += len(dup)
+        if not docs:
+            return 0
+        try:
+            res = await collection.insert_many(docs, ordered=False)
+            stats.inserted += len(res.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            dup = sum(1 for err in errors if err.get("code") == 11000)
+            stats.duplicates += dup
+            stats.errors += len(errors) - dup
+            stats.inserted += e.details.get("nInserted", 0)
+            return len(errors) - dup
+        return 0
+
+
+async def import_channel(
+    database,
+    client: httpx.AsyncClient,
+    channel_id,
+    read_key: str,
+    silo_id: str,
+    start: datetime,
+    end: datetime,
+    window: timedelta = timedelta(days=1),
+    batch_size: int = 1000,
+    sem: Optional[asyncio.Semaphore] = None,
+    resume: bool = True,
+    base_url: str = THINGSPEAK_URL,
+) -> ImportStats:
+    """
+    Importa o histórico de um canal no intervalo [start, end). Se uma janela tem
+    erros de gravação (que não duplicatas), para nela: o checkpoint e as
+    estatísticas de first/last ficam na última janela gravada por inteiro e
+    `incomplete` é marcado; rodar de novo regrava a janela.
+    """
+    sem = sem or asyncio.Semaphore(4)
+    stats = ImportStats()
+    ckpt_id = str(channel_id)
+    cur = start
+    if resume:
+        ckpt = await database.import_checkpoints.find_one({"_id": ckpt_id})
+        if ckpt and ckpt.get("done_until") and ckpt["done_until"] > cur:
+            cur = ckpt["done_until"]
+            logger.info(f"Canal {channel_id}: retomando a partir de {cur}")
+
+    seen = set()
+    while cur < end:
+        hi = min(cur + window, end)
+        # `end` do ThingSpeak é inclusivo: a janela vai até 1 s antes do próximo início
+        feeds = await _fetch_window(client, channel_id, read_key, cur, hi - timedelta(seconds=1), stats, base_url)
+        docs = []
+        for f in feeds:
+            eid = f.get("entry_id")
+            if eid is None or eid in seen:
+                continue
+            seen.add(eid)
+            try:
+                docs.append(feed_to_doc(f, channel_id, silo_id=silo_id, device_id=silo_id))
+            except Exception as e:
+                logger.error(f"Canal {channel_id}: entrada {eid} inválida: {e}")
+                stats.errors += 1
+        stats.fetched += len(docs)
+        failed = 0
+        if docs:
+            failed = sum(await asyncio.gather(*(
+                _write_batch(database.readings, docs[i:i + batch_size], sem, stats)
+                for i in range(0, len(docs), batch_size)
+            )))
+        if failed:
+            logger.error(f"Canal {channel_id}: {failed} leituras não gravadas na janela {cur} .. {hi}; parando nela")
+            stats.incomplete = True
+            break
+        stats.add_docs(docs)
+        await database.import_checkpoints.update_one(
+            {"_id": ckpt_id},
+            {"$set": {"done_until": hi, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        cur = hi
+        # Mantém só os entry_ids da borda (janelas são disjuntas); evita crescer sem limite
+        seen = {d["entry_id"] for d in docs[-1:]}
+    return stats
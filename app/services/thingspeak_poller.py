@@ -1,49 +1,74 @@
 """
 services/thingspeak_poller.py
 Serviço para buscar dados do ThingSpeak periodicamente.
+Os canais são consultados concorrentemente (limite THINGSPEAK_CONCURRENCY), de
+modo que um ciclo dura aproximadamente o tempo do canal mais lento.
 """
 import asyncio
 import logging
+import time
+from datetime import datetime
 from .thing_speak import fetch_and_store
 from .. import config
+from ..metrics import (
+    THINGSPEAK_CHANNEL_ERRORS, THINGSPEAK_CHANNEL_LAG, THINGSPEAK_CHANNEL_SECONDS, THINGSPEAK_CYCLE_SECONDS,
+)
 
 logger = logging.getLogger("uvicorn.error")
 
+async def _poll_channel(sem: asyncio.Semaphore, system_channel_id: str, read_key: str):
+    # Obter channel_id do ThingSpeak a partir do mapeamento
+    if not (config.THINGSPEAK_CHANNELS and system_channel_id in config.THINGSPEAK_CHANNELS):
+        logger.error(f"Channel {system_channel_id} não encontrado em THINGSPEAK_CHANNELS")
+        return
+    thing_channel_id = config.THINGSPEAK_CHANNELS[system_channel_id]
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            # Usar o ID real do ThingSpeak (não o ID do sistema)
+            summary = await fetch_and_store(
+                channel_id=thing_channel_id,  # ID do ThingSpeak (3082805)
+                read_key=read_key,
+                silo_id=system_channel_id  # ID do sistema ("1")
+            )
+            if not summary.get("ok", True):
+                THINGSPEAK_CHANNEL_ERRORS.labels(system_channel_id).inc()
+            if summary.get("last_created_at"):
+                lag = (datetime.utcnow() - summary["last_created_at"]).total_seconds()
+                THINGSPEAK_CHANNEL_LAG.labels(system_channel_id).set(lag)
+        except Exception as e:
+            logger.error(f"Erro ao processar canal {system_channel_id}: {e}")
+            THINGSPEAK_CHANNEL_ERRORS.labels(system_channel_id).inc()
+        finally:
+            elapsed = time.perf_counter() - t0
+            THINGSPEAK_CHANNEL_SECONDS.labels(system_channel_id).observe(elapsed)
+            logger.info(f"Canal {system_channel_id} processado em {elapsed * 1000:.0f} ms")
+
 async def thingspeak_poller():
     """
     Tarefa em segundo plano para buscar dados do ThingSpeak em intervalos regulares.
     """
+    sem = asyncio.Semaphore(max(config.THINGSPEAK_CONCURRENCY, 1))
     while True:
         try:
             # Verificar se as configurações existem
             if not config.THINGSPEAK_API_KEYS:
                 logger.warning("THINGSPEAK_API_KEYS não configurado")
-                await asyncio.sleep(300)
+                await asyncio.sleep(config.THINGSPEAK_POLL_INTERVAL_SEC)
                 continue
-                
-            # Buscar dados de todos os canais configurados
-            for system_channel_id, read_key in config.THINGSPEAK_API_KEYS.items():
-                try:
-                    # Obter channel_id do ThingSpeak a partir do mapeamento
-                    if (config.THINGSPEAK_CHANNELS and 
-                        system_channel_id in config.THINGSPEAK_CHANNELS):
-                        thing_channel_id = config.THINGSPEAK_CHANNELS[system_channel_id]
-                    else:
-                        logger.error(f"Channel {system_channel_id} não encontrado em THINGSPEAK_CHANNELS")
-                        continue
-                    
-                    # Usar o ID real do ThingSpeak (não o ID do sistema)
-                    await fetch_and_store(
-                        channel_id=thing_channel_id,  # ID do ThingSpeak (3082805)
-                        read_key=read_key,
-                        silo_id=system_channel_id  # ID do sistema ("1")
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao processar canal {system_channel_id}: {e}")
-                    continue
-                    
-            # Esperar 5 minutos entre as verificações
-            await asyncio.sleep(300)
+
+            # Buscar dados de todos os canais configurados, em paralelo
+            t0 = time.perf_counter()
+            await asyncio.gather(*(
+                _poll_channel(sem, system_channel_id, read_key)
+                for system_channel_id, read_key in config.THINGSPEAK_API_KEYS.items()
+            ))
+            elapsed = time.perf_counter() - t0
+            THINGSPEAK_CYCLE_SECONDS.observe(elapsed)
+            logger.info(f"Ciclo ThingSpeak: {len(config.THINGSPEAK_API_KEYS)} canais em {elapsed:.2f} s")
+
+            # Esperar o intervalo configurado (padrão 5 minutos) entre o início dos ciclos
+            await asyncio.sleep(max(config.THINGSPEAK_POLL_INTERVAL_SEC - elapsed, 0))
         except Exception as e:
             logger.error(f"Erro no poller do ThingSpeak: {e}")
-            await asyncio.sleep(60)
\ No newline at end of file
+            await asyncio.sleep(60)
@@ -7,6 +7,8 @@ from .. import config
 from ..services.thing_speak import fetch_and_store
 from .. import db
 import asyncio
+import logging
+from datetime import datetime
 
 def start_scheduler(app):
     scheduler = AsyncIOScheduler()
@@ -21,3 +23,22 @@ def start_scheduler(app):
             await fetch_and_store(channel, read_key, silo_id=silo_id, device_id=device_id)
     scheduler.add_job(lambda: asyncio.create_task(job()), "interval", minutes=5)
     scheduler.start()
+
+def start_retrain_scheduler():
+    """
+    Agenda o retreino noturno do modelo ML (config.ML_RETRAIN_HOUR, UTC).
+    Usa o mesmo mecanismo de job da API (app.ml.jobs.start_retrain). Todo worker
+    agenda o cron; o id do job por dia e o lock no Mongo garantem uma execução.
+    """
+    from ..ml import jobs
+
+    scheduler = AsyncIOScheduler(timezone="UTC")
+    async def job():
+        job_id = f"schedule-{datetime.utcnow():%Y-%m-%d}"
+        try:
+            await jobs.start_retrain(days=config.ML_RETRAIN_DAYS, trigger="schedule", job_id=job_id)
+        except jobs.RetrainInProgress as e:
+            logging.getLogger("uvicorn.error").info("Retreino agendado ignorado: %s", e)
+    scheduler.add_job(job, "cron", hour=config.ML_RETRAIN_HOUR, minute=0)
+    scheduler.start()
+    return scheduler
@@ -12,9 +12,16 @@ Refatorado seguindo princípios SOLID:
 - Dependency Inversion: o engine depende de abstrações (Rule), não de implementações concretas.
 """
 from __future__ import annotations
+import asyncio
+import logging
 from typing import List, Dict, Any
 from abc import ABC, abstractmethod
-from . import db
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from . import db, config
+from .cache import TTLCache, MISSING
+
+logger = logging.getLogger("uvicorn.error")
 
 class Rule(ABC):
     """Interface (abstração) para uma regra que pode gerar alertas a partir de uma leitura."""
@@ -36,6 +43,7 @@ class ThresholdRule(Rule):
         self.threshold = threshold
         self.level = level
         self.message = message
+        self.key = f"threshold:{field}"
 
     async def apply(self, reading: Dict[str, Any]) -> List[Dict[str, Any]]:
         val = reading.get(self.field)
@@ -47,7 +55,229 @@ class ThresholdRule(Rule):
         except Exception:
             return []
         if v > self.threshold:
-            return [{"level": self.level, "message": self.message, "value": v}]
+            return [{"level": self.level, "message": self.message, "value": v, "rule": self.key}]
+        return []
+
+
+def _as_float(val):
+    if val is None:
+        return None
+    try:
+        return float(val)
+    except Exception:
+        return None
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _ts_hours(ts):
+    """Converte o timestamp da leitura (datetime, UTC) em horas desde epoch."""
+    if not isinstance(ts, datetime):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (ts - _EPOCH).total_seconds() / 3600.0
+
+
+class RuleState:
+    """
+    Estado compacto de uma regra stateful para um silo. Um único tipo com
+    __slots__ atende às três regras (cada uma usa apenas os campos de que precisa).
+    """
+    __slots__ = ("active", "count", "ewma", "slope", "last_value", "last_ts", "n")
+
+    def __init__(self):
+        self.active = False
+        self.count = 0
+        self.ewma = None
+        self.slope = 0.0
+        self.last_value = None
+        self.last_ts = None
+        self.n = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RuleState":
+        st = cls()
+        for k in cls.__slots__:
+            if k in d:
+                setattr(st, k, d[k])
+        return st
+
+
+class RuleStateStore:
+    """
+    Estado em memória das regras stateful: {(silo_id, rule_key): RuleState}.
+    É salvo periodicamente na collection rule_state (apenas entradas alteradas)
+    e restaurado no startup, de modo que as regras não consultam o histórico de
+    leituras: cada leitura custa O(1).
+    """
+
+    def __init__(self):
+        self._states: Dict[tuple, RuleState] = {}
+        self._dirty: set = set()
+
+    def get(self, silo_id: str, key: str) -> RuleState:
+        k = (silo_id, key)
+        st = self._states.get(k)
+        if st is None:
+            st = self._states[k] = RuleState()
+        self._dirty.add(k)
+        return st
+
+    def clear(self):
+        self._states.clear()
+        self._dirty.clear()
+
+    async def checkpoint(self) -> int:
+        """Grava no Mongo os estados alterados desde o último checkpoint."""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"_id": f"{silo_id}|{key}"},
+                {"$set": {"silo_id": silo_id, "key": key, "state": self._states[(silo_id, key)].to_dict(), "updated_at": now}},
+                upsert=True,
+            )
+            for silo_id, key in dirty if (silo_id, key) in self._states
+        ]
+        try:
+            if ops:
+                await db.db.rule_state.bulk_write(ops, ordered=False)
+        except Exception:
+            # Mantém como sujo para tentar de novo no próximo checkpoint.
+            self._dirty |= dirty
+            raise
+        return len(ops)
+
+    async def restore(self) -> int:
+        """Carrega do Mongo os estados salvos (chamado no startup)."""
+        n = 0
+        async for doc in db.db.rule_state.find({}):
+            self._states[(doc["silo_id"], doc["key"])] = RuleState.from_dict(doc.get("state") or {})
+            n += 1
+        return n
+
+    async def run_checkpointer(self, interval: float):
+        """Tarefa em segundo plano: checkpoint periódico do estado."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.warning("Falha ao salvar estado das regras: %s", e)
+
+
+rule_state = RuleStateStore()
+
+
+class HysteresisRule(Rule):
+    """
+    Dispara uma vez quando o valor sobe acima de `high` e só rearma quando cai
+    abaixo de `low` (evita alertas repetidos enquanto o valor oscila no limite).
+    """
+
+    def __init__(self, field: str, high: float, low: float, level: str, message: str, store: RuleStateStore = None):
+        self.field = field
+        self.high = high
+        self.low = low
+        self.level = level
+        self.message = message
+        self.store = store or rule_state
+        self.key = f"hysteresis:{field}"
+
+    async def apply(self, reading: Dict[str, Any]) -> List[Dict[str, Any]]:
+        v = _as_float(reading.get(self.field))
+        if v is None or not reading.get("silo_id"):
+            return []
+        st = self.store.get(reading["silo_id"], self.key)
+        st.last_value = v
+        if not st.active and v > self.high:
+            st.active = True
+            return [{"level": self.level, "message": self.message, "value": v, "rule": self.key}]
+        if st.active and v < self.low:
+            st.active = False
+        return []
+
+
+class ConsecutiveRule(Rule):
+    """
+    Dispara quando `n` leituras consecutivas ficam acima do limite (uma vez por
+    sequência); uma leitura abaixo do limite zera o contador.
+    """
+
+    def __init__(self, field: str, threshold: float, n: int, level: str, message: str, store: RuleStateStore = None):
+        self.field = field
+        self.threshold = threshold
+        self.n = n
+        self.level = level
+        self.message = message
+        self.store = store or rule_state
+        self.key = f"consecutive:{field}"
+
+    async def apply(self, reading: Dict[str, Any]) -> List[Dict[str, Any]]:
+        v = _as_float(reading.get(self.field))
+        if v is None or not reading.get("silo_id"):
+            return []
+        st = self.store.get(reading["silo_id"], self.key)
+        st.last_value = v
+        if v > self.threshold:
+            st.count += 1
+            if st.count == self.n:
+                return [{"level": self.level, "message": f"{self.message} ({self.n} leituras seguidas)", "value": v, "rule": self.key}]
+        else:
+            st.count = 0
+        return []
+
+
+class RateOfChangeRule(Rule):
+    """
+    Tendência temporal: mantém uma EWMA do valor e uma EWMA da inclinação
+    (unidades por hora) e dispara quando a inclinação passa de `max_rate`.
+    Rearma quando a inclinação volta a ficar abaixo do limite.
+    Leituras fora de ordem (timestamp <= último) são ignoradas.
+    """
+
+    MIN_SAMPLES = 3
+
+    def __init__(self, field: str, max_rate: float, alpha: float, level: str, message: str, store: RuleStateStore = None):
+        self.field = field
+        self.max_rate = max_rate
+        self.alpha = alpha
+        self.level = level
+        self.message = message
+        self.store = store or rule_state
+        self.key = f"rate:{field}"
+
+    async def apply(self, reading: Dict[str, Any]) -> List[Dict[str, Any]]:
+        v = _as_float(reading.get(self.field))
+        t = _ts_hours(reading.get("timestamp"))
+        if v is None or t is None or not reading.get("silo_id"):
+            return []
+        st = self.store.get(reading["silo_id"], self.key)
+        if st.ewma is None:
+            st.ewma, st.slope, st.last_ts, st.last_value, st.n = v, 0.0, t, v, 1
+            return []
+        dt = t - st.last_ts
+        if dt <= 0:
+            return []
+        a = self.alpha
+        ewma = a * v + (1 - a) * st.ewma
+        st.slope = a * ((ewma - st.ewma) / dt) + (1 - a) * st.slope
+        st.ewma, st.last_ts, st.last_value = ewma, t, v
+        st.n += 1
+        if st.n < self.MIN_SAMPLES:
+            return []
+        if not st.active and st.slope > self.max_rate:
+            st.active = True
+            return [{"level": self.level, "message": self.message, "value": round(st.slope, 3), "rule": self.key}]
+        if st.active and st.slope <= self.max_rate:
+            st.active = False
         return []
 
 
@@ -69,42 +299,130 @@ class RuleEngine:
         return alerts
 
 
-async def apply_threshold_rules(reading: dict) -> List[dict]:
+def _build_rules(settings: Dict[str, Any]) -> List[Rule]:
     """
-    Função compatível com o código existente. Busca as configurações do silo e
-    constrói dinamicamente regras de threshold conforme settings.
-    Mantém a assinatura anterior para compatibilidade.
+    Constrói dinamicamente as regras conforme os settings do silo.
+    - temp_hysteresis: o limite de temperatura passa a usar HysteresisRule;
+    - consecutive_readings (> 1): os demais limites exigem N leituras seguidas;
+    - temp_rate_threshold: adiciona RateOfChangeRule (°C/h) sobre temp_C.
     """
-    alerts = []
-    silo_id = reading.get("silo_id")
-    if not silo_id:
-        return alerts
-    silo = await db.db.silos.find_one({"_id": silo_id})
-    if not silo:
-        return alerts
-    settings = silo.get("settings", {})
-
-    # Construir regras dinamicamente com base em settings.
     rules: List[Rule] = []
+    consecutive = settings.get("consecutive_readings") or 0
+
+    def threshold(field, th, level, message):
+        if consecutive > 1:
+            return ConsecutiveRule(field=field, threshold=th, n=consecutive, level=level, message=message)
+        return ThresholdRule(field=field, threshold=th, level=level, message=message)
 
-    # Exemplos: se existir um threshold no settings, cria uma ThresholdRule correspondente.
+    # Exemplos: se existir um threshold no settings, cria uma regra correspondente.
     temp_th = settings.get("temp_threshold")
     if temp_th is not None:
-        rules.append(ThresholdRule(field="temp_C", threshold=temp_th, level="warning", message="Temperatura acima do limite"))
+        hyst = settings.get("temp_hysteresis")
+        if hyst:
+            rules.append(HysteresisRule(field="temp_C", high=temp_th, low=temp_th - hyst, level="warning", message="Temperatura acima do limite"))
+        else:
+            rules.append(threshold("temp_C", temp_th, "warning", "Temperatura acima do limite"))
 
     co2_th = settings.get("co2_threshold")
     if co2_th is not None:
-        rules.append(ThresholdRule(field="co2_ppm_est", threshold=co2_th, level="critical", message="CO2 acima do limite"))
+        rules.append(threshold("co2_ppm_est", co2_th, "critical", "CO2 acima do limite"))
 
     mq2_th = settings.get("mq2_threshold")
     if mq2_th is not None:
-        rules.append(ThresholdRule(field="mq2_raw", threshold=mq2_th, level="warning", message="MQ2 alto"))
+        rules.append(threshold("mq2_raw", mq2_th, "warning", "MQ2 alto"))
+
+    rate_th = settings.get("temp_rate_threshold")
+    if rate_th is not None:
+        alpha = settings.get("trend_ewma_alpha") or 0.3
+        rules.append(RateOfChangeRule(field="temp_C", max_rate=rate_th, alpha=alpha, level="warning", message="Temperatura subindo rapidamente (°C/h)"))
+
+    return rules
+
 
-    # Aqui é simples: instanciamos o engine com as regras e executamos.
-    engine = RuleEngine(rules=rules)
-    alerts = await engine.run(reading)
-    return alerts
+class SiloEntry:
+    """Entrada do cache de silos: documento do silo + RuleEngine pré-construído."""
+    __slots__ = ("silo", "engine")
 
-# TODO: Para estender (ex.: regras de histerese, contagem de leituras consecutivas,
-# tendências temporais), criar novas classes que implementem Rule e acrescentá-las
-# na lista de 'rules' acima. Isso respeita OCP (aberto para extensão, fechado para modificação).
+    def __init__(self, silo: Dict[str, Any]):
+        self.silo = silo
+        self.engine = RuleEngine(rules=_build_rules(silo.get("settings") or {}))
+
+
+# Cache compartilhado de metadados de silo (inclui cache negativo: silo inexistente -> None).
+_silo_cache = TTLCache(maxsize=config.SILO_CACHE_MAX, ttl=config.SILO_CACHE_TTL_SEC)
+
+
+async def get_silo_entries(silo_ids) -> Dict[str, Any]:
+    """
+    Retorna {silo_id: SiloEntry | None} usando o cache; os ausentes são buscados
+    numa única query $in e cacheados.
+    """
+    out: Dict[str, Any] = {}
+    missing = []
+    for sid in set(silo_ids):
+        if not sid:
+            continue
+        entry = _silo_cache.get(sid)
+        if entry is MISSING:
+            missing.append(sid)
+        else:
+            out[sid] = entry
+    if missing:
+        found = {}
+        async for silo in db.db.silos.find({"_id": {"$in": missing}}):
+            found[silo["_id"]] = SiloEntry(silo)
+        for sid in missing:
+            entry = found.get(sid)
+            _silo_cache.set(sid, entry)
+            out[sid] = entry
+    return out
+
+
+async def get_silo_entry(silo_id: str):
+    if not silo_id:
+        return None
+    return (await get_silo_entries([silo_id])).get(silo_id)
+
+
+async def get_silo(silo_id: str):
+    """Documento do silo via cache (None se não existir)."""
+    entry = await get_silo_entry(silo_id)
+    return entry.silo if entry else None
+
+
+def invalidate_silo(silo_id: str = None):
+    """Remove um silo do cache (ou todos, se silo_id for None)."""
+    if silo_id is None:
+        _silo_cache.clear()
+    else:
+        _silo_cache.pop(silo_id)
+
+
+def silo_cache_stats() -> dict:
+    return _silo_cache.stats()
+
+
+async def apply_threshold_rules(reading: dict) -> List[dict]:
+    """
+    Função compatível com o código existente. Usa o cache de silos, que guarda
+    as regras já construídas a partir dos settings.
+    Mantém a assinatura anterior para compatibilidade.
+    """
+    entry = await get_silo_entry(reading.get("silo_id"))
+    if not entry:
+        return []
+    return await entry.engine.run(reading)
+
+
+async def apply_threshold_rules_batch(readings: List[dict]) -> List[List[dict]]:
+    """
+    Versão em lote de apply_threshold_rules: os silos fora do cache são buscados
+    numa única query ($in). Retorna uma lista de alertas para cada leitura, na
+    mesma ordem da entrada.
+    """
+    entries = await get_silo_entries(r.get("silo_id") for r in readings)
+    out: List[List[dict]] = []
+    for r in readings:
+        entry = entries.get(r.get("silo_id"))
+        out.append(await entry.engine.run(r) if entry else [])
+    return out
@@ -0,0 +1,73 @@
+"""
+scripts/bench_login_burst.py
+Mede a latência de uma "ingestão" simulada durante uma rajada de logins concorrentes,
+comparando bcrypt inline no event loop vs. o pool dedicado de hashing (app.auth).
+
+A ingestão simulada é uma corrotina que roda a cada --ingest-interval-ms e mede
+o atraso entre o instante em que deveria rodar e o fim do seu trabalho (ou seja,
+inclui o tempo em que o event loop ficou bloqueado).
+Não usa MongoDB.
+Uso:
+  python -m scripts.bench_login_burst --logins 40 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from passlib.context import CryptContext
+from app import auth
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def _ingest_probe(stop: asyncio.Event, interval: float, out: list):
+    while not stop.is_set():
+        due = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        await asyncio.sleep(0)       # ponto de troca como um await de I/O
+        sum(range(2000))             # trabalho leve de CPU do pipeline
+        out.append((time.perf_counter() - due) * 1000)
+
+
+async def _burst(mode: str, ctx: CryptContext, hashed: str, n: int, interval: float):
+    async def login_inline():
+        await asyncio.sleep(0)
+        ctx.verify("senha-correta", hashed)
+
+    async def login_pool():
+        await auth._run_hash(ctx.verify, "senha-correta", hashed)
+
+    login = login_inline if mode == "inline" else login_pool
+    stop = asyncio.Event()
+    lat: list = []
+    probe = asyncio.create_task(_ingest_probe(stop, interval, lat))
+    await asyncio.sleep(0.05)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(n)))
+    burst_s = time.perf_counter() - t0
+    stop.set()
+    await probe
+    return {"burst_s": burst_s, "p50": statistics.median(lat), "p99": _pct(lat, 99), "max": max(lat), "n": len(lat)}
+
+
+async def run(args):
+    ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=args.rounds)
+    hashed = ctx.hash("senha-correta")
+    print(f"{args.logins} logins concorrentes, bcrypt rounds={args.rounds}, pool={auth.config.PASSWORD_HASH_WORKERS} threads")
+    print(f"{'modo':<8}{'rajada (s)':>12}{'ingest p50 (ms)':>17}{'p99 (ms)':>10}{'max (ms)':>10}")
+    for mode in ("inline", "pool"):
+        r = await _burst(mode, ctx, hashed, args.logins, args.ingest_interval_ms / 1000)
+        print(f"{mode:<8}{r['burst_s']:>12.2f}{r['p50']:>17.2f}{r['p99']:>10.2f}{r['max']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--ingest-interval-ms", type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,114 @@
+"""
+scripts/bench_readings_layout.py
+Compara o layout comum vs time-series da collection de leituras:
+tamanho em disco (collStats) e latência de consultas por intervalo (silo + janela).
+
+Cria duas collections temporárias (bench_readings_regular / bench_readings_ts),
+insere os mesmos dados sintéticos, executa as mesmas consultas e remove tudo
+ao final (use --keep para manter).
+Uso:
+  python -m scripts.bench_readings_layout --rows 500000 --silos 10 --queries 200 --window-hours 24
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from app import db
+
+REGULAR = "bench_readings_regular"
+TS = "bench_readings_ts"
+
+
+def _synthetic(rows, silos, start):
+    # Uma leitura por minuto por silo, em ordem de tempo (como chega da ingestão)
+    per_silo = rows // silos
+    for i in range(per_silo):
+        ts = start + timedelta(minutes=i)
+        for s in range(silos):
+            yield {
+                "_id": str(uuid.uuid4()),
+                "device_id": f"dev-{s}",
+                "timestamp": ts,
+                "temp_C": round(random.gauss(24, 2), 2),
+                "rh_pct": round(random.gauss(60, 5), 2),
+                "co2_ppm_est": round(random.gauss(450, 30), 1),
+                "mq2_raw": random.randint(80, 200),
+                "device_status": "ok",
+                "silo_id": str(s),
+            }
+
+
+async def _load(coll, docs, batch=10000):
+    for i in range(0, len(docs), batch):
+        await coll.insert_many(docs[i:i + batch], ordered=False)
+
+
+async def _range_latencies(coll, silos, start, span_min, window, queries, rng):
+    lat = []
+    for _ in range(queries):
+        silo = str(rng.randrange(silos))
+        lo = start + timedelta(minutes=rng.randrange(max(1, span_min - int(window.total_seconds() // 60))))
+        t0 = time.perf_counter()
+        await coll.find(
+            {"silo_id": silo, "timestamp": {"$gte": lo, "$lt": lo + window}}
+        ).sort("timestamp", -1).to_list(None)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(args):
+    db.init_db()
+    for name in (REGULAR, TS):
+        await db.db[name].drop()
+    await db.db.create_collection(TS, timeseries=db.readings_timeseries_options())
+    regular, ts = db.db[REGULAR], db.db[TS]
+    for coll in (regular, ts):
+        await coll.create_index([("silo_id", 1), ("timestamp", -1), ("_id", -1)])
+
+    start = datetime(2024, 1, 1)
+    docs = list(_synthetic(args.rows, args.silos, start))
+    span_min = args.rows // args.silos
+    window = timedelta(hours=args.window_hours)
+    print(f"{len(docs)} leituras sintéticas, {args.silos} silos, janela de consulta {window}")
+
+    results = {}
+    try:
+        for name, coll in (("regular", regular), ("timeseries", ts)):
+            t0 = time.perf_counter()
+            await _load(coll, [dict(d) for d in docs])
+            load_s = time.perf_counter() - t0
+            stats = await db.db.command("collStats", coll.name)
+            lat = await _range_latencies(coll, args.silos, start, span_min, window, args.queries, random.Random(42))
+            results[name] = {
+                "load_s": load_s,
+                "storage_mb": stats.get("storageSize", 0) / 2**20,
+                "index_mb": stats.get("totalIndexSize", 0) / 2**20,
+                "p50_ms": statistics.median(lat),
+                "p95_ms": _pct(lat, 95),
+            }
+        print(f"{'layout':<12}{'carga (s)':>10}{'dados (MB)':>12}{'índices (MB)':>14}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+        for name, r in results.items():
+            print(f"{name:<12}{r['load_s']:>10.1f}{r['storage_mb']:>12.1f}{r['index_mb']:>14.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+    finally:
+        if not args.keep:
+            for name in (REGULAR, TS):
+                await db.db[name].drop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--silos", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--window-hours", type=int, default=24)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,87 @@
+"""
+scripts/bench_serialization.py
+Compara o custo de serializar uma página de leituras: caminho padrão do FastAPI
+(response_model=List[dict] -> jsonable_encoder -> json) vs app/responses.py
+(orjson, msgpack opcional) e o tamanho com gzip/brotli.
+Não precisa de banco: usa leituras sintéticas no formato da collection.
+Uso:
+  python -m scripts.bench_serialization --rows 10000 --repeat 5
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app import config
+from app.responses import dumps_json, dumps_msgpack, brotli, msgpack
+
+
+class _Page(BaseModel):
+    __root__: List[dict]
+
+
+def _synthetic(rows):
+    start = datetime(2024, 1, 1)
+    return [{
+        "_id": str(uuid.uuid4()),
+        "device_id": "dev-1",
+        "timestamp": start + timedelta(minutes=i),
+        "temp_C": round(random.gauss(24, 2), 2),
+        "rh_pct": round(random.gauss(60, 5), 2),
+        "co2_ppm_est": round(random.gauss(450, 30), 1),
+        "mq2_raw": random.randint(80, 200),
+        "device_status": "ok",
+        "silo_id": "1",
+    } for i in range(rows)]
+
+
+def _fastapi_default(docs):
+    # O que o FastAPI faz com response_model=List[dict] + JSONResponse
+    validated = _Page.parse_obj(docs).__root__
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), out
+
+
+def main(args):
+    docs = _synthetic(args.rows)
+    encoders = [("fastapi (pydantic + jsonable_encoder + json)", lambda: _fastapi_default(docs)),
+                ("orjson", lambda: dumps_json(docs))]
+    if msgpack is not None:
+        encoders.append(("msgpack", lambda: dumps_msgpack(docs)))
+    else:
+        print("(msgpack não instalado; pulando)")
+
+    print(f"{args.rows} leituras, mediana de {args.repeat} execuções")
+    print(f"{'encoder':<46} {'encode ms':>10} {'bytes':>10} {'gzip':>10} {'gzip ms':>8} {'br':>10} {'br ms':>8}")
+    for name, fn in encoders:
+        ms, body = _time(fn, args.repeat)
+        gz_ms, gz = _time(lambda: gzip.compress(body, compresslevel=config.RESPONSE_GZIP_LEVEL), args.repeat)
+        if brotli is not None:
+            br_ms, br = _time(lambda: brotli.compress(body, quality=config.RESPONSE_BROTLI_QUALITY), args.repeat)
+            br_cols = f"{len(br):>10} {br_ms:>8.1f}"
+        else:
+            br_cols = f"{'-':>10} {'-':>8}"
+        print(f"{name:<46} {ms:>10.1f} {len(body):>10} {len(gz):>10} {gz_ms:>8.1f} {br_cols}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -1,68 +1,117 @@
 """
 scripts/import_historical.py
-Script para importar todos os dados históricos do ThingSpeak.
+Importa o histórico do ThingSpeak de todos os canais em THINGSPEAK_CHANNELS.
+
+Uso:
+    python -m scripts.import_historical [--from 2024-01-01] [--to 2024-06-01]
+        [--channel 1] [--window-hours 24] [--batch-size 1000] [--concurrency 4]
+        [--no-resume] [--skip-rollups]
+
+O progresso é salvo por canal (coleção import_checkpoints): rodar de novo
+continua da última janela concluída. Entradas já gravadas são ignoradas.
 """
+import argparse
 import asyncio
-import httpx
-from app import config, db
-from datetime import datetime
-import uuid
 import logging
+from datetime import datetime, timedelta
+
+from app import config, db
+from app.services.rollups import rebuild_rollups
+from app.services.thing_speak import get_http_client, close_http_client, set_watermark
+from app.services.thingspeak_import import import_channel, channel_created_at
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def import_historical_data():
-    # Configurações do ThingSpeak
-    channel_id = 3082805  # ID do canal no ThingSpeak
-    read_key = "2KX537GW7RZ2LQZQ"  # Sua chave de leitura
-    silo_id = "1"  # ID do silo no seu sistema
-    
-    # URL para buscar todos os dados (sem limite de results)
-    url = f"https://api.thingspeak.com/channels/{channel_id}/feeds.json?api_key={read_key}"
-    
-    logger.info(f"Importando dados históricos do canal {channel_id}")
-    
+
+async def import_historical_data(args):
+    channels = {
+        system_id: ts_channel
+        for system_id, ts_channel in config.THINGSPEAK_CHANNELS.items()
+        if not args.channel or system_id in args.channel
+    }
+    if not channels:
+        logger.error("Nenhum canal em THINGSPEAK_CHANNELS")
+        return
+
+    # Detecta o layout de `readings` (time-series exige dedupe explícito)
+    await db.ensure_readings_collection()
+    client = get_http_client()
+    sem = asyncio.Semaphore(max(args.concurrency, 1))
+    end = args.to or datetime.utcnow()
+
+    async def run(system_id, ts_channel):
+        read_key = config.THINGSPEAK_API_KEYS.get(system_id)
+        if not read_key:
+            logger.error(f"Canal {system_id} sem chave em THINGSPEAK_API_KEYS")
+            return None
+        start = args.start or await channel_created_at(client, ts_channel, read_key)
+        if start is None:
+            logger.error(f"Canal {system_id}: data inicial desconhecida, use --from")
+            return None
+        logger.info(f"Canal {system_id} ({ts_channel}): importando {start} .. {end}")
+        stats = await import_channel(
+            db.db, client, ts_channel, read_key, system_id, start, end,
+            window=timedelta(hours=args.window_hours),
+            batch_size=args.batch_size,
+            sem=sem,
+            resume=not args.no_resume,
+        )
+        # O poller incremental continua a partir do que foi importado
+        if stats.last_entry_id:
+            await set_watermark(ts_channel, stats.last_entry_id, stats.last_ts)
+        return stats
+
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, timeout=30.0)
-        
-        if r.status_code != 200:
-            logger.error(f"Erro ao buscar dados: Status {r.status_code}")
-            return
-        
-        data = r.json()
-        feeds = data.get("feeds", [])
-        logger.info(f"Encontrados {len(feeds)} registros para importar")
-        
-        # Inserir todos os dados no MongoDB
-        for f in feeds:
-            try:
-                doc = {
-                    "_id": str(uuid.uuid4()),
-                    "device_id": silo_id,
-                    "timestamp": datetime.strptime(f.get("created_at"), "%Y-%m-%dT%H:%M:%SZ"),
-                    "temp_C": float(f.get("field1") or 0.0),
-                    "rh_pct": float(f.get("field2") or 0.0),
-                    "co2_ppm_est": float(f.get("field3") or 0.0),
-                    "mq2_raw": int(f.get("field4") or 0),
-                    "device_status": "ok",
-                    "silo_id": silo_id
-                }
-                await db.db.readings.insert_one(doc)
-                logger.info(f"Inserido registro {f['entry_id']}")
-            except Exception as e:
-                logger.error(f"Erro ao processar feed {f.get('entry_id')}: {e}")
-                
-        logger.info("Importação histórica concluída!")
-        
-    except Exception as e:
-        logger.error(f"Erro na importação histórica: {e}")
+        results = await asyncio.gather(*(run(s, c) for s, c in channels.items()), return_exceptions=True)
+    finally:
+        await close_http_client()
+
+    total_inserted, total_elapsed = 0, 0.0
+    for system_id, res in zip(channels, results):
+        if isinstance(res, Exception):
+            logger.error(f"Canal {system_id}: falhou ({res}); rode de novo para retomar")
+            continue
+        if res is None:
+            continue
+        s = res.as_dict()
+        total_inserted += s["inserted"]
+        total_elapsed = max(total_elapsed, s["elapsed_s"])
+        logger.info(
+            f"Canal {system_id}: {s['requests']} requisições, {s['fetched']} lidas, "
+            f"{s['inserted']} inseridas, {s['duplicates']} duplicadas, {s['errors']} erros, "
+            f"{s['elapsed_s']} s ({s['rows_per_s']} linhas/s)"
+        )
+        if s["incomplete"]:
+            logger.error(f"Canal {system_id}: parou numa janela com erros de gravação; rode de novo para retomar")
+        # Backfill não passa pela ingestão incremental: recalcula os rollups do intervalo
+        # (first_ts/last_ts cobrem só as janelas gravadas por inteiro)
+        if not args.skip_rollups and s["inserted"] and s["first_ts"]:
+            # last_ts é a última leitura gravada: o fim do intervalo é inclusivo
+            rr = await rebuild_rollups(s["first_ts"], s["last_ts"], silo_id=system_id, inclusive_end=True)
+            logger.info(f"Canal {system_id}: rollups recalculados: {rr}")
+
+    if total_elapsed:
+        logger.info(f"Total: {total_inserted} linhas em {total_elapsed} s ({total_inserted / total_elapsed:.1f} linhas/s)")
+    logger.info("Importação histórica concluída!")
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Importa o histórico do ThingSpeak")
+    p.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None,
+                   help="início (UTC); padrão: criação do canal")
+    p.add_argument("--to", type=datetime.fromisoformat, default=None, help="fim (UTC); padrão: agora")
+    p.add_argument("--channel", action="append", help="ID do silo/canal do sistema (repetível)")
+    p.add_argument("--window-hours", type=float, default=24)
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=config.THINGSPEAK_CONCURRENCY,
+                   help="lotes de insert_many simultâneos")
+    p.add_argument("--no-resume", action="store_true", help="ignora o checkpoint salvo")
+    p.add_argument("--skip-rollups", action="store_true")
+    return p.parse_args()
+
 
 if __name__ == "__main__":
-    # Inicializar o banco de dados
-    from app import db
+    args = _parse_args()
     db.init_db()
-    
-    # Executar a importação
-    asyncio.run(import_historical_data())
\ No newline at end of file
+    asyncio.run(import_historical_data(args))
@@ -0,0 +1,153 @@
+"""
+scripts/migrate_readings_timeseries.py
+Migra a collection `readings` (comum) para uma time-series collection.
+
+Passos:
+1. renomeia `readings` -> `readings_legacy` (se ainda não foi feito);
+2. cria `readings` como time-series (timeField=timestamp, metaField=silo_id);
+3. copia os documentos de `readings_legacy` em lotes, ordenados por _id (um
+   passe por tipo BSON do _id), gravando um checkpoint (collection `migrations`)
+   após cada lote. Se o script for interrompido, basta rodá-lo de novo: ele
+   continua do último lote;
+4. confere as contagens de origem e destino; se diferirem, a migração não é
+   marcada como concluída e `--drop-legacy` não remove nada.
+
+Pare o backend (ingestão e poller) durante os passos 1-2; a cópia (passo 3)
+pode rodar com a API no ar, pois novas leituras já vão para a collection nova.
+Uso:
+  READINGS_TIMESERIES=true python -m scripts.migrate_readings_timeseries [--batch-size 5000] [--drop-legacy]
+"""
+import argparse
+import asyncio
+import time
+from app import db
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+LEGACY = "readings_legacy"
+CHECKPOINT_ID = "readings_timeseries"
+
+
+async def _collection_type(name):
+    infos = await db.list_collection_infos(name)
+    return infos[0].get("type", "collection") if infos else None
+
+
+async def prepare():
+    readings_type = await _collection_type("readings")
+    legacy_type = await _collection_type(LEGACY)
+    if readings_type == "collection":
+        if legacy_type is not None:
+            raise SystemExit(f"'readings' e '{LEGACY}' existem como collections comuns; verifique antes de continuar.")
+        await db.db.readings.rename(LEGACY)
+        print(f"'readings' renomeada para '{LEGACY}'")
+        readings_type = None
+    if readings_type is None:
+        await db.db.create_collection("readings", timeseries=db.readings_timeseries_options())
+        print("'readings' criada como time-series collection")
+    if await _collection_type(LEGACY) is None:
+        raise SystemExit(f"Nada a migrar: '{LEGACY}' não existe.")
+
+
+# Passes de cópia, na ordem BSON do _id. $gt/$lt só comparam valores do mesmo
+# tipo: paginar tudo por _id pararia no fim das strings (uuid) e nunca chegaria
+# aos ObjectId legados. Cada tipo é paginado em um passe próprio.
+ID_TYPES = ("int", "long", "double", "string", "objectId")
+
+
+def _id_type(value) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "long" if abs(value) >= 2 ** 31 else "int"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    return "objectId" if isinstance(value, ObjectId) else type(value).__name__
+
+
+async def copy(batch_size: int):
+    legacy = db.db[LEGACY]
+    state = await db.db.migrations.find_one({"_id": CHECKPOINT_ID}) or {}
+    last_id = state.get("last_id")
+    # Checkpoints antigos não guardam o tipo: ele sai do próprio last_id
+    id_type = state.get("id_type") or (_id_type(last_id) if last_id is not None else ID_TYPES[0])
+    copied = state.get("copied", 0)
+    total = await legacy.estimated_document_count()
+    print(f"Retomando após _id={last_id!r} ({copied}/{total} já copiados)" if last_id else f"Copiando {total} documentos")
+
+    first_batch = True
+    t0 = time.perf_counter()
+    copied_now = 0
+    for t in ID_TYPES[ID_TYPES.index(id_type):]:
+        if t != id_type:
+            last_id = None
+        while True:
+            query = {"_id": {"$type": t, "$gt": last_id}} if last_id is not None else {"_id": {"$type": t}}
+            batch = await legacy.find(query).sort("_id", 1).limit(batch_size).to_list(None)
+            if not batch:
+                break
+            if first_batch and last_id is not None:
+                # O lote seguinte ao checkpoint pode ter sido gravado parcialmente
+                # antes da interrupção (time-series não tem _id único): pula os já
+                # copiados, que contam como copiados.
+                ids = [d["_id"] for d in batch]
+                existing = await db.existing_reading_ids(db.db.readings, batch)
+                batch = [d for d in batch if d["_id"] not in existing]
+                copied += len(existing)
+                last_id = ids[-1]
+            else:
+                last_id = batch[-1]["_id"]
+            first_batch = False
+            if batch:
+                try:
+                    await db.db.readings.insert_many(batch, ordered=False)
+                    inserted = len(batch)
+                except BulkWriteError as e:
+                    inserted = e.details.get("nInserted", 0)
+                    print(f"Aviso: {len(e.details.get('writeErrors', []))} documentos rejeitados no lote")
+                copied += inserted
+                copied_now += inserted
+            await db.db.migrations.update_one(
+                {"_id": CHECKPOINT_ID}, {"$set": {"id_type": t, "last_id": last_id, "copied": copied}}, upsert=True
+            )
+            rate = copied_now / max(time.perf_counter() - t0, 1e-9)
+            print(f"{copied}/{total} copiados ({rate:.0f} docs/s)")
+        first_batch = False
+
+    # Só conclui se tudo foi copiado: a origem é contada de novo (não estimada)
+    # e o destino, no intervalo de tempo da origem
+    source = await legacy.count_documents({})
+    first = await legacy.find({}, {"timestamp": 1}).sort("timestamp", 1).limit(1).to_list(None)
+    last = await legacy.find({}, {"timestamp": 1}).sort("timestamp", -1).limit(1).to_list(None)
+    target = await db.db.readings.count_documents(
+        {"timestamp": {"$gte": first[0]["timestamp"], "$lte": last[0]["timestamp"]}}
+    ) if first else 0
+    if copied != source or target < source:
+        print(f"Cópia incompleta: {source} na origem, {copied} copiados, {target} no destino no mesmo intervalo. "
+              f"'{LEGACY}' foi mantida e a migração não foi marcada como concluída; verifique os documentos rejeitados.")
+        return False
+    await db.db.migrations.update_one({"_id": CHECKPOINT_ID}, {"$set": {"done": True}}, upsert=True)
+    print("Cópia concluída.")
+    return True
+
+
+async def run(args):
+    db.init_db()
+    await prepare()
+    ok = await copy(args.batch_size)
+    await db.ensure_indexes()
+    if not ok:
+        raise SystemExit(1)
+    if args.drop_legacy:
+        await db.db[LEGACY].drop()
+        print(f"'{LEGACY}' removida.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop-legacy", action="store_true", help=f"Remove '{LEGACY}' ao final")
+    args = parser.parse_args()
+    asyncio.run(run(args))
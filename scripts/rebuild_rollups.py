@@ -0,0 +1,37 @@
+"""
+scripts/rebuild_rollups.py
+Recalcula os rollups horário/diário (readings_hourly/readings_daily) de um intervalo.
+Usar após backfills (ex.: scripts/import_historical.py) ou para corrigir divergências.
+Sem --from/--to recalcula todo o histórico de readings: passo obrigatório, uma
+vez, ao implantar os rollups num banco já populado (ver docs/DEPLOY.md).
+Uso:
+  python -m scripts.rebuild_rollups [--from 2024-01-01] [--to 2024-02-01] [--silo-id 1]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from app import db
+from app.services.rollups import rebuild_rollups
+
+async def run(args):
+    db.init_db()
+    await db.ensure_indexes()
+    query = {"silo_id": args.silo_id} if args.silo_id else {}
+    first = await db.db.readings.find(query, {"timestamp": 1}).sort("timestamp", 1).limit(1).to_list(None)
+    last = await db.db.readings.find(query, {"timestamp": 1}).sort("timestamp", -1).limit(1).to_list(None)
+    if not first:
+        print("Nenhuma leitura: nada a recalcular")
+        return
+    start = datetime.fromisoformat(args.start) if args.start else first[0]["timestamp"]
+    end = datetime.fromisoformat(args.end) if args.end else last[0]["timestamp"]
+    # Sem --to o fim é a última leitura, que precisa entrar no intervalo
+    res = await rebuild_rollups(start, end, silo_id=args.silo_id, inclusive_end=not args.end)
+    print(f"Rollups recalculados de {start} a {end}: {res}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from", dest="start", help="Início (ISO, ex.: 2024-01-01); padrão: primeira leitura")
+    parser.add_argument("--to", dest="end", help="Fim exclusivo (ISO); padrão: última leitura (inclusiva)")
+    parser.add_argument("--silo-id", required=False)
+    args = parser.parse_args()
+    asyncio.run(run(args))
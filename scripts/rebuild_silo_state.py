@@ -0,0 +1,23 @@
+"""
+scripts/rebuild_silo_state.py
+Reconstrói silo_state (última leitura e alertas abertos por nível) a partir de
+readings/alerts. Usar na primeira implantação ou após backfills.
+Uso:
+  python -m scripts.rebuild_silo_state [--silo-id 1]
+"""
+import argparse
+import asyncio
+from app import db
+from app.services.silo_state import rebuild
+
+async def run(args):
+    db.init_db()
+    await db.ensure_indexes()
+    n = await rebuild([args.silo_id] if args.silo_id else None)
+    print(f"silo_state reconstruído para {n} silo(s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--silo-id", required=False)
+    args = parser.parse_args()
+    asyncio.run(run(args))
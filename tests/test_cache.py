@@ -0,0 +1,48 @@
+"""
+tests/test_cache.py
+Testes do cache LRU + TTL em memória.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from app import auth, cache, db
+from app.cache import TTLCache, MISSING
+
+
+def test_lru_eviction_and_negative_entries():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", None)  # cache negativo
+    assert c.get("a") == 1  # "a" passa a ser o mais recente
+    c.set("c", 3)
+    assert c.get("b") is MISSING
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set("k", "v")
+    assert c.get("k") == "v"
+    now[0] += 5
+    assert c.get("k") is MISSING
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 0)
+
+
+def test_cached_user_is_not_shared(monkeypatch):
+    lookups = []
+
+    async def find_one(flt):
+        lookups.append(flt)
+        return {"_id": flt["_id"], "username": "ana", "role": "user"}
+
+    monkeypatch.setattr(db, "db", SimpleNamespace(users=SimpleNamespace(find_one=find_one)))
+    auth.invalidate_user()
+    token, _ = auth.create_tokens("u1")
+    first = asyncio.run(auth.user_from_token(token))
+    first["role"] = "admin"
+    second = asyncio.run(auth.user_from_token(token))
+    assert second["role"] == "user" and len(lookups) == 1
@@ -0,0 +1,205 @@
+"""
+tests/test_import_historical.py
+Importação histórica contra um ThingSpeak falso (httpx.MockTransport) e uma
+coleção em memória.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app import config, db
+from app.services import thing_speak, thingspeak_import
+from app.services.thingspeak_import import import_channel
+
+START = datetime(2024, 1, 1)
+FMT = "%Y-%m-%d %H:%M:%S"
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_many(self, docs, ordered=True):
+        inserted, errors = [], []
+        for i, d in enumerate(docs):
+            if d["_id"] in self.docs:
+                errors.append({"index": i, "code": 11000})
+            else:
+                self.docs[d["_id"]] = dict(d)
+                inserted.append(d["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    async def find_one(self, flt):
+        return self.docs.get(flt["_id"])
+
+    async def update_one(self, flt, update, upsert=False):
+        doc = self.docs.setdefault(flt["_id"], {"_id": flt["_id"]})
+        doc.update(update.get("$set", {}))
+        for k, v in update.get("$max", {}).items():
+            doc[k] = v if doc.get(k) is None else max(doc[k], v)
+
+
+def fake_thingspeak(n_entries, step=timedelta(minutes=1), fail_after=None):
+    """Canal com n_entries entradas; respeita start/end/results como a API real."""
+    feeds = [
+        {"entry_id": i + 1, "created_at": (START + i * step).strftime("%Y-%m-%dT%H:%M:%SZ"),
+         "field1": "20.5", "field2": "60", "field3": "400", "field4": "10"}
+        for i in range(n_entries)
+    ]
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request):
+        calls["n"] += 1
+        if fail_after is not None and calls["n"] > fail_after:
+            return httpx.Response(503)
+        q = request.url.params
+        lo = datetime.strptime(q["start"], FMT) if "start" in q else datetime.min
+        hi = datetime.strptime(q["end"], FMT) if "end" in q else datetime.max
+        sel = [f for f in feeds if lo <= datetime.strptime(f["created_at"], "%Y-%m-%dT%H:%M:%SZ") <= hi]
+        # Como o ThingSpeak: devolve as `results` entradas mais recentes da janela
+        return httpx.Response(200, json={"feeds": sel[-int(q["results"]):]})
+
+    return httpx.MockTransport(handler), calls
+
+
+def _db():
+    return SimpleNamespace(readings=FakeCollection(), import_checkpoints=FakeCollection())
+
+
+def test_import_pages_dedupes_and_resumes(monkeypatch):
+    monkeypatch.setattr(thingspeak_import, "THINGSPEAK_MAX_RESULTS", 100)
+    database = _db()
+    end = START + timedelta(days=1)
+
+    async def run(transport, **kw):
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await import_channel(database, client, 42, "key", "1", START, end,
+                                        window=timedelta(hours=6), batch_size=50, **kw)
+
+    # 1000 entradas (uma por minuto): janelas de 6 h têm 360 e precisam ser divididas
+    transport, _ = fake_thingspeak(1000)
+    stats = asyncio.run(run(transport))
+    assert stats.inserted == 1000 and stats.errors == 0
+    assert len(database.readings.docs) == 1000
+    assert database.import_checkpoints.docs["42"]["done_until"] == end
+
+    # Checkpoint concluído: nada é buscado de novo
+    transport, calls = fake_thingspeak(1000)
+    stats = asyncio.run(run(transport))
+    assert calls["n"] == 0 and stats.inserted == 0
+
+    # Sem checkpoint, as entradas já gravadas viram duplicatas, não leituras repetidas
+    stats = asyncio.run(run(fake_thingspeak(1000)[0], resume=False))
+    assert stats.inserted == 0 and stats.duplicates == 1000
+    assert len(database.readings.docs) == 1000
+
+
+def test_import_resumes_after_failure():
+    database = _db()
+    end = START + timedelta(days=1)
+
+    async def run(transport):
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await import_channel(database, client, 7, "key", "2", START, end, window=timedelta(hours=6))
+
+    transport, _ = fake_thingspeak(1440, fail_after=2)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run(transport))
+    assert database.import_checkpoints.docs["7"]["done_until"] == START + timedelta(hours=12)
+    assert len(database.readings.docs) == 720
+
+    transport, calls = fake_thingspeak(1440)
+    stats = asyncio.run(run(transport))
+    assert calls["n"] == 2 and stats.inserted == 720
+    assert len(database.readings.docs) == 1440
+
+
+class FlakyCollection(FakeCollection):
+    """Rejeita (erro que não é duplicata) as leituras de um intervalo de entry_id."""
+
+    def __init__(self, bad):
+        super().__init__()
+        self.bad = bad
+
+    async def insert_many(self, docs, ordered=True):
+        errors, inserted = [], 0
+        for i, d in enumerate(docs):
+            if d["entry_id"] in self.bad or d["_id"] in self.docs:
+                errors.append({"index": i, "code": 121 if d["entry_id"] in self.bad else 11000})
+            else:
+                self.docs[d["_id"]] = dict(d)
+                inserted += 1
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": inserted})
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in docs])
+
+
+def test_import_stops_at_window_with_write_errors():
+    database = _db()
+    database.readings = FlakyCollection(bad={400})
+    end = START + timedelta(days=1)
+
+    async def run():
+        async with httpx.AsyncClient(transport=fake_thingspeak(1440)[0]) as client:
+            return await import_channel(database, client, 8, "key", "3", START, end, window=timedelta(hours=6))
+
+    # Entrada 400 está na 2ª janela (6 h .. 12 h): checkpoint e marca ficam na 1ª
+    stats = asyncio.run(run())
+    assert stats.incomplete and stats.errors == 1
+    assert database.import_checkpoints.docs["8"]["done_until"] == START + timedelta(hours=6)
+    assert stats.last_entry_id == 360
+
+    # Corrigido o problema, a nova execução regrava a janela e segue até o fim
+    database.readings.bad = set()
+    stats = asyncio.run(run())
+    assert not stats.incomplete and stats.inserted == 1 + 720 and stats.duplicates == 359
+    assert len(database.readings.docs) == 1440
+    assert database.import_checkpoints.docs["8"]["done_until"] == end
+
+
+def test_poll_pages_forward_without_gaps(monkeypatch):
+    # Backlog de 1000 entradas acima do limite (100): com `start` apenas, a API
+    # devolveria as 100 mais recentes e o meio do histórico seria pulado
+    monkeypatch.setattr(thingspeak_import, "THINGSPEAK_MAX_RESULTS", 100)
+    monkeypatch.setattr(config, "THINGSPEAK_POLL_WINDOW_HOURS", 24 * 365 * 10)
+    state = FakeCollection()
+    monkeypatch.setattr(db, "db", SimpleNamespace(thingspeak_state=state))
+    ingested, fail = [], set()
+
+    async def fake_ingest(docs, **kw):
+        out = []
+        for d in docs:
+            ok = d["entry_id"] not in fail
+            if ok:
+                ingested.append(d["entry_id"])
+            out.append({"status": "ok" if ok else "error"})
+        return out
+
+    monkeypatch.setattr(thing_speak, "ingest_readings", fake_ingest)
+    state.docs["9"] = {"_id": "9", "last_entry_id": 100, "last_created_at": START + timedelta(minutes=99)}
+
+    async def run():
+        async with httpx.AsyncClient(transport=fake_thingspeak(1000)[0]) as client:
+            monkeypatch.setattr(thing_speak, "get_http_client", lambda: client)
+            return await thing_speak.fetch_and_store(9, "key")
+
+    # Falha de gravação na entrada 600: a marca para na 599 e a janela não é dada como varrida
+    fail.add(600)
+    summary = asyncio.run(run())
+    assert ingested == list(range(101, 600)) + list(range(601, 1001))
+    assert state.docs["9"]["last_entry_id"] == 599 and "scanned_until" not in state.docs["9"]
+    assert summary["errors"] == 1
+
+    # Próxima execução retoma da 600 sem lacunas
+    fail.clear()
+    ingested.clear()
+    summary = asyncio.run(run())
+    assert ingested[0] == 600 and summary["ok"]
+    assert state.docs["9"]["last_entry_id"] == 1000
+    assert state.docs["9"]["scanned_until"] > START
@@ -0,0 +1,105 @@
+"""
+tests/test_ml_jobs.py
+Lock de retreino no Mongo: um retreino por vez entre workers (coleções em memória).
+"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app import config, db
+from app.ml import jobs, model
+
+
+def _matches(doc, flt):
+    for k, v in flt.items():
+        if k == "$or":
+            if not any(_matches(doc, f) for f in v):
+                return False
+        elif isinstance(v, dict) and "$lte" in v:
+            if doc.get(k) is None or doc[k] > v["$lte"]:
+                return False
+        elif doc.get(k) != v:
+            return False
+    return True
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, flt, projection=None):
+        doc = self.docs.get(flt["_id"])
+        return {k: v for k, v in doc.items() if k != "_id"} if doc and projection == {"_id": 0} else doc
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("E11000")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def update_one(self, flt, update):
+        doc = self.docs.get(flt["_id"])
+        if doc is None or not _matches(doc, flt):
+            return SimpleNamespace(matched_count=0)
+        doc.update(update["$set"])
+        return SimpleNamespace(matched_count=1)
+
+    async def find_one_and_update(self, flt, update, upsert=False, **kw):
+        doc = self.docs.get(flt["_id"])
+        if doc is not None and _matches(doc, flt):
+            doc.update(update["$set"])
+            return doc
+        if doc is not None:
+            raise DuplicateKeyError("E11000")  # upsert colide no _id
+        await self.insert_one({"_id": flt["_id"], **update["$set"]})
+        return self.docs[flt["_id"]]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = SimpleNamespace(locks=FakeCollection(), ml_jobs=FakeCollection())
+    monkeypatch.setattr(db, "db", fake)
+    monkeypatch.setattr(config, "ML_RETRAIN_LEASE_SEC", 60)
+    monkeypatch.setattr(jobs, "_local", {})
+
+    async def retrain(days, progress):
+        await asyncio.sleep(0.05)
+        return {"status": "ok"}
+
+    monkeypatch.setattr(model, "retrain", retrain)
+    return fake
+
+
+def test_one_retrain_across_workers(fake_db):
+    async def run():
+        first = await jobs.start_retrain(trigger="api")
+        # Outro worker (sem estado local) é recusado pelo lock no Mongo
+        jobs._local.clear()
+        with pytest.raises(jobs.RetrainInProgress) as e:
+            await jobs.start_retrain(trigger="api")
+        assert e.value.job_id == first["id"]
+        await asyncio.sleep(0.2)
+        assert (await jobs.get_job(first["id"]))["status"] == "done"
+        # Lock liberado ao fim; o retreino agendado do dia roda uma única vez
+        await jobs.start_retrain(trigger="schedule", job_id="schedule-2024-01-01")
+        await asyncio.sleep(0.2)
+        with pytest.raises(jobs.RetrainInProgress):
+            await jobs.start_retrain(trigger="schedule", job_id="schedule-2024-01-01")
+
+    asyncio.run(run())
+
+
+def test_expired_lease_is_taken_over(fake_db):
+    fake_db.locks.docs[jobs.LOCK_ID] = {
+        "_id": jobs.LOCK_ID, "job_id": "worker-caiu", "expires_at": datetime.utcnow() - timedelta(seconds=1)
+    }
+
+    async def run():
+        job = await jobs.start_retrain(trigger="api")
+        assert fake_db.locks.docs[jobs.LOCK_ID]["job_id"] == job["id"]
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert fake_db.locks.docs[jobs.LOCK_ID]["job_id"] is None
@@ -0,0 +1,54 @@
+"""
+tests/test_ml_model.py
+Testes da pontuação do IsolationForest (passagem única e lote).
+"""
+import asyncio
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+from sklearn.ensemble import IsolationForest
+from app.ml import model as ml
+
+
+def _fit():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.normal(25, 1, 500), rng.normal(60, 5, 500),
+        rng.normal(400, 20, 500), rng.normal(100, 10, 500),
+    ])
+    return IsolationForest(n_estimators=50, contamination=0.01, random_state=42).fit(X)
+
+
+def test_single_pass_label_matches_predict():
+    model = _fit()
+    readings = [
+        {"temp_C": 25, "rh_pct": 60, "co2_ppm_est": 400, "mq2_raw": 100},
+        {"temp_C": 70, "rh_pct": 5, "co2_ppm_est": 3000, "mq2_raw": 900},
+        {"temp_C": 26, "rh_pct": 58, "co2_ppm_est": None},
+    ]
+    X = ml._feature_matrix(readings)
+    assert X.dtype == np.float64 and X.flags["C_CONTIGUOUS"]
+    scores, is_anom = ml._score(model, X)
+    np.testing.assert_allclose(scores, model.decision_function(X))
+    assert list(is_anom) == list(model.predict(X) == -1)
+
+
+def test_detect_anomalies_matches_detect_anomaly(monkeypatch):
+    model = _fit()
+    monkeypatch.setattr(ml._model_cache, "loaded", True)
+    monkeypatch.setattr(ml._model_cache, "model", model)
+    monkeypatch.setattr(ml._model_cache, "checked_at", float("inf"))
+    readings = [
+        {"temp_C": 25, "rh_pct": 60, "co2_ppm_est": 400, "mq2_raw": 100},
+        {"temp_C": 70, "rh_pct": 5, "co2_ppm_est": 3000, "mq2_raw": 900},
+    ]
+
+    async def run():
+        batch = await ml.detect_anomalies(readings)
+        single = [await ml.detect_anomaly(r) for r in readings]
+        return batch, single
+
+    batch, single = asyncio.run(run())
+    assert batch == single
+    assert batch[1][0] is True
@@ -0,0 +1,49 @@
+"""
+tests/test_outbox.py
+Política de repetição do outbox de notificações.
+"""
+import asyncio
+
+from app import config
+from app.services import outbox
+from app.services.outbox import backoff_delay, _delivered
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(config, "OUTBOX_BACKOFF_BASE_SEC", 10)
+    monkeypatch.setattr(config, "OUTBOX_BACKOFF_MAX_SEC", 100)
+    assert 8 <= backoff_delay(1) <= 12
+    assert 32 <= backoff_delay(3) <= 48
+    assert 80 <= backoff_delay(10) <= 120
+
+
+def test_delivered():
+    assert _delivered({"telegram": "skipped", "webpush": {"sent": 0, "expired": 0, "failed": 0, "timeout": 0}})
+    assert _delivered({"telegram": "failed", "webpush": {"sent": 1, "failed": 3}})
+    assert not _delivered({"telegram": "timeout", "webpush": {"sent": 0, "expired": 0, "failed": 2, "timeout": 0}})
+
+
+def test_dispatcher_rescans_pending_alerts(monkeypatch):
+    # Alertas gravados sem entrada no outbox são recuperados durante a execução,
+    # não só na partida do dispatcher
+    calls = {"recover": 0}
+
+    async def recover_pending():
+        calls["recover"] += 1
+        return 0
+
+    async def dispatch_once():
+        return {"sent": 0, "pending": 0, "dead": 0}
+
+    monkeypatch.setattr(config, "OUTBOX_RECOVER_SEC", 0.02)
+    monkeypatch.setattr(outbox, "recover_pending", recover_pending)
+    monkeypatch.setattr(outbox, "dispatch_once", dispatch_once)
+
+    async def run():
+        try:
+            await asyncio.wait_for(outbox.run_dispatcher(poll_interval=0.01), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(run())
+    assert calls["recover"] >= 3
@@ -0,0 +1,35 @@
+"""
+tests/test_pagination.py
+Testes do cursor de paginação por keyset.
+"""
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from app.pagination import encode_cursor, decode_cursor, keyset_after
+
+
+def test_cursor_roundtrip_and_filter():
+    ts = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    cur = encode_cursor(ts, "abc-123")
+    assert "=" not in cur
+    assert decode_cursor(cur) == (ts, "abc-123")
+    assert keyset_after(ts, "abc-123") == {
+        "$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": "abc-123"}}]
+    }
+
+
+def test_cursor_keeps_objectid_type():
+    ts = datetime(2024, 5, 1, 12, 30)
+    oid = ObjectId("65f1c0de0000000000000000")
+    assert decode_cursor(encode_cursor(ts, oid)) == (ts, oid)
+    # string com cara de ObjectId continua string
+    assert decode_cursor(encode_cursor(ts, str(oid))) == (ts, str(oid))
+    # depois de um ObjectId vêm os ObjectId menores e todas as strings (ordem BSON)
+    assert keyset_after(ts, oid)["$or"][1:] == [
+        {"timestamp": ts, "_id": {"$lt": oid}}, {"timestamp": ts, "_id": {"$type": "string"}}
+    ]
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("nao-e-um-cursor")
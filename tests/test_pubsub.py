@@ -0,0 +1,22 @@
+"""
+tests/test_pubsub.py
+Hub do stream ao vivo: filtro por silo e fila limitada para consumidores lentos.
+"""
+from app.services.pubsub import Hub
+
+
+def test_publish_filters_by_silo_and_drops_oldest():
+    hub = Hub()
+    s1, s2, everyone = hub.subscribe(["1"], maxsize=3), hub.subscribe(["2"]), hub.subscribe()
+    for i in range(5):
+        hub.publish("reading", "1", {"i": i})
+    assert s2.queue.qsize() == 0
+    assert everyone.queue.qsize() == 5
+    # Fila cheia: ficam os 3 eventos mais recentes
+    assert s1.queue.qsize() == 3 and s1.dropped == 2
+    assert '"i": 2' in s1.queue.get_nowait()
+
+    hub.unsubscribe(s1)
+    hub.publish("reading", "1", {"i": 5})
+    assert s1.queue.qsize() == 2
+    assert hub.stats()["subscribers"] == 2
@@ -0,0 +1,68 @@
+"""
+tests/test_rollups.py
+Intervalo recalculado por rebuild_rollups (sem Mongo: o pipeline é capturado).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app import db
+from app.services import rollups
+
+
+class _Readings:
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+
+        async def _empty():
+            return
+            yield
+
+        return _empty()
+
+
+class _DB(dict):
+    """db.db falso: coleções de rollup por índice, readings por atributo."""
+
+
+class _Rollup:
+    async def delete_many(self, flt):
+        pass
+
+    async def count_documents(self, flt):
+        return 0
+
+
+def _ranges(monkeypatch, start, end, **kw):
+    readings = _Readings()
+    d = _DB(readings_hourly=_Rollup(), readings_daily=_Rollup())
+    d.readings = readings
+    monkeypatch.setattr(db, "db", d)
+    asyncio.run(rollups.rebuild_rollups(start, end, **kw))
+    return [p[0]["$match"]["timestamp"] for p in readings.pipelines]
+
+
+def test_rebuild_includes_boundary_aligned_last_reading(monkeypatch):
+    first, last = datetime(2024, 1, 1, 10, 15), datetime(2024, 1, 2, 0, 0)
+
+    # Última leitura alinhada à hora e ao dia: [start, end] precisa incluí-la
+    hourly, daily = _ranges(monkeypatch, first, last, inclusive_end=True)
+    assert hourly["$gte"] <= first and last < hourly["$lt"]
+    assert daily["$gte"] <= first and last < daily["$lt"]
+
+    # Padrão [start, end): o fim alinhado fica de fora
+    hourly, daily = _ranges(monkeypatch, first, last)
+    assert hourly["$lt"] == last and daily["$lt"] == last
+
+
+def test_bucket_range_aligns_to_whole_buckets():
+    start, end = datetime(2024, 1, 1, 10, 7, 30), datetime(2024, 1, 1, 12, 0)
+    assert rollups.bucket_range(start, end, "minute", 5) == (datetime(2024, 1, 1, 10, 5), end)
+    assert rollups.bucket_range(start, end, "hour") == (datetime(2024, 1, 1, 10), end)
+    assert rollups.bucket_range(start, end + timedelta(seconds=1), "hour")[1] == datetime(2024, 1, 1, 13)
+    assert rollups.bucket_range(start, end, "day") == (datetime(2024, 1, 1), datetime(2024, 1, 2))
+    # com fuso: convertido para UTC sem tzinfo
+    aware = datetime(2024, 1, 1, 7, 7, 30, tzinfo=timezone(timedelta(hours=-3)))
+    assert rollups.bucket_range(aware, end, "hour")[0] == datetime(2024, 1, 1, 10)
@@ -0,0 +1,51 @@
+"""
+tests/test_rules.py
+Testes das regras stateful (histerese, N consecutivas, taxa de variação).
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.utils import (
+    ConsecutiveRule, HysteresisRule, RateOfChangeRule, RuleState, RuleStateStore, _build_rules,
+)
+
+T0 = datetime(2024, 1, 1)
+
+
+def _run(rule, values, field="temp_C", step_min=10):
+    async def go():
+        fired = []
+        for i, v in enumerate(values):
+            reading = {"silo_id": "s1", field: v, "timestamp": T0 + timedelta(minutes=step_min * i)}
+            fired.append(bool(await rule.apply(reading)))
+        return fired
+    return asyncio.run(go())
+
+
+def test_hysteresis_fires_once_per_excursion():
+    rule = HysteresisRule("temp_C", high=30, low=28, level="warning", message="m", store=RuleStateStore())
+    assert _run(rule, [29, 31, 32, 29.5, 31, 27, 31]) == [False, True, False, False, False, False, True]
+
+
+def test_consecutive_requires_n_readings():
+    rule = ConsecutiveRule("co2_ppm_est", threshold=1000, n=3, level="critical", message="m", store=RuleStateStore())
+    values = [1100, 1200, 900, 1100, 1100, 1100, 1100]
+    assert _run(rule, values, field="co2_ppm_est") == [False, False, False, False, False, True, False]
+
+
+def test_rate_of_change_detects_rising_trend():
+    def rule():
+        return RateOfChangeRule("temp_C", max_rate=2.0, alpha=0.5, level="warning", message="m", store=RuleStateStore())
+    assert not any(_run(rule(), [25.0] * 8))
+    # +1.5 °C a cada 10 min = 9 °C/h; dispara uma vez e não repete
+    assert _run(rule(), [25.0 + 1.5 * i for i in range(8)]).count(True) == 1
+
+
+def test_state_roundtrip_and_build_rules():
+    st = RuleState()
+    st.active, st.count, st.ewma = True, 4, 26.5
+    assert RuleState.from_dict(st.to_dict()).to_dict() == st.to_dict()
+
+    rules = _build_rules({"temp_threshold": 30, "temp_hysteresis": 2, "co2_threshold": 1000,
+                          "consecutive_readings": 3, "temp_rate_threshold": 1.5})
+    assert [type(r).__name__ for r in rules] == ["HysteresisRule", "ConsecutiveRule", "RateOfChangeRule"]
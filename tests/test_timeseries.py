@@ -0,0 +1,112 @@
+"""
+tests/test_timeseries.py
+`readings` como time-series: sem índice único em _id, a deduplicação é
+explícita (db.unique_readings) e o índice keyset com _id tem fallback.
+"""
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import httpx
+from pymongo.errors import OperationFailure
+
+from app import db
+from app.services.thingspeak_import import import_channel
+from tests.test_import_historical import START, FakeCollection, fake_thingspeak
+
+
+class TimeSeriesCollection:
+    """Como uma time-series: aceita _id repetido sem erro."""
+
+    def __init__(self):
+        self.docs = []
+        self.queries = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in docs])
+
+    @staticmethod
+    def _match(d, clause):
+        ts = clause.get("timestamp", {})
+        return (d["_id"] in clause["_id"]["$in"] and d.get("silo_id") == clause["silo_id"]
+                and ts.get("$gte", d.get("timestamp")) <= d.get("timestamp") <= ts.get("$lte", d.get("timestamp")))
+
+    def find(self, flt, projection=None):
+        self.queries.append(flt)
+        clauses = flt.get("$or", [flt])
+
+        async def _iter():
+            for d in list(self.docs):
+                if any(self._match(d, c) for c in clauses):
+                    yield {"_id": d["_id"]}
+
+        return _iter()
+
+
+def test_unique_readings_drops_stored_and_repeated_ids(monkeypatch):
+    coll = TimeSeriesCollection()
+    coll.docs.append({"_id": "a", "silo_id": "1", "timestamp": START})
+    docs = [{"_id": i, "silo_id": "1", "timestamp": START + timedelta(minutes=m)}
+            for i, m in (("a", 0), ("b", 1), ("b", 1), ("c", 2))]
+
+    monkeypatch.setattr(db, "readings_timeseries", False)
+    assert asyncio.run(db.unique_readings(coll, docs)) == (docs, [])
+
+    monkeypatch.setattr(db, "readings_timeseries", True)
+    # _id recém-gerados (uuid4) não colidem: nenhuma consulta
+    assert asyncio.run(db.unique_readings(coll, docs, generated_ids=True)) == (docs, [])
+    assert coll.queries == []
+
+    fresh, dup = asyncio.run(db.unique_readings(coll, docs))
+    assert [d["_id"] for d in fresh] == ["b", "c"] and dup == [0, 2]
+    # Consulta limitada ao metaField e ao intervalo do lote (índice de buckets)
+    assert coll.queries[-1]["silo_id"] == "1"
+    assert coll.queries[-1]["timestamp"] == {"$gte": START, "$lte": START + timedelta(minutes=2)}
+
+
+def test_import_into_timeseries_is_idempotent(monkeypatch):
+    monkeypatch.setattr(db, "readings_timeseries", True)
+    database = SimpleNamespace(readings=TimeSeriesCollection(), import_checkpoints=FakeCollection())
+    end = START + timedelta(hours=6)
+
+    async def run():
+        async with httpx.AsyncClient(transport=fake_thingspeak(300)[0]) as client:
+            return await import_channel(database, client, 5, "key", "1", START, end,
+                                        window=timedelta(hours=2), batch_size=50, resume=False)
+
+    assert asyncio.run(run()).inserted == 300
+    stats = asyncio.run(run())
+    assert stats.inserted == 0 and stats.duplicates == 300
+    assert len(database.readings.docs) == 300
+
+
+class _IndexRecorder:
+    def __init__(self, reject_id):
+        self.reject_id = reject_id
+        self.indexes = []
+
+    async def create_index(self, keys, **kw):
+        if self.reject_id and any(k == "_id" for k, _ in keys):
+            raise OperationFailure("Index build failed: measurement field index not supported")
+        self.indexes.append(keys)
+
+
+def _keyset_indexes(monkeypatch, timeseries, reject_id):
+    readings = _IndexRecorder(reject_id)
+    monkeypatch.setattr(db, "db", SimpleNamespace(readings=readings))
+    monkeypatch.setattr(db, "readings_timeseries", timeseries)
+    for keys in ([("silo_id", 1), ("timestamp", -1), ("_id", -1)], [("timestamp", -1), ("_id", -1)]):
+        asyncio.run(db._ensure_readings_keyset_index(keys))
+    return readings.indexes
+
+
+def test_keyset_index_on_timeseries(monkeypatch):
+    # MongoDB >= 6.0 aceita o índice com _id na time-series
+    assert _keyset_indexes(monkeypatch, True, False) == [
+        [("silo_id", 1), ("timestamp", -1), ("_id", -1)], [("timestamp", -1), ("_id", -1)]
+    ]
+    # Servidor que recusa: cai para o índice sem _id
+    assert _keyset_indexes(monkeypatch, True, True) == [
+        [("silo_id", 1), ("timestamp", -1)], [("timestamp", -1)]
+    ]